@@ -1,55 +1,138 @@
 from flask import Flask 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
-from authlib.integrations.flask_client import OAuth
+import click
+import logging
 import os
 from flask_bootstrap import Bootstrap5
+from .database import RoutingSession, ARCHIVE, REPLICA, engine_options, on_primary
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-migrate = Migrate()
-oauth = OAuth()
+
+
+def _running_cli():
+    """True when the app is being created for a `flask` command other than `flask run`.
+
+    `flask run` serves requests, so it gets the scheduler like gunicorn does.
+    """
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name != 'run'
+
+
+def _init_migrate(app):
+    # Alembic is slow to import and only the `flask db` commands need it.
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
 
 def create_app():
     app = Flask(__name__)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLITE_DB_URI', 'sqlite:///epl_predictions.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_BINDS'] = {
+        ARCHIVE: os.environ.get('ARCHIVE_DB_URI', 'sqlite:///epl_predictions_archive.db'),
+    }
+    if os.environ.get('REPLICA_DB_URI'):
+        app.config['SQLALCHEMY_BINDS'][REPLICA] = os.environ['REPLICA_DB_URI']
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['SQLITE_WAL'] = os.environ.get('SQLITE_WAL', '1') == '1'
     app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID')
     app.config['GOOGLE_CLIENT_SECRET'] = os.environ.get('GOOGLE_CLIENT_SECRET')
+    # Comma-separated; when set, signing in grants or removes admin rights to match it.
+    app.config['ADMIN_EMAILS'] = frozenset(
+        email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip())
+    app.config['QUERY_COUNT_HEADER'] = os.environ.get('QUERY_COUNT_HEADER') == '1'
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    app.config['PROFILE_HEADER'] = os.environ.get('PROFILE_HEADER') == '1'
+    app.config['PROFILER'] = os.environ.get('PROFILER', 'cprofile')
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+    app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 300))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 512))
+    app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR')
+    app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+    app.config['ANONYMOUS_CACHE_SECONDS'] = int(os.environ.get('ANONYMOUS_CACHE_SECONDS', 60))
+    app.config['FRAGMENT_CACHE'] = os.environ.get('FRAGMENT_CACHE', '1') == '1'
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 4096))
+    app.config['FIXTURE_PROVIDER'] = os.environ.get('FIXTURE_PROVIDER', 'mock')
+    app.config['IMPORT_WORKERS'] = int(os.environ.get('IMPORT_WORKERS', 8))
+    app.config['EVENTS_BACKEND'] = os.environ.get('EVENTS_BACKEND', 'memory')
+    app.config['EVENTS_DIR'] = os.environ.get('EVENTS_DIR')
+    app.config['EVENTS_REDIS_URL'] = os.environ.get('EVENTS_REDIS_URL')
+    app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 4))
+    app.config['EVENTS_FILE_MAX_BYTES'] = int(os.environ.get('EVENTS_FILE_MAX_BYTES', 1024 * 1024))
+    app.config['PREDICTION_BUFFER'] = os.environ.get('PREDICTION_BUFFER') == '1'
+    app.config['PREDICTION_BUFFER_DIR'] = os.environ.get('PREDICTION_BUFFER_DIR')
+    app.config['PREDICTION_BUFFER_FLUSH_MS'] = int(os.environ.get('PREDICTION_BUFFER_FLUSH_MS', 250))
+    app.config['EXPORT_BATCH_ROWS'] = int(os.environ.get('EXPORT_BATCH_ROWS', 5000))
+    app.config['MATCH_WEEK_SCHEDULER'] = os.environ.get('MATCH_WEEK_SCHEDULER', '1') == '1'
+    app.config['WHATIF_MAX_AGE_SECONDS'] = float(os.environ.get('WHATIF_MAX_AGE_SECONDS', 60))
+    app.config['JOBS_WORKER'] = os.environ.get('JOBS_WORKER', 'thread')
+    app.config['JOBS_POLL_SECONDS'] = float(os.environ.get('JOBS_POLL_SECONDS', 1))
+    app.config['JOBS_RETRY_DELAY'] = float(os.environ.get('JOBS_RETRY_DELAY', 5))
+    app.config['JOBS_STALE_SECONDS'] = int(os.environ.get('JOBS_STALE_SECONDS', 300))
+    app.config['JOBS_SHARD_SIZE'] = int(os.environ.get('JOBS_SHARD_SIZE', 20))
 
     # Initialize extensions with app
     db.init_app(app)
-    migrate.init_app(app, db)
+    from . import database
+    database.init_app(app, db)
+    if _running_cli():
+        _init_migrate(app)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
-    oauth.init_app(app)
     Bootstrap5(app)
 
+    from . import instrumentation
+    instrumentation.init_app(app)
+
+    from .cache import cache
+    cache.init_app(app)
+
+    from . import events
+    events.init_app(app)
+
+    from . import fragments
+    fragments.init_app(app)
+
     # IMPORTANT: Import models AFTER db.init_app() but BEFORE register_blueprint
     from . import models
 
-    # Google OAuth registration
-    google = oauth.register(
-        name='google',
-        client_id=app.config['GOOGLE_CLIENT_ID'],
-        client_secret=app.config['GOOGLE_CLIENT_SECRET'],
-        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-        client_kwargs={
-            'scope': 'openid email profile'
-        }
-    )
-
-    # User loader
+    from . import write_buffer
+    write_buffer.init_app(app)
+
+    from . import schedule
+    schedule.init_app(app, serving=not _running_cli())
+
+    # Google OAuth is registered on the first login (see auth.py).
+
+    # User loader: served from a short-lived snapshot cache, the primary DB on a miss
+    from .cache import load_cached_user
+
     @login_manager.user_loader
     def load_user(user_id):
-        return models.User.query.get(int(user_id))
+        with on_primary():
+            return load_cached_user(int(user_id))
 
     # Register blueprints
     from .routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from . import admin
+    admin.init_app(app)
+
+    from .commands import register_commands
+    register_commands(app)
+
     return app
 
@@ -0,0 +1,51 @@
+"""
+Admin blueprint.
+
+The admin URL rules are declared here and point at views in
+`admin_views.py`.
+
+Every admin write keeps the admin on the primary database for
+REPLICA_STICKY_SECONDS, so the pages they go back to show the change.
+"""
+from flask import Blueprint, request
+from werkzeug.utils import import_string
+
+from .database import stick_to_primary
+
+VIEWS = 'app.admin_views'
+
+URLS = [
+    ('', 'dashboard', ['GET']),
+    ('/test_route', 'test_route', ['GET']),
+    ('/create_match_week', 'create_match_week', ['GET', 'POST']),
+    ('/load_season', 'load_season_schedule', ['POST']),
+    ('/import_fixtures', 'import_fixtures', ['POST']),
+    ('/score_fixtures', 'score_completed_fixtures', ['POST']),
+    ('/jobs', 'job_list', ['GET', 'POST']),
+    ('/jobs/<int:job_id>', 'job_detail', ['GET']),
+    ('/create_season', 'create_season', ['GET', 'POST']),
+    ('/archive_season/<int:season_id>', 'archive_season', ['POST']),
+    ('/activate_match_week/<int:week_id>', 'activate_match_week', ['POST']),
+    ('/metrics', 'admin_metrics', ['GET']),
+    ('/cache_stats', 'cache_stats', ['GET']),
+    ('/export/predictions.csv', 'export_predictions', ['GET']),
+    ('/export/standings.csv', 'export_standings', ['GET']),
+    ('/whatif', 'whatif_preview', ['POST']),
+]
+
+
+def create_blueprint():
+    bp = Blueprint('admin', __name__, url_prefix='/admin')
+    for rule, endpoint, methods in URLS:
+        bp.add_url_rule(rule, endpoint, view_func=import_string(f'{VIEWS}.{endpoint}'), methods=methods)
+
+    @bp.after_request
+    def stick_after_write(response):
+        if request.method == 'POST' and response.status_code < 400:
+            stick_to_primary()
+        return response
+    return bp
+
+
+def init_app(app):
+    app.register_blueprint(create_blueprint())
@@ -0,0 +1,319 @@
+"""
+Admin views.
+
+The URL rules live in `admin.py`.
+"""
+from flask import render_template, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context
+from flask_login import login_required, current_user
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from .models import db, Season, MatchWeek, Fixture, Week, Job
+from .forms import CreateMatchWeekForm, CreateSeasonForm
+from . import jobs
+from .season_loader import load_season, schedule_from_rows
+from .events import publish_after_commit
+from .instrumentation import metrics
+from .cache import (cache, get_versions, invalidate_schedule, match_week_version, scores_version,
+                    SCHEDULE_VERSION, SCORES_VERSION)
+from .archive import check_archivable
+from .database import read_replica
+from . import exports
+from . import whatif
+import csv
+import json
+
+
+@login_required
+def dashboard():
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.index'))
+    return render_template('admin/dashboard.html')
+
+
+@login_required
+def test_route():
+    current_app.logger.debug('Admin test route called')
+    return "Test route works!"
+
+
+@login_required
+def create_match_week():
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.index'))
+
+    try:
+        weeks = Week.query.order_by(Week.id).all()
+        seasons = Season.query.order_by(Season.season_start_year.asc()).all()
+    except Exception as e:
+        current_app.logger.exception('Database error loading weeks and seasons')
+        flash(f'Database error: {str(e)}', 'error')
+        return redirect(url_for('admin.dashboard'))
+
+    # FieldList picks up every fixtures-N-* entry present in the POST data.
+    form = CreateMatchWeekForm()
+    form.season.choices = [(season.id, f"{season.season_start_year}-{season.season_end_year}") for season in seasons]
+    form.week_number.choices = [(week.id, f"Week {week.week_number}") for week in weeks]
+
+    if form.validate_on_submit():
+        fixtures = [
+            {'home_team': fixture_form.home_team.data, 'away_team': fixture_form.away_team.data}
+            for fixture_form in form.fixtures
+            if fixture_form.home_team.data and fixture_form.away_team.data
+        ]
+        try:
+            match_week = MatchWeek(
+                week_id=form.week_number.data,
+                season_id=form.season.data,
+                predictions_open_time=form.predictions_open_time.data,
+                predictions_close_time=form.predictions_close_time.data
+            )
+            db.session.add(match_week)
+            db.session.flush()  # This gets us the match_week.id
+            if fixtures:
+                db.session.execute(insert(Fixture), [
+                    {'match_week_id': match_week.id, 'created_at': datetime.utcnow(), **fixture}
+                    for fixture in fixtures
+                ])
+            publish_after_commit('schedule', {'match_week_id': match_week.id})
+            db.session.commit()
+            invalidate_schedule([match_week.id])
+            flash(f'Match Week created successfully with {len(fixtures)} fixtures!', 'success')
+            return redirect(url_for('admin.dashboard'))
+
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('Error creating match week')
+            flash(f'Error creating match week: {str(e)}', 'error')
+            return redirect(url_for('admin.dashboard'))
+    return render_template('admin/create_match_week.html', form=form)
+
+
+@login_required
+def load_season_schedule():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    schedule = request.get_json(silent=True)
+    if schedule is None and 'schedule' in request.files:
+        upload = request.files['schedule']
+        try:
+            # Bad UTF-8 and bad JSON both raise ValueError subclasses.
+            text = upload.read().decode('utf-8')
+            if upload.filename.endswith('.csv'):
+                schedule = schedule_from_rows(csv.DictReader(text.splitlines()))
+            else:
+                schedule = json.loads(text)
+        except ValueError as e:
+            return jsonify({'error': f'Could not read {upload.filename}: {e}'}), 400
+    if schedule is None:
+        return jsonify({'error': 'Send a JSON schedule or upload a CSV/JSON file as "schedule"'}), 400
+    try:
+        report = load_season(schedule)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, **report})
+
+
+def _job_response(job):
+    return jsonify({'success': True, 'job_id': job.id,
+                    'status_url': url_for('admin.job_detail', job_id=job.id)}), 202
+
+
+@login_required
+def import_fixtures():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    payload = request.get_json(silent=True) or {}
+    if payload.get('season_id'):
+        season = Season.query.get_or_404(payload['season_id'])
+    else:
+        season = Season.query.order_by(Season.season_start_year.desc()).first()
+    if season is None:
+        return jsonify({'error': 'Create a season before importing fixtures'}), 400
+    job = jobs.submit('import_fixtures', {'season_id': season.id, 'weeks': payload.get('weeks')},
+                      idempotency_key=request.headers.get('Idempotency-Key'))
+    return _job_response(job)
+
+
+@login_required
+def score_completed_fixtures():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    match_week_id = request.form.get('match_week_id', type=int)
+    # Without a key of its own, a click is keyed on the week's schedule and
+    # scores versions: a double submit returns the queued job, while a
+    # finished run or a corrected result moves them on and allows a new one.
+    if match_week_id is None:
+        names = [SCHEDULE_VERSION, SCORES_VERSION]
+    else:
+        names = [match_week_version(match_week_id), scores_version(match_week_id)]
+    versions = '.'.join(str(version) for version, _ in get_versions(names))
+    default_key = f'score-fixtures-{match_week_id or "all"}-v{versions}'
+    job = jobs.submit('score_fixtures', {'match_week_id': match_week_id},
+                      idempotency_key=request.headers.get('Idempotency-Key') or default_key)
+    return _job_response(job)
+
+
+@login_required
+def archive_season(season_id):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    season = Season.query.get_or_404(season_id)
+    try:
+        check_archivable(season)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    job = jobs.submit('archive_season', {'season_id': season.id},
+                      idempotency_key=request.headers.get('Idempotency-Key'))
+    return _job_response(job)
+
+
+@login_required
+def job_list():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        try:
+            job = jobs.submit(payload.get('kind'), payload.get('params') or {},
+                              idempotency_key=payload.get('idempotency_key')
+                              or request.headers.get('Idempotency-Key'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return _job_response(job)
+    recent = (Job.query.filter(Job.parent_id.is_(None))
+              .order_by(Job.id.desc()).limit(min(request.args.get('limit', 20, type=int), 100)).all())
+    return jsonify({'jobs': [jobs.job_status(job) for job in recent]})
+
+
+@login_required
+def job_detail(job_id):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(jobs.job_status(Job.query.get_or_404(job_id)))
+
+
+@login_required
+def create_season():
+
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # seasons = Season.query.order_by(Season.season_start_year.asc()).all()
+    # season_choices = [(season.id, f"{season.season_start_year}/{season.season_end_year}") for season in seasons]
+    form = CreateSeasonForm()
+    # form.season.choices = season_choices
+
+    if form.validate_on_submit():
+        start = form.start_year.data
+        end = form.end_year.data
+
+        if Season.query.filter_by(season_start_year=start, season_end_year=end).first():
+            flash('Season exists', 'warning')
+            return redirect(request.referrer)
+        
+        else:
+            try:
+                db.session.add(
+                    Season(
+                        season_start_year=start,
+                        season_end_year=end
+                    )
+                )
+                db.session.commit()
+                return redirect(url_for('main.index'))
+            except Exception as e:
+                #error = jsonify({'error': str(e)}), 500
+                flash(f'Error: {e}', 'danger')
+    return render_template('admin/create_season.html', form=form)
+
+
+@login_required
+def activate_match_week(week_id):
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.index'))
+    match_week = MatchWeek.query.get_or_404(week_id)
+    retired = db.session.execute(
+        select(MatchWeek.id).where(MatchWeek.is_active.is_(True), MatchWeek.id != match_week.id)
+    ).scalars().all()
+    db.session.execute(update(MatchWeek).where(MatchWeek.id.in_(retired)).values(is_active=False))
+    match_week.is_active = True
+    publish_after_commit('schedule', {'match_week_id': match_week.id})
+    db.session.commit()
+    invalidate_schedule([match_week.id, *retired])
+    flash(f'Match Week {match_week.week.week_number} activated!', 'success')
+    return redirect(url_for('admin.dashboard'))
+
+
+
+
+def admin_metrics():
+    # Scrapers authenticate with METRICS_TOKEN; admins can view it in the browser.
+    token = current_app.config.get('METRICS_TOKEN')
+    authorized = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not authorized and not (current_user.is_authenticated and current_user.is_admin):
+        return jsonify({'error': 'Access denied'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(cache.stats())
+
+
+def _csv_response(chunks, filename):
+    # stream_with_context keeps the app context, and with it the session,
+    # alive while the generator is still reading rows.
+    return Response(stream_with_context(chunks), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Accel-Buffering': 'no'})
+
+
+@read_replica
+@login_required
+def export_predictions():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    season_id = request.args.get('season_id', type=int)
+    batch_rows = current_app.config['EXPORT_BATCH_ROWS']
+    filename = f'predictions_season_{season_id}.csv' if season_id else 'predictions.csv'
+    return _csv_response(exports.predictions_csv(season_id, batch_rows), filename)
+
+
+@read_replica
+@login_required
+def export_standings():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return _csv_response(exports.standings_csv(current_app.config['EXPORT_BATCH_ROWS']), 'standings.csv')
+
+
+@login_required
+def whatif_preview():
+    """Standings if the posted results were final: {"results": [{"fixture_id", "home_score", "away_score"}]}."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    payload = request.get_json(silent=True) or {}
+    results = {}
+    for entry in payload.get('results') or []:
+        try:
+            scores = int(entry['home_score']), int(entry['away_score'])
+            fixture_id = int(entry['fixture_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each result needs integer fixture_id, home_score and away_score'}), 400
+        if min(scores) < 0:
+            return jsonify({'error': 'Scores cannot be negative'}), 400
+        results[fixture_id] = scores
+    if not results:
+        return jsonify({'error': 'Send at least one result'}), 400
+    try:
+        user_ids = [int(user_id) for user_id in payload.get('user_ids') or []]
+        limit = min(max(int(payload.get('limit') or 20), 1), 100)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'user_ids and limit must be integers'}), 400
+    return jsonify(whatif.preview(results, limit, user_ids))
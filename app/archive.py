@@ -0,0 +1,227 @@
+"""
+Season archiving.
+
+Only the current season is predicted on and scored, but every season's
+fixtures and predictions used to stay in the live tables, so each one made
+the hot-path indexes bigger. `archive_season` moves a finished season out:
+
+1. Its final standings are frozen into SeasonStanding.
+2. Its fixtures and predictions are copied, in batches, into the archive
+   bind (ARCHIVE_DB_URI, a separate SQLite file by default) and committed.
+3. Once the copied row counts match, the live rows are deleted and the
+   season is marked `archived_at`.
+
+The archive and live databases cannot share a transaction, so every step
+is safe to repeat: the copy skips rows that are already there, and a run
+that stopped after step 2 finishes the job when it is run again.
+
+The all-time leaderboard (UserStanding) and the weekly history
+(UserWeekStats) are not touched, and their rebuilds count archived seasons
+from SeasonStanding. Reads of a season's fixtures and predictions go
+through `match_week_fixtures` and `user_predictions`, which pick the
+live or archive tables, so historical views work either way. Archived
+rows keep their ids but are keyed by (season_id, id): SQLite may hand a
+deleted id to a new live row, and it must not clash with the archive.
+"""
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, select, update
+
+from .bulk import insert_missing
+from .cache import invalidate_schedule
+from .models import (db, User, Season, Week, MatchWeek, Fixture, Prediction, SeasonStanding,
+                     ArchivedFixture, ArchivedPrediction)
+
+BATCH_ROWS = 5000
+
+
+def is_archived(season_id):
+    return db.session.execute(
+        select(Season.archived_at.isnot(None)).where(Season.id == season_id)
+    ).scalar() or False
+
+
+def archived_season_ids():
+    return select(Season.id).where(Season.archived_at.isnot(None))
+
+
+def _season_fixture_ids(season_id):
+    return (select(Fixture.id).join(MatchWeek, MatchWeek.id == Fixture.match_week_id)
+            .where(MatchWeek.season_id == season_id))
+
+
+def check_archivable(season):
+    """Raise ValueError unless every match in the season is finished and scored."""
+    if season.archived_at is not None:
+        raise ValueError('Season is already archived')
+    still_open = db.session.execute(
+        select(func.count()).select_from(MatchWeek)
+        .where(MatchWeek.season_id == season.id, MatchWeek.predictions_close_time > datetime.utcnow())
+    ).scalar()
+    if still_open:
+        raise ValueError(f'{still_open} match weeks are still open for predictions')
+    unfinished = db.session.execute(
+        select(func.count()).select_from(Fixture)
+        .where(Fixture.id.in_(_season_fixture_ids(season.id)), Fixture.is_completed.isnot(True))
+    ).scalar()
+    if unfinished:
+        raise ValueError(f'{unfinished} fixtures are not completed')
+    unscored = db.session.execute(
+        select(func.count()).select_from(Prediction)
+        .where(Prediction.fixture_id.in_(_season_fixture_ids(season.id)), Prediction.points_earned.is_(None))
+    ).scalar()
+    if unscored:
+        raise ValueError(f'{unscored} predictions are not scored yet; run score-fixtures first')
+
+
+def freeze_standings(season_id):
+    """Write the season's final table into SeasonStanding from its live predictions."""
+    from .scoring import EXACT_SCORE_POINTS, CORRECT_RESULT_POINTS
+    points = Prediction.points_earned
+    totals = (
+        select(
+            Prediction.user_id.label('user_id'),
+            func.count().label('predictions_scored'),
+            func.sum(points).label('points'),
+            func.sum((points == EXACT_SCORE_POINTS).cast(db.Integer)).label('exact_scores'),
+            func.sum((points >= CORRECT_RESULT_POINTS).cast(db.Integer)).label('correct_results'),
+        )
+        .where(Prediction.fixture_id.in_(_season_fixture_ids(season_id)), points.isnot(None))
+        .group_by(Prediction.user_id)
+        .subquery()
+    )
+    ranked = select(
+        literal(season_id), totals.c.user_id, totals.c.predictions_scored, totals.c.points,
+        totals.c.exact_scores, totals.c.correct_results,
+        func.rank().over(order_by=totals.c.points.desc()),
+        func.row_number().over(order_by=(totals.c.points.desc(), totals.c.user_id)),
+    )
+    db.session.execute(delete(SeasonStanding).where(SeasonStanding.season_id == season_id))
+    db.session.execute(insert(SeasonStanding).from_select(
+        ['season_id', 'user_id', 'predictions_scored', 'points', 'exact_scores', 'correct_results',
+         'rank', 'position'], ranked))
+
+
+def _copy(statement, model, batch_rows):
+    copied = 0
+    result = db.session.execute(statement.execution_options(yield_per=batch_rows))
+    for partition in result.partitions():
+        rows = [dict(row._mapping) for row in partition]
+        insert_missing(model, rows, conflict_columns=('season_id', 'id'))
+        copied += len(rows)
+    return copied
+
+
+def _archived_count(model, season_id):
+    return db.session.execute(
+        select(func.count()).select_from(model).where(model.season_id == season_id)
+    ).scalar()
+
+
+def archive_season(season_id, batch_rows=BATCH_ROWS, progress=None):
+    """Move a finished season into the archive; returns a report."""
+    started = time.perf_counter()
+    season = db.session.get(Season, season_id)
+    if season is None:
+        raise ValueError('No such season')
+    check_archivable(season)
+    match_week_ids = db.session.execute(
+        select(MatchWeek.id).where(MatchWeek.season_id == season_id)).scalars().all()
+
+    freeze_standings(season_id)
+    db.session.commit()
+
+    fixtures = _copy(
+        select(Fixture.id, literal(season_id).label('season_id'), Fixture.match_week_id,
+               Week.week_number, Fixture.home_team, Fixture.away_team, Fixture.match_datetime,
+               Fixture.home_score, Fixture.away_score, Fixture.is_completed, Fixture.created_at)
+        .join(MatchWeek, MatchWeek.id == Fixture.match_week_id)
+        .join(Week, Week.id == MatchWeek.week_id)
+        .where(MatchWeek.season_id == season_id),
+        ArchivedFixture, batch_rows)
+    if progress is not None:
+        progress(0.2, f'Copied {fixtures} fixtures')
+    predictions = _copy(
+        select(Prediction.id, literal(season_id).label('season_id'), Prediction.user_id,
+               Prediction.fixture_id, Prediction.home_score_prediction, Prediction.away_score_prediction,
+               Prediction.points_earned, Prediction.created_at, Prediction.updated_at)
+        .where(Prediction.fixture_id.in_(_season_fixture_ids(season_id))),
+        ArchivedPrediction, batch_rows)
+    db.session.commit()
+    if progress is not None:
+        progress(0.8, f'Copied {predictions} predictions')
+
+    if (_archived_count(ArchivedFixture, season_id) < fixtures
+            or _archived_count(ArchivedPrediction, season_id) < predictions):
+        raise RuntimeError('Archive copy is incomplete; live rows were left in place')
+
+    db.session.execute(delete(Prediction).where(Prediction.fixture_id.in_(_season_fixture_ids(season_id)))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(delete(Fixture).where(Fixture.match_week_id.in_(match_week_ids))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(update(MatchWeek).where(MatchWeek.season_id == season_id).values(is_active=False))
+    season.archived_at = datetime.utcnow()
+    db.session.commit()
+    invalidate_schedule(match_week_ids)
+    return {
+        'season_id': season_id,
+        'fixtures': fixtures,
+        'predictions': predictions,
+        'total_seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+# Reads that work for live and archived seasons alike.
+
+
+def match_week_fixtures(match_week_id):
+    """Fixtures of a match week, from the archive if its season was archived."""
+    fixtures = Fixture.query.filter_by(match_week_id=match_week_id).order_by(Fixture.id).all()
+    if fixtures:
+        return fixtures
+    return ArchivedFixture.query.filter_by(match_week_id=match_week_id).order_by(ArchivedFixture.id).all()
+
+
+def user_predictions(user_id, season_id):
+    """A user's predictions for a season with their fixtures, as dicts ordered by kickoff."""
+    if is_archived(season_id):
+        prediction, fixture = ArchivedPrediction, ArchivedFixture
+        week_number = ArchivedFixture.week_number
+        stmt = (select(prediction, fixture, week_number)
+                .join(fixture, (fixture.season_id == prediction.season_id)
+                      & (fixture.id == prediction.fixture_id))
+                .where(prediction.user_id == user_id, prediction.season_id == season_id))
+    else:
+        prediction, fixture = Prediction, Fixture
+        stmt = (select(prediction, fixture, Week.week_number)
+                .join(fixture, fixture.id == prediction.fixture_id)
+                .join(MatchWeek, MatchWeek.id == fixture.match_week_id)
+                .join(Week, Week.id == MatchWeek.week_id)
+                .where(prediction.user_id == user_id, MatchWeek.season_id == season_id))
+    rows = db.session.execute(stmt.order_by(fixture.match_datetime, fixture.id)).all()
+    return [
+        {
+            'week_number': week,
+            'fixture_id': f.id,
+            'home_team': f.home_team,
+            'away_team': f.away_team,
+            'match_datetime': f.match_datetime.isoformat() if f.match_datetime else None,
+            'home_score': f.home_score,
+            'away_score': f.away_score,
+            'home_score_prediction': p.home_score_prediction,
+            'away_score_prediction': p.away_score_prediction,
+            'points_earned': p.points_earned,
+        }
+        for p, f, week in rows
+    ]
+
+
+def season_standings_statement(season_id, first, last):
+    return (
+        select(SeasonStanding.position, SeasonStanding.rank, SeasonStanding.user_id, User.name,
+               SeasonStanding.points, SeasonStanding.exact_scores, SeasonStanding.correct_results)
+        .join(User, User.id == SeasonStanding.user_id)
+        .where(SeasonStanding.season_id == season_id, SeasonStanding.position.between(first, last))
+        .order_by(SeasonStanding.position)
+    )
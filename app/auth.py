@@ -0,0 +1,36 @@
+"""
+Google sign-in.
+
+Authlib (and the requests stack under it) is only imported, and the client
+only registered, when someone starts a login; the provider's metadata is
+fetched on that first login too. Worker startup does not pay for either.
+"""
+import threading
+
+from flask import current_app
+
+GOOGLE_METADATA_URL = 'https://accounts.google.com/.well-known/openid-configuration'
+
+_lock = threading.Lock()
+
+
+def google_client():
+    """The app's Google OAuth client, registered on first use."""
+    app = current_app._get_current_object()
+    client = app.extensions.get('google_oauth')
+    if client is not None:
+        return client
+    with _lock:
+        if 'google_oauth' not in app.extensions:
+            from authlib.integrations.flask_client import OAuth
+            oauth = OAuth(app)
+            app.extensions['google_oauth'] = oauth.register(
+                name='google',
+                client_id=app.config['GOOGLE_CLIENT_ID'],
+                client_secret=app.config['GOOGLE_CLIENT_SECRET'],
+                server_metadata_url=GOOGLE_METADATA_URL,
+                client_kwargs={
+                    'scope': 'openid email profile'
+                }
+            )
+    return app.extensions['google_oauth']
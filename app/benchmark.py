@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the prediction workflow.
+
+Builds a synthetic league in a throwaway SQLite file and drives the main
+routes through the Flask test client from a pool of threads, then prints
+latency percentiles, throughput and query counts as JSON. The dataset and
+request mix are derived from --seed, so runs on different commits are
+directly comparable.
+
+    python -m app.benchmark workload --users 500 --concurrency 8 --requests 400
+    python -m app.benchmark render --users 500 --requests 300
+    python -m app.benchmark startup --runs 10
+    python -m app.benchmark whatif --users 3000 --predictions-per-user 40
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+SCENARIOS = ('index', 'predict_match_week', 'submit_prediction', 'leaderboard')
+
+
+def make_app(database_path):
+    os.environ['SQLITE_DB_URI'] = f'sqlite:///{database_path}'
+    os.environ['ARCHIVE_DB_URI'] = f'sqlite:///{database_path}.archive'
+    os.environ['QUERY_COUNT_HEADER'] = '1'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # build_league sets is_active itself; started before the tables exist the scheduler only logs errors.
+    os.environ.setdefault('MATCH_WEEK_SCHEDULER', '0')
+    from app import create_app
+    return create_app()
+
+
+def build_league(users=200, seasons=1, fixtures_per_week=10, predictions_per_user=None, seed=1):
+    """Bulk-insert a synthetic league; returns the ids the workload needs.
+
+    Every season gets 38 match weeks. The last week of the last season is
+    open for predictions; all earlier weeks are completed and scored.
+    """
+    from sqlalchemy import insert, select
+    from .forms import EPL_TEAMS
+    from .models import db, User, Season, Week, MatchWeek, Fixture, Prediction
+    from .scoring import score_fixtures
+    from .standings import rebuild_standings
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    db.create_all()
+
+    db.session.execute(insert(Week), [{'week_number': n} for n in range(1, 39)])
+    db.session.execute(insert(User), [
+        {'email': f'user{i}@example.com', 'name': f'User {i}', 'google_id': f'g{i}'}
+        for i in range(users)
+    ])
+    db.session.execute(insert(Season), [
+        {'season_start_year': 2000 + i, 'season_end_year': 2001 + i} for i in range(seasons)
+    ])
+    week_ids = db.session.execute(select(Week.id).order_by(Week.week_number)).scalars().all()
+    season_ids = db.session.execute(select(Season.id).order_by(Season.id)).scalars().all()
+
+    match_weeks = []
+    total_weeks = len(season_ids) * len(week_ids)
+    for s, season_id in enumerate(season_ids):
+        for w, week_id in enumerate(week_ids):
+            weeks_ago = total_weeks - (s * len(week_ids) + w) - 1
+            close = now + timedelta(days=1) - timedelta(weeks=weeks_ago)
+            match_weeks.append({
+                'season_id': season_id, 'week_id': week_id, 'is_active': weeks_ago == 0,
+                'predictions_open_time': close - timedelta(days=6),
+                'predictions_close_time': close,
+            })
+    db.session.execute(insert(MatchWeek), match_weeks)
+    match_week_rows = db.session.execute(
+        select(MatchWeek.id, MatchWeek.is_active).order_by(MatchWeek.id)).all()
+
+    fixtures = []
+    for match_week_id, is_active in match_week_rows:
+        teams = rng.sample(EPL_TEAMS, fixtures_per_week * 2)
+        for i in range(fixtures_per_week):
+            fixtures.append({
+                'match_week_id': match_week_id,
+                'home_team': teams[2 * i], 'away_team': teams[2 * i + 1],
+                'match_datetime': now + timedelta(days=2),
+                'home_score': None if is_active else rng.randint(0, 4),
+                'away_score': None if is_active else rng.randint(0, 4),
+                'is_completed': not is_active,
+            })
+    db.session.execute(insert(Fixture), fixtures)
+    fixture_rows = db.session.execute(select(Fixture.id, Fixture.match_week_id).order_by(Fixture.id)).all()
+    user_ids = db.session.execute(select(User.id)).scalars().all()
+
+    open_week = next(mw_id for mw_id, is_active in match_week_rows if is_active)
+    open_fixtures = [f_id for f_id, mw_id in fixture_rows if mw_id == open_week]
+    past_fixtures = [f_id for f_id, mw_id in fixture_rows if mw_id != open_week]
+    if predictions_per_user is not None:
+        past_fixtures = past_fixtures[-predictions_per_user:]
+
+    batch = []
+    for user_id in user_ids:
+        for fixture_id in past_fixtures:
+            batch.append({'user_id': user_id, 'fixture_id': fixture_id,
+                          'home_score_prediction': rng.randint(0, 4),
+                          'away_score_prediction': rng.randint(0, 4)})
+            if len(batch) >= 10000:
+                db.session.execute(insert(Prediction), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(Prediction), batch)
+    db.session.commit()
+
+    score_fixtures()
+    rebuild_standings()
+    return {
+        'user_ids': user_ids,
+        'open_match_week_id': open_week,
+        'open_fixture_ids': open_fixtures,
+        'predictions': len(user_ids) * len(past_fixtures),
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def summarize(samples, elapsed):
+    latencies = [s['ms'] for s in samples]
+    queries = [s['queries'] for s in samples if s['queries'] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if s['status'] >= 400),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def run_workload(app, league, scenarios=SCENARIOS, requests_per_scenario=200, concurrency=4, seed=1):
+    local = threading.local()
+
+    def client_for(user_id):
+        clients = getattr(local, 'clients', None)
+        if clients is None:
+            clients = local.clients = {}
+        if user_id not in clients:
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+            clients[user_id] = client
+        return clients[user_id]
+
+    def request_for(scenario, rng):
+        week_id = league['open_match_week_id']
+        if scenario == 'index':
+            return 'GET', '/', None
+        if scenario == 'predict_match_week':
+            return 'GET', f'/predict/{week_id}', None
+        if scenario == 'submit_prediction':
+            fixture_id = rng.choice(league['open_fixture_ids'])
+            return 'POST', f'/submit_prediction/{fixture_id}', {
+                'home_score': str(rng.randint(0, 4)), 'away_score': str(rng.randint(0, 4))}
+        if scenario == 'leaderboard':
+            return 'GET', '/leaderboard?around=me', None
+        raise ValueError(f'Unknown scenario {scenario}')
+
+    def one(job):
+        scenario, user_id, method, path, data = job
+        client = client_for(user_id)
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        ms = (time.perf_counter() - started) * 1000
+        queries = response.headers.get('X-Query-Count')
+        return {'ms': ms, 'status': response.status_code,
+                'queries': int(queries) if queries is not None else None}
+
+    results = {}
+    for scenario in scenarios:
+        rng = random.Random(f'{seed}:{scenario}')
+        jobs = []
+        for _ in range(requests_per_scenario):
+            user_id = rng.choice(league['user_ids'])
+            jobs.append((scenario, user_id, *request_for(scenario, rng)))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, jobs))
+        results[scenario] = summarize(samples, time.perf_counter() - started)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def workload(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            started = time.perf_counter()
+            league = build_league(users=args.users, seasons=args.seasons,
+                                  fixtures_per_week=args.fixtures, seed=args.seed)
+            build_seconds = time.perf_counter() - started
+            from .models import db
+            db.session.remove()
+        results = run_workload(app, league, scenarios=args.scenarios,
+                               requests_per_scenario=args.requests,
+                               concurrency=args.concurrency, seed=args.seed)
+    return {
+        'benchmark': 'workload',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': {'users': args.users, 'seasons': args.seasons, 'fixtures_per_week': args.fixtures,
+                   'requests_per_scenario': args.requests, 'concurrency': args.concurrency,
+                   'seed': args.seed},
+        'dataset': {'predictions': league['predictions'], 'build_seconds': round(build_seconds, 2)},
+        'results': results,
+    }
+
+
+RENDER_SCENARIOS = ('index', 'predict_match_week', 'leaderboard')
+
+
+def render(args):
+    """Page latency with the fragment cache off, then on, over the same dataset."""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            league = build_league(users=args.users, fixtures_per_week=args.fixtures, seed=args.seed)
+            from .models import db
+            db.session.remove()
+        from .cache import cache
+        results = {}
+        for label, enabled in (('uncached', False), ('cached', True)):
+            app.config['FRAGMENT_CACHE'] = enabled
+            cache.backend.clear()
+            results[label] = run_workload(app, league, scenarios=RENDER_SCENARIOS,
+                                          requests_per_scenario=args.requests,
+                                          concurrency=1, seed=args.seed)
+    reduction = {
+        scenario: round(1 - results['cached'][scenario]['mean_ms'] / results['uncached'][scenario]['mean_ms'], 3)
+        for scenario in RENDER_SCENARIOS
+    }
+    return {
+        'benchmark': 'render',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': {'users': args.users, 'fixtures_per_week': args.fixtures,
+                   'requests_per_scenario': args.requests, 'seed': args.seed},
+        'results': results,
+        'mean_latency_reduction': reduction,
+    }
+
+
+# Runs in a fresh interpreter so every import is cold.
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get('/login')
+first_request = time.perf_counter()
+modules = len(sys.modules)
+deferred = [name for name in ('alembic', 'authlib') if name not in sys.modules]
+client.get('/admin')
+first_admin_request = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first_request - created) * 1000,
+    'time_to_first_request_ms': (first_request - started) * 1000,
+    'first_admin_request_ms': (first_admin_request - first_request) * 1000,
+    'modules': modules,
+    'deferred': deferred,
+}))
+"""
+
+
+def startup(args):
+    """Cold import, app creation and first-request times."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, LOG_LEVEL='WARNING',
+                   SQLITE_DB_URI=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+                   ARCHIVE_DB_URI=f"sqlite:///{os.path.join(tmp, 'startup-archive.db')}")
+        runs = [json.loads(subprocess.check_output([sys.executable, '-c', STARTUP_PROBE],
+                                                   cwd=root, env=env, text=True))
+                for _ in range(args.runs)]
+    results = {key: round(statistics.median(run[key] for run in runs), 1)
+               for key in runs[0] if key.endswith('_ms')}
+    results['modules'] = runs[0]['modules']
+    results['deferred'] = runs[0]['deferred']
+    return {
+        'benchmark': 'startup',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': {'runs': args.runs},
+        'results': results,
+    }
+
+
+def whatif(args):
+    """What-if engine load time, size and preview latency over random hypothetical results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            league = build_league(users=args.users, fixtures_per_week=args.fixtures,
+                                  predictions_per_user=args.predictions_per_user, seed=args.seed)
+            from .whatif import ScoringEngine, _numpy
+            started = time.perf_counter()
+            engine = ScoringEngine.load()
+            load_seconds = time.perf_counter() - started
+            rng = random.Random(args.seed)
+            fixture_ids = sorted(engine.fixtures)[-args.fixtures:]
+            samples = []
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                results = {fixture_id: (rng.randint(0, 4), rng.randint(0, 4)) for fixture_id in fixture_ids}
+                began = time.perf_counter()
+                engine.preview(results)
+                samples.append({'ms': (time.perf_counter() - began) * 1000, 'queries': None, 'status': 200})
+            elapsed = time.perf_counter() - started
+    return {
+        'benchmark': 'whatif',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': {'users': args.users, 'fixtures_per_week': args.fixtures,
+                   'predictions_per_user': args.predictions_per_user, 'requests': args.requests,
+                   'seed': args.seed, 'numpy': _numpy() is not None},
+        'dataset': {'predictions': league['predictions']},
+        'engine': {'load_ms': round(load_seconds * 1000, 1), 'bytes': engine.nbytes()},
+        'results': summarize(samples, elapsed),
+    }
+
+
+def fixtures_per_week(value):
+    """argparse type for --fixtures: every fixture needs two teams no other fixture uses."""
+    from .forms import EPL_TEAMS
+    count = int(value)
+    if not 1 <= count <= len(EPL_TEAMS) // 2:
+        raise argparse.ArgumentTypeError(f'must be between 1 and {len(EPL_TEAMS) // 2}')
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--output', help='write the JSON report here as well as to stdout')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('workload', parents=[common],
+                            help='drive the main routes with concurrent clients')
+    p.add_argument('--users', type=int, default=200)
+    p.add_argument('--seasons', type=int, default=1)
+    p.add_argument('--fixtures', type=fixtures_per_week, default=10, help='fixtures per match week')
+    p.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    p.add_argument('--concurrency', type=int, default=4)
+    p.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    p.add_argument('--seed', type=int, default=1)
+    p.set_defaults(run=workload)
+
+    p = commands.add_parser('render', parents=[common],
+                            help='compare page latency with and without the fragment cache')
+    p.add_argument('--users', type=int, default=200)
+    p.add_argument('--fixtures', type=fixtures_per_week, default=10, help='fixtures per match week')
+    p.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    p.add_argument('--seed', type=int, default=1)
+    p.set_defaults(run=render)
+
+    p = commands.add_parser('startup', parents=[common],
+                            help='cold import and time-to-first-request')
+    p.add_argument('--runs', type=int, default=5, help='fresh interpreters (median is reported)')
+    p.set_defaults(run=startup)
+
+    p = commands.add_parser('whatif', parents=[common],
+                            help='what-if engine load time and preview latency')
+    p.add_argument('--users', type=int, default=3000)
+    p.add_argument('--fixtures', type=fixtures_per_week, default=10, help='fixtures per match week (all previewed)')
+    p.add_argument('--predictions-per-user', type=int, default=40)
+    p.add_argument('--requests', type=int, default=200, help='previews to run')
+    p.add_argument('--seed', type=int, default=1)
+    p.set_defaults(run=whatif)
+
+    args = parser.parse_args(argv)
+    report = args.run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
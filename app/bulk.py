@@ -0,0 +1,87 @@
+"""
+Dialect-aware bulk upserts.
+
+`upsert_statement` builds INSERT ... ON CONFLICT DO UPDATE (PostgreSQL,
+SQLite) or INSERT ... ON DUPLICATE KEY UPDATE (MySQL) for a list of row
+dicts, so callers can write many rows with one statement.
+`insert_missing` inserts only the rows that do not exist yet, in batches,
+which is safe when concurrent transactions create the same rows.
+"""
+from sqlalchemy import func, or_
+
+from .models import db
+
+# Multi-row VALUES are bound per column, so batches stay under SQLite's
+# bound-parameter limit.
+BATCH_ROWS = 1000
+
+
+def upsert_statement(model, rows, conflict_columns, update_columns, constraint=None,
+                     increment_columns=(), newer_column=None):
+    """Insert `rows`, updating `update_columns` where `conflict_columns` clash.
+
+    `increment_columns` are added to the stored value instead of replacing
+    it. With `newer_column`, a stored row is only updated when its value
+    there is NULL or not later than the incoming one, so a replayed or
+    reordered write never overwrites a later change. `constraint` names the
+    unique constraint for PostgreSQL; SQLite infers it from
+    `conflict_columns`.
+    """
+    dialect = db.session.get_bind(mapper=model).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(rows)
+        values = [(column, stmt.inserted[column]) for column in update_columns if column != newer_column]
+        values += [(column, getattr(model, column) + stmt.inserted[column]) for column in increment_columns]
+        if newer_column is not None:
+            # MySQL has no conditional ON DUPLICATE KEY UPDATE: guard each
+            # assignment instead, and set the guard column last because
+            # later assignments see the earlier ones.
+            stored = getattr(model, newer_column)
+            newer = or_(stored.is_(None), stored <= stmt.inserted[newer_column])
+            values = [(column, func.if_(newer, value, getattr(model, column))) for column, value in values]
+            values.append((newer_column, func.if_(newer, stmt.inserted[newer_column], stored)))
+        return stmt.on_duplicate_key_update(values)
+    else:
+        raise NotImplementedError(f'Upserts are not supported on {dialect}')
+
+    stmt = insert(model).values(rows)
+    conflict = {'constraint': constraint} if dialect == 'postgresql' and constraint \
+        else {'index_elements': list(conflict_columns)}
+    if newer_column is not None:
+        stored = getattr(model, newer_column)
+        conflict['where'] = or_(stored.is_(None), stored <= stmt.excluded[newer_column])
+    return stmt.on_conflict_do_update(
+        **conflict,
+        set_={**{column: stmt.excluded[column] for column in update_columns},
+              **{column: getattr(model, column) + stmt.excluded[column] for column in increment_columns}},
+    )
+
+
+def insert_missing_statement(model, rows, conflict_columns):
+    """Insert `rows`, skipping any that clash on `conflict_columns`."""
+    dialect = db.session.get_bind(mapper=model).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        return insert(model).values(rows).prefix_with('IGNORE')
+    else:
+        raise NotImplementedError(f'Upserts are not supported on {dialect}')
+    return insert(model).values(rows).on_conflict_do_nothing(index_elements=list(conflict_columns))
+
+
+def insert_missing(model, rows, conflict_columns, batch_size=BATCH_ROWS):
+    """Returns the number of rows actually inserted."""
+    inserted = 0
+    for start in range(0, len(rows), batch_size):
+        result = db.session.execute(
+            insert_missing_statement(model, rows[start:start + batch_size], conflict_columns))
+        inserted += max(result.rowcount or 0, 0)
+    return inserted
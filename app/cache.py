@@ -0,0 +1,452 @@
+"""
+Small cache layer for data that only changes when an admin edits it.
+
+`cache` is configured in create_app from:
+
+    CACHE_BACKEND      'memory' (default), 'filesystem' or 'redis'
+    CACHE_TTL          seconds an entry lives (default 300)
+    CACHE_MAX_ENTRIES  bound on the number of entries (default 512)
+    CACHE_DIR          directory for the filesystem backend
+    CACHE_REDIS_URL    URL for the redis backend
+    USER_CACHE_TTL     seconds a logged-in user snapshot lives (default 30)
+    USER_CACHE_SIZE    bound on cached user snapshots (default 4096)
+
+The memory backend is per process. When several gunicorn workers run, use
+the filesystem backend (or redis, if the package is installed) so that an
+invalidation in one worker is seen by the others. User snapshots are always
+kept per process with a short TTL.
+
+Entries are grouped into namespaces. Invalidating a namespace bumps its
+generation number, which is part of every key in it, so all of its
+entries go stale at once without having to enumerate them.
+
+Entries are shared by every user, so they are always filled from the
+primary, even inside a @read_replica view. Otherwise a fill from a lagging
+replica would serve data from before the invalidation to everyone until
+its TTL ran out.
+
+The version counters behind HTTP validators (see http_cache.py) are rows
+of the content_version table rather than cache entries: one per
+leaderboard, per match week and per user's predictions for a match week.
+Every process that writes, including CLI commands and job workers, bumps
+them with one atomic upsert inside the same transaction as its change, so
+they survive restarts and evictions and are never visible before the data.
+"""
+import fcntl
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload
+
+from .bulk import upsert_statement
+from .database import on_primary
+from .models import db, ContentVersion, MatchWeek, Fixture, User
+
+MISSING = object()
+
+# Keys holding counters. Backends never evict them: losing one would make
+# entries from before an invalidation current again.
+COUNTER_PREFIXES = ('generation:', 'version:')
+
+
+def _is_counter(key):
+    return isinstance(key, str) and key.startswith(COUNTER_PREFIXES)
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry; counters are kept outside the LRU."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if _is_counter(key):
+                self._counters[key] = value
+                return
+            self._data[key] = (float('inf') if ttl is None else time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+
+class FileSystemBackend:
+    """Pickle files in a shared directory; usable across worker processes.
+
+    Counters live in a `counters` subdirectory that pruning never touches,
+    and are incremented under an flock. Entries are pruned, oldest first,
+    once every PRUNE_EVERY writes rather than on each one.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, directory=None, max_entries=512):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'epl-predictions-cache')
+        self.max_entries = max_entries
+        self.counter_directory = os.path.join(self.directory, 'counters')
+        os.makedirs(self.counter_directory, exist_ok=True)
+        self._writes = 0
+
+    def _path(self, key):
+        directory = self.counter_directory if _is_counter(key) else self.directory
+        return os.path.join(directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return MISSING
+        if expires is not None and expires < time.time():
+            return MISSING
+        return value
+
+    def set(self, key, value, ttl, expires=MISSING):
+        if expires is MISSING:
+            expires = None if ttl is None else time.time() + ttl
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def incr(self, key):
+        with open(os.path.join(self.counter_directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = self.get(key)
+            value = (0 if value is MISSING else value) + 1
+            self.set(key, value, None, expires=None)
+            return value
+
+    def _prune(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for path in (entry.path for entry in entries[:len(entries) - self.max_entries]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for directory in (self.directory, self.counter_directory):
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+
+class RedisBackend:
+    """Keys are namespaced with `prefix`, so the database can be shared."""
+
+    def __init__(self, url, prefix='epl-predictions:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return MISSING
+        # INCR stores counters as plain digits; everything else is a pickle.
+        return int(raw) if raw.isdigit() else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=None if ttl is None else int(ttl))
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*', count=1000))
+        for start in range(0, len(keys), 1000):
+            self.client.delete(*keys[start:start + 1000])
+
+
+class Cache:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = 300
+        self.users = MemoryBackend(4096)
+        self.user_ttl = 30
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 512)
+        if backend == 'filesystem':
+            self.backend = FileSystemBackend(app.config.get('CACHE_DIR'), max_entries)
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = MemoryBackend(max_entries)
+        self.ttl = app.config.get('CACHE_TTL', 300)
+        self.users = MemoryBackend(app.config.get('USER_CACHE_SIZE', 4096))
+        self.user_ttl = app.config.get('USER_CACHE_TTL', 30)
+        if not event.contains(Session, 'before_commit', _bump_pending):
+            event.listen(Session, 'before_commit', _bump_pending)
+            event.listen(Session, 'after_soft_rollback', _drop_pending)
+        app.extensions['cache'] = self
+
+    def generation(self, namespace):
+        value = self.backend.get(f'generation:{namespace}')
+        return 0 if value is MISSING else value
+
+    def _key(self, namespace, key):
+        return f'{namespace}:{self.generation(namespace)}:{key}'
+
+    def get_or_set(self, namespace, key, factory, ttl=None):
+        full_key = self._key(namespace, key)
+        value = self.backend.get(full_key)
+        if value is not MISSING:
+            with self._stats_lock:
+                self.hits += 1
+            return value
+        with self._stats_lock:
+            self.misses += 1
+        with on_primary():
+            value = factory()
+        self.backend.set(full_key, value, ttl or self.ttl)
+        return value
+
+    def invalidate(self, namespace):
+        self.backend.incr(f'generation:{namespace}')
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else None,
+        }
+
+
+cache = Cache()
+
+
+# Cached schedule lookups. Everything here is derived from MatchWeek/Fixture
+# rows and is invalidated through the 'schedule' namespace. Cached fixtures
+# also carry their scores, so their keys include the 'scores' generation:
+# a score update drops them without touching the rest of the schedule.
+
+SCHEDULE = 'schedule'
+SCORES = 'scores'
+
+
+class MatchWeekSnapshot(SimpleNamespace):
+    @property
+    def is_predictions_open(self):
+        now = datetime.utcnow()
+        return self.predictions_open_time <= now <= self.predictions_close_time
+
+
+def _match_week_dict(match_week):
+    return {
+        'id': match_week.id,
+        'season_id': match_week.season_id,
+        'week_id': match_week.week_id,
+        'week_number': match_week.week.week_number if match_week.week else None,
+        'predictions_open_time': match_week.predictions_open_time,
+        'predictions_close_time': match_week.predictions_close_time,
+        'is_active': match_week.is_active,
+    }
+
+
+def _fixture_dict(fixture):
+    return {
+        'id': fixture.id,
+        'match_week_id': fixture.match_week_id,
+        'home_team': fixture.home_team,
+        'away_team': fixture.away_team,
+        'match_datetime': fixture.match_datetime,
+        'home_score': fixture.home_score,
+        'away_score': fixture.away_score,
+        'is_completed': fixture.is_completed,
+    }
+
+
+def get_active_match_weeks():
+    def load():
+        match_weeks = MatchWeek.query.options(joinedload(MatchWeek.week)).filter_by(is_active=True).all()
+        return [_match_week_dict(match_week) for match_week in match_weeks]
+    return [MatchWeekSnapshot(**data) for data in cache.get_or_set(SCHEDULE, 'active', load)]
+
+
+def get_match_week(match_week_id):
+    """Snapshot of a match week, including its prediction window, or None."""
+    def load():
+        match_week = MatchWeek.query.options(joinedload(MatchWeek.week)).get(match_week_id)
+        return _match_week_dict(match_week) if match_week else None
+    data = cache.get_or_set(SCHEDULE, f'match_week:{match_week_id}', load)
+    return MatchWeekSnapshot(**data) if data else None
+
+
+def get_fixtures(match_week_id):
+    def load():
+        from .archive import match_week_fixtures
+        return [_fixture_dict(fixture) for fixture in match_week_fixtures(match_week_id)]
+    key = f'fixtures:{match_week_id}:{cache.generation(SCORES)}'
+    return [SimpleNamespace(**data) for data in cache.get_or_set(SCHEDULE, key, load)]
+
+
+def invalidate_schedule(match_week_ids=()):
+    """Drop cached schedule data and bump the schedule version; the ids also
+    bump those match weeks' versions.
+
+    Called once the change has committed; the bump commits on its own.
+    """
+    cache.invalidate(SCHEDULE)
+    bump_versions(db.session, {SCHEDULE_VERSION} | {match_week_version(match_week_id)
+                                                    for match_week_id in match_week_ids})
+    db.session.commit()
+
+
+def invalidate_scores(match_week_ids=()):
+    """Drop cached fixture scores and bump the scores version; the ids also
+    bump those match weeks' scores versions.
+
+    Fixtures and prediction windows are unchanged, so the schedule index
+    and the schedule fragments stay as they are. Called once the change has
+    committed; the bump commits on its own.
+    """
+    cache.invalidate(SCORES)
+    bump_versions(db.session, {SCORES_VERSION} | {scores_version(match_week_id)
+                                                  for match_week_id in match_week_ids})
+    db.session.commit()
+
+
+# Version counters for HTTP validators.
+
+LEADERBOARD_VERSION = 'leaderboard'
+# Any change to match weeks or fixtures, from any process (see schedule.py).
+SCHEDULE_VERSION = 'schedule'
+# Any change to fixture scores or the points earned on them.
+SCORES_VERSION = 'scores'
+
+
+def match_week_version(match_week_id):
+    return f'match_week:{match_week_id}'
+
+
+def scores_version(match_week_id):
+    return f'scores:{match_week_id}'
+
+
+def predictions_version(user_id, match_week_id):
+    return f'predictions:{user_id}:{match_week_id}'
+
+
+def get_versions(names):
+    """[(version, modified timestamp or None)] for each counter name, in one query."""
+    rows = {name: (version, modified_at) for name, version, modified_at in db.session.execute(
+        select(ContentVersion.name, ContentVersion.version, ContentVersion.modified_at)
+        .where(ContentVersion.name.in_(set(names))))}
+    return [rows.get(name, (0, None)) for name in names]
+
+
+def bump_versions(session, names):
+    now = time.time()
+    session.execute(upsert_statement(
+        ContentVersion, [{'name': name, 'version': 1, 'modified_at': now} for name in sorted(names)],
+        conflict_columns=('name',), update_columns=('modified_at',), increment_columns=('version',)))
+
+
+def bump_on_commit(*names):
+    """Bump counters as part of the current transaction, so a client can
+    never cache pre-commit content under a post-commit version."""
+    db.session.info.setdefault('pending_versions', set()).update(names)
+
+
+def _bump_pending(session):
+    names = session.info.pop('pending_versions', None)
+    if names:
+        bump_versions(session, names)
+
+
+def _drop_pending(session, previous_transaction):
+    session.info.pop('pending_versions', None)
+
+
+
+# Logged-in user snapshots for the Flask-Login user loader.
+
+class CachedUser(UserMixin):
+    """Read-only view of a User with just what requests need."""
+
+    def __init__(self, id, name, is_admin):
+        self.id = id
+        self.name = name
+        self.is_admin = is_admin
+
+    def __repr__(self):
+        return f'<CachedUser {self.id}>'
+
+
+def load_cached_user(user_id):
+    snapshot = cache.users.get(user_id)
+    if snapshot is not MISSING:
+        cache.hits += 1
+        return snapshot
+    cache.misses += 1
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+    snapshot = CachedUser(user.id, user.name, bool(user.is_admin))
+    cache.users.set(user_id, snapshot, cache.user_ttl)
+    return snapshot
+
+
+def invalidate_user(user_id):
+    cache.users.delete(user_id)
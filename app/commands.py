@@ -0,0 +1,247 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('score-fixtures')
+@click.option('--match-week-id', type=int, default=None, help='Only score fixtures in this match week.')
+@with_appcontext
+def score_fixtures_command(match_week_id):
+    """Score all predictions on completed fixtures."""
+    from .scoring import score_fixtures
+    report = score_fixtures(match_week_id=match_week_id)
+    click.echo(f"Scored {report['rows_updated']} predictions in {report['elapsed_seconds']}s "
+               f"({report['rows_per_second']} rows/s)")
+
+
+@click.command('rebuild-standings')
+@with_appcontext
+def rebuild_standings_command():
+    """Recompute the leaderboard and weekly history tables from all predictions."""
+    from .standings import rebuild_standings
+    rebuild_standings()
+    click.echo('Standings rebuilt')
+
+
+@click.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query.')
+@with_appcontext
+def check_query_plans_command(verbose):
+    """Fail if a hot-path query falls back to a full table scan."""
+    from .query_plans import HOT_QUERIES, check_query_plans, explain
+    if verbose:
+        for name, build in HOT_QUERIES:
+            click.echo(f'{name}:')
+            for detail in explain(build()):
+                click.echo(f'    {detail}')
+    failures = check_query_plans()
+    for name, scans in failures.items():
+        click.echo(f'FULL SCAN in {name}: ' + '; '.join(scans), err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo(f'{len(HOT_QUERIES)} query plans OK')
+
+
+def _parse_weeks(value):
+    weeks = []
+    for part in value.split(','):
+        start, _, end = part.partition('-')
+        weeks.extend(range(int(start), int(end or start) + 1))
+    return weeks
+
+
+@click.command('import-fixtures')
+@click.option('--season-id', type=int, default=None, help='Defaults to the latest season.')
+@click.option('--weeks', default='1-38', help='Week numbers, e.g. 1-38 or 1,2,5-7.')
+@click.option('--provider', default=None, help='Overrides FIXTURE_PROVIDER (mock, file:<dir>, http://...).')
+@click.option('--workers', type=int, default=None, help='Concurrent fetches.')
+@with_appcontext
+def import_fixtures_command(season_id, weeks, provider, workers):
+    """Import fixtures for a season from the configured provider."""
+    from flask import current_app
+    from .importer import import_fixtures, provider_from_config
+    from .models import Season
+    if season_id:
+        season = Season.query.get(season_id)
+    else:
+        season = Season.query.order_by(Season.season_start_year.desc()).first()
+    if season is None:
+        raise click.ClickException('No such season')
+    workers = workers or current_app.config['IMPORT_WORKERS']
+    source = provider_from_config(provider or current_app.config['FIXTURE_PROVIDER'], pool_size=workers)
+    try:
+        report = import_fixtures(season, source, _parse_weeks(weeks), max_workers=workers)
+    finally:
+        source.close()
+    for week in report['weeks']:
+        click.echo(f"Week {week['week_number']:>2}: {week['fixtures']} fixtures "
+                   f"(fetch {week['fetch_seconds']}s, write {week['persist_seconds']}s)")
+    click.echo(f"Imported {report['fixtures']} fixtures in {report['total_seconds']}s")
+
+
+@click.command('ingest-scores')
+@click.option('--file', 'path', type=click.Path(exists=True, dir_okay=False), help='JSONL feed to read.')
+@click.option('--follow', is_flag=True, help='Keep reading the file as new events are appended.')
+@click.option('--listen', default=None, help='host:port to accept events on over TCP.')
+@with_appcontext
+def ingest_scores_command(path, follow, listen):
+    """Apply live score events and rescore the affected fixtures."""
+    from flask import current_app
+    from .live import consume, follow_file, serve_socket
+
+    def echo(report):
+        click.echo(f"Fixture {report['fixture_id']}: {report['rows_updated']} predictions rescored, "
+                   f"{report['users_changed']} users changed in {report['latency_ms']}ms")
+
+    if listen:
+        host, _, port = listen.rpartition(':')
+        click.echo(f'Listening for score events on {host or "127.0.0.1"}:{port}')
+        serve_socket(current_app._get_current_object(), host or '127.0.0.1', int(port), on_report=echo)
+    elif path:
+        for report in consume(follow_file(path, follow=follow)):
+            echo(report)
+    else:
+        raise click.UsageError('Pass --file or --listen')
+
+
+@click.command('load-season')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def load_season_command(path):
+    """Create a season, its match weeks and fixtures from a JSON or CSV schedule."""
+    from .season_loader import load_season, read_schedule
+    try:
+        report = load_season(read_schedule(path))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Loaded season {report['season_id']}: {report['match_weeks']} match weeks, "
+               f"{report['fixtures']} fixtures in {report['total_seconds']}s "
+               f"(validation {report['validate_seconds']}s)")
+
+
+@click.command('seed-weeks')
+@with_appcontext
+def seed_weeks_command():
+    """Create EPL weeks 1-38 if they are missing."""
+    from .models import db
+    from .season_loader import ensure_weeks
+    created = ensure_weeks()
+    db.session.commit()
+    click.echo(f'Created {created} weeks')
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables, columns and indexes, and weeks 1-38; run on every deployment."""
+    from .database import upgrade_schema
+    from .models import db
+    from .scoring import clear_unscored_points
+    from .season_loader import ensure_weeks
+    from .standings import rebuild_standings
+    changes = upgrade_schema(db)
+    for change in changes:
+        click.echo(change)
+    cleared = clear_unscored_points()
+    if cleared:
+        click.echo(f'marked {cleared} predictions on unplayed fixtures as unscored')
+    if cleared or any(change.startswith('created table') for change in changes):
+        # New rollup tables start empty, and cleared rows no longer count.
+        rebuild_standings(commit=False)
+        click.echo('rebuilt standings')
+    created = ensure_weeks()
+    db.session.commit()
+    click.echo(f'Tables ready; created {created} weeks')
+
+
+@click.command('sync-replica')
+@with_appcontext
+def sync_replica_command():
+    """Copy the primary SQLite database into the REPLICA_DB_URI file."""
+    from . import db
+    from .database import sync_replica
+    try:
+        pages = sync_replica(db)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Replica synced ({pages} pages)')
+
+
+@click.command('jobs-worker')
+@click.option('--processes', type=int, default=1, help='Worker processes to run.')
+@click.option('--once', is_flag=True, help='Exit when the queue is empty.')
+@with_appcontext
+def jobs_worker_command(processes, once):
+    """Run queued background jobs."""
+    from flask import current_app
+    from .jobs import run_workers, work
+    click.echo(f'Running {processes} job worker(s)')
+    if processes == 1:
+        work(current_app._get_current_object(), once=once)
+    elif any(run_workers(processes, once=once)):
+        raise SystemExit(1)
+
+
+@click.command('export-predictions')
+@click.option('--season-id', type=int, default=None, help='Only this season.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default='csv')
+@click.option('--output', required=True,
+              help='CSV file ("-" for stdout), or a directory for one Parquet file per season.')
+@with_appcontext
+def export_predictions_command(season_id, fmt, output):
+    """Stream every prediction with its fixture, week and user."""
+    from flask import current_app
+    from .exports import export_parquet, predictions_csv
+    batch_rows = current_app.config['EXPORT_BATCH_ROWS']
+    if fmt == 'parquet':
+        try:
+            written = export_parquet(output, season_id, batch_rows)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for path, rows in written.items():
+            click.echo(f'{path}: {rows} rows')
+        return
+    with click.open_file(output, 'w', newline='') as f:
+        for chunk in predictions_csv(season_id, batch_rows):
+            f.write(chunk)
+
+
+@click.command('export-standings')
+@click.option('--output', required=True, help='CSV file, or "-" for stdout.')
+@with_appcontext
+def export_standings_command(output):
+    """Write the leaderboard as CSV."""
+    from flask import current_app
+    from .exports import standings_csv
+    with click.open_file(output, 'w', newline='') as f:
+        for chunk in standings_csv(current_app.config['EXPORT_BATCH_ROWS']):
+            f.write(chunk)
+
+
+@click.command('archive-season')
+@click.argument('season_id', type=int)
+@with_appcontext
+def archive_season_command(season_id):
+    """Move a finished season's fixtures and predictions into the archive."""
+    from .archive import archive_season
+    try:
+        report = archive_season(season_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Archived {report['fixtures']} fixtures and {report['predictions']} predictions "
+               f"in {report['total_seconds']}s")
+
+
+def register_commands(app):
+    app.cli.add_command(score_fixtures_command)
+    app.cli.add_command(rebuild_standings_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(import_fixtures_command)
+    app.cli.add_command(ingest_scores_command)
+    app.cli.add_command(load_season_command)
+    app.cli.add_command(seed_weeks_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(sync_replica_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(export_predictions_command)
+    app.cli.add_command(export_standings_command)
+    app.cli.add_command(archive_season_command)
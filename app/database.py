@@ -0,0 +1,198 @@
+"""
+Engine configuration and read/write routing.
+
+Pool settings come from the environment and apply to every engine:
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT   queue pool sizing
+    DB_POOL_RECYCLE                                  seconds before a connection is replaced
+    DB_POOL_PRE_PING=1                               test connections on checkout
+
+SQLite connections are switched to WAL with a busy timeout
+(SQLITE_BUSY_TIMEOUT milliseconds) so readers do not block the writer.
+
+When REPLICA_DB_URI is set it becomes the 'replica' bind. Views decorated
+with @read_replica send their SELECTs there; everything else, including
+any write and any flush, stays on the primary. A user who has just written
+is kept on the primary for REPLICA_STICKY_SECONDS so they read their own
+changes. The logged-in user is always loaded from the primary, so someone
+who has just signed up is never missing from a lagging replica. With two
+SQLite files, `flask sync-replica` copies the primary into the replica; a
+Postgres replica is kept in sync by the server.
+
+The 'archive' bind (ARCHIVE_DB_URI) holds archived seasons; see
+archive.py. It is never routed to the replica.
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import UniqueConstraint, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import AddConstraint
+
+REPLICA = 'replica'
+ARCHIVE = 'archive'
+_STICKY_KEY = '_primary_until'
+
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS built from the DB_POOL_* environment variables."""
+    options = {}
+    if os.environ.get('DB_POOL_PRE_PING') == '1':
+        options['pool_pre_ping'] = True
+    if os.environ.get('DB_POOL_RECYCLE'):
+        options['pool_recycle'] = int(os.environ['DB_POOL_RECYCLE'])
+    url = make_url(uri)
+    in_memory = url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+    if not in_memory:
+        # In-memory SQLite uses a single static connection; sizing does not apply.
+        for env, key in (('DB_POOL_SIZE', 'pool_size'), ('DB_MAX_OVERFLOW', 'max_overflow'),
+                         ('DB_POOL_TIMEOUT', 'pool_timeout')):
+            if os.environ.get(env):
+                options[key] = int(os.environ[env])
+    return options
+
+
+def _sqlite_pragmas(busy_timeout, wal):
+    def on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        if wal:
+            # In-memory databases ignore this and stay in 'memory' mode.
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.close()
+    return on_connect
+
+
+class RoutingSession(Session):
+    """Sends SELECTs issued inside @read_replica views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if (bind is None and not self._flushing and _replica_requested()
+                and getattr(clause, 'is_select', False) and engine is self._db.engines[None]):
+            return self._db.engines.get(REPLICA, engine)
+        return engine
+
+
+def _replica_requested():
+    return has_request_context() and g.get('use_replica', False)
+
+
+def read_replica(view):
+    """Serve a read-only view from the replica unless the user just wrote."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_replica = session.get(_STICKY_KEY, 0) < time.time()
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@contextmanager
+def on_primary():
+    """Run the block's queries on the primary, even inside a @read_replica view."""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('use_replica', False)
+    g.use_replica = False
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+
+def stick_to_primary():
+    """Keep the current user on the primary long enough to read their own write."""
+    seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 0)
+    if seconds and REPLICA in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        session[_STICKY_KEY] = time.time() + seconds
+
+
+def sync_replica(db):
+    """Copy the primary SQLite database into the replica file; returns the pages copied."""
+    primary, replica = db.engines[None], db.engines.get(REPLICA)
+    if replica is None:
+        raise RuntimeError('REPLICA_DB_URI is not configured')
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise RuntimeError('sync-replica only copies SQLite files; use server replication for other databases')
+    source = sqlite3.connect(primary.url.database)
+    target = sqlite3.connect(replica.url.database)
+    try:
+        pages = source.execute('PRAGMA page_count').fetchone()[0]
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    replica.dispose()
+    return pages
+
+
+def upgrade_schema(db):
+    """Bring existing tables up to the models; returns a description of each change.
+
+    create_all only creates missing tables. This also adds columns that are
+    missing from existing tables and creates any missing indexes and named
+    unique constraints, which is all the schema changes so far have needed.
+    SQLite cannot add a constraint to a table, so there a unique index of
+    the same name stands in; ON CONFLICT accepts either. A new NOT NULL
+    column without a server default cannot be added this way and raises
+    instead, as does a unique constraint that existing rows violate.
+    """
+    changes = []
+    for bind_key, metadata in db.metadatas.items():
+        if not metadata.tables:
+            continue  # the replica bind has no tables of its own
+        engine = db.engines[bind_key]
+        with engine.connect() as connection:
+            tables = set(inspect(connection).get_table_names())
+        metadata.create_all(engine)
+        changes.extend(f'created table {table.name}' for table in metadata.sorted_tables
+                       if table.name not in tables)
+        with engine.begin() as connection:
+            inspector = inspect(connection)
+            for table in metadata.sorted_tables:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    if not column.nullable and column.server_default is None:
+                        raise RuntimeError(f'{table.name}.{column.name} is NOT NULL without a default; '
+                                           'add it by hand')
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    changes.append(f'added {table.name}.{column.name}')
+                indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in indexes:
+                        index.create(connection)
+                        changes.append(f'created index {index.name}')
+                unique = indexes | {constraint['name'] for constraint in
+                                    inspector.get_unique_constraints(table.name)}
+                for constraint in table.constraints:
+                    if not isinstance(constraint, UniqueConstraint) or constraint.name in unique \
+                            or constraint.name is None:
+                        continue
+                    if engine.dialect.name == 'sqlite':
+                        columns = ', '.join(column.name for column in constraint.columns)
+                        connection.execute(text(f'CREATE UNIQUE INDEX {constraint.name} '
+                                                f'ON {table.name} ({columns})'))
+                    else:
+                        connection.execute(AddConstraint(constraint))
+                    changes.append(f'created unique constraint {constraint.name}')
+    return changes
+
+
+def init_app(app, db):
+    on_connect = _sqlite_pragmas(app.config['SQLITE_BUSY_TIMEOUT'], app.config['SQLITE_WAL'])
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', on_connect)
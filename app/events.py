@@ -0,0 +1,345 @@
+"""
+Push channel for leaderboard, fixture score and prediction-window changes.
+
+`broker` keeps a bounded log of recent events in memory. Clients stream
+it from /events (Server-Sent Events, resumable with Last-Event-ID) or
+poll /events/poll. Events published inside a database transaction are
+held until it commits and dropped if it rolls back.
+
+EVENTS_BACKEND selects how events reach other processes:
+
+    memory   only this process (default)
+    file     append to EVENTS_DIR/events.jsonl; every process tails it.
+             Past EVENTS_FILE_MAX_BYTES it is moved to events.jsonl.1
+             and a new log is started.
+    redis    publish on EVENTS_REDIS_URL (needs the redis package)
+
+Use 'file' or 'redis' when scores are ingested by a separate process or
+several web workers run. Their event ids come from one shared sequence,
+numbered under the log's flock or by a Redis counter. So a client's last
+id means the same thing to every worker it reconnects to.
+
+/events/poll answers at once with the events after the client's last id.
+A page that polls every few seconds costs a short request, not a held
+worker thread, so it is the path for large numbers of idle pages. Each
+open /events stream holds a worker thread for as long as the page stays
+open, so a process serves at most EVENTS_MAX_STREAMS of them (default 4).
+Beyond that /events answers 503, and the page script
+(static/js/events.js) polls instead.
+"""
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event
+
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'epl-predictions'
+
+
+def _decode(raw):
+    """(kind, data, id) from a transported event, or None if it is malformed."""
+    try:
+        message = json.loads(raw)
+        return message['kind'], message['data'], int(message['id'])
+    except (ValueError, KeyError, TypeError):
+        logger.warning('skipping malformed event %r', raw[:200])
+        return None
+
+
+class Broker:
+    def __init__(self, history=1024):
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._transport = None
+        self._streams = threading.BoundedSemaphore(4)
+
+    def init_app(self, app):
+        self._streams = threading.BoundedSemaphore(app.config.get('EVENTS_MAX_STREAMS', 4))
+        backend = app.config.get('EVENTS_BACKEND', 'memory')
+        if backend == 'file':
+            self._transport = FileTransport(self, app.config.get('EVENTS_DIR'),
+                                            app.config.get('EVENTS_FILE_MAX_BYTES', 1024 * 1024))
+        elif backend == 'redis':
+            self._transport = RedisTransport(self, app.config['EVENTS_REDIS_URL'])
+        else:
+            self._transport = None
+        app.extensions['events'] = self
+
+    @property
+    def last_id(self):
+        return self._seq
+
+    @property
+    def shared(self):
+        """True when event ids come from a sequence shared by every process."""
+        return self._transport is not None
+
+    def publish(self, kind, data, key=None):
+        """Send an event to every process.
+
+        An event with a `key` is sent once however many processes publish
+        it: a key already used recently is dropped.
+        """
+        if self._transport is not None:
+            self._transport.send(kind, data, key)
+        else:
+            self.deliver(kind, data)
+
+    def deliver(self, kind, data, seq=None):
+        """Add an event to this process's log; `seq` is its shared id, if it has one."""
+        with self._cond:
+            self._seq = self._seq + 1 if seq is None else seq
+            self._events.append((self._seq, kind, data))
+            self._cond.notify_all()
+
+    def open_stream(self):
+        """Take a stream slot; False when every slot is in use."""
+        return self._streams.acquire(blocking=False)
+
+    def close_stream(self):
+        self._streams.release()
+
+    def since(self, last_id):
+        return [e for e in self._events if e[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Block until there are events after last_id or the timeout passes."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= last_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+            return self.since(last_id)
+
+
+class FileTransport:
+    """Shared JSONL log; a daemon thread in each process tails it.
+
+    Senders append under an flock. Under the same lock they take the next
+    event id from events.state, which also remembers the last KEYS_KEPT
+    keys for once-only events. The sender whose line takes the log past
+    max_bytes moves it to events.jsonl.1 and starts a new one. A tailer that
+    reaches the end of a log that has been replaced reads what is left of
+    it, then follows the new log from its start. A tailer that sleeps
+    through two rotations misses the log in between, so max_bytes should
+    be far more than is ever written in a tenth of a second.
+    """
+
+    KEYS_KEPT = 256
+
+    def __init__(self, broker, directory=None, max_bytes=1024 * 1024):
+        directory = directory or os.path.join(tempfile.gettempdir(), 'epl-predictions-events')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'events.jsonl')
+        self.lock_path = os.path.join(directory, 'events.lock')
+        self.state_path = os.path.join(directory, 'events.state')
+        self.max_bytes = max_bytes
+        self.broker = broker
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            open(self.path, 'a').close()
+            # Start from the shared sequence, so resumed clients are not replayed.
+            broker._seq = self._state()['seq']
+            f = open(self.path)
+            f.seek(0, os.SEEK_END)
+        threading.Thread(target=self._tail, args=(f,), daemon=True).start()
+
+    def _state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'seq': 0, 'keys': []}
+
+    def _save_state(self, state):
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.state_path)
+
+    def send(self, kind, data, key=None):
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self._state()
+            if key is not None:
+                if key in state['keys']:
+                    return
+                state['keys'] = (state['keys'] + [key])[-self.KEYS_KEPT:]
+            state['seq'] += 1
+            line = json.dumps({'id': state['seq'], 'kind': kind, 'data': data}, default=str) + '\n'
+            with open(self.path, 'a') as f:
+                f.write(line)
+                full = f.tell() >= self.max_bytes
+            self._save_state(state)
+            if full:
+                os.replace(self.path, self.path + '.1')
+                open(self.path, 'a').close()
+
+    def _deliver(self, line):
+        message = _decode(line)
+        if message is not None:
+            self.broker.deliver(*message)
+
+    def _replaced(self, f):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return False  # mid-rotation; the new log appears in a moment
+
+    def _follow(self, f):
+        buffer = ''
+        while True:
+            chunk = f.readline()
+            if not chunk:
+                if not self._replaced(f):
+                    time.sleep(0.1)
+                    continue
+                # Rotation happens after the last write, so this is the rest.
+                for line in (buffer + f.read()).splitlines():
+                    self._deliver(line)
+                return
+            buffer += chunk
+            if not buffer.endswith('\n'):
+                continue
+            self._deliver(buffer)
+            buffer = ''
+
+    def _tail(self, f):
+        while True:
+            try:
+                self._follow(f)
+            except Exception:
+                logger.exception('event log tail failed; resuming')
+                time.sleep(1)
+                continue
+            f.close()
+            f = open(self.path)
+
+
+class RedisTransport:
+    """Pub/sub on CHANNEL. A Lua script numbers and publishes each event in
+    one atomic step, so ids reach every subscriber in order."""
+
+    SEQUENCE = f'{CHANNEL}:events:seq'
+    KEY_SECONDS = 3600
+    # The payload is a JSON object; the id is spliced in ahead of its keys.
+    SEND = """
+    if ARGV[2] ~= '' and not redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[4]) then
+        return 0
+    end
+    local id = redis.call('INCR', KEYS[1])
+    redis.call('PUBLISH', ARGV[1], '{"id": ' .. id .. ', ' .. string.sub(ARGV[3], 2))
+    return id
+    """
+
+    def __init__(self, broker, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.broker = broker
+        self._send = self.client.register_script(self.SEND)
+        broker._seq = int(self.client.get(self.SEQUENCE) or 0)
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def send(self, kind, data, key=None):
+        payload = json.dumps({'kind': kind, 'data': data}, default=str)
+        self._send(keys=[self.SEQUENCE, f'{CHANNEL}:events:key:{key or ""}'],
+                   args=[CHANNEL, key or '', payload, self.KEY_SECONDS])
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        for message in pubsub.listen():
+            payload = _decode(message['data'])
+            if payload is not None:
+                self.broker.deliver(*payload)
+
+
+broker = Broker()
+
+
+def publish_after_commit(kind, data):
+    """Queue an event on the current session; it is sent once the session commits."""
+    db.session.info.setdefault('pending_events', []).append((kind, data))
+
+
+def _after_commit(session):
+    for kind, data in session.info.pop('pending_events', []):
+        broker.publish(kind, data)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop('pending_events', None)
+
+
+def init_app(app):
+    from sqlalchemy.orm import Session
+    if not event.contains(Session, 'after_commit', _after_commit):
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
+    broker.init_app(app)
+
+
+# Prediction-window transitions are time-driven rather than write-driven,
+# so each process runs one watcher thread; keyed events send each once.
+
+_watcher_lock = threading.Lock()
+_watcher_started = False
+
+
+def window_states(match_weeks):
+    return {mw.id: 'open' if mw.is_predictions_open else 'closed' for mw in match_weeks}
+
+
+def _window_key(match_week, state):
+    # Every process sees the same transition; the key lets one event through.
+    boundary = match_week.predictions_open_time if state == 'open' else match_week.predictions_close_time
+    return f'window:{match_week.id}:{state}:{boundary.isoformat()}'
+
+
+def _next_boundary(match_weeks, now):
+    boundaries = [t for mw in match_weeks
+                  for t in (mw.predictions_open_time, mw.predictions_close_time) if t > now]
+    return min(boundaries) if boundaries else None
+
+
+def _watch_windows(app, max_sleep=30):
+    from .cache import get_active_match_weeks
+    states = None
+    while True:
+        with app.app_context():
+            match_weeks = get_active_match_weeks()
+            db.session.remove()
+        current = window_states(match_weeks)
+        if states is not None:
+            for match_week in match_weeks:
+                state = current[match_week.id]
+                if states.get(match_week.id) != state:
+                    broker.publish('window', {'match_week_id': match_week.id, 'state': state},
+                                   key=_window_key(match_week, state))
+        states = current
+        now = datetime.utcnow()
+        boundary = _next_boundary(match_weeks, now)
+        delay = max_sleep if boundary is None else min(max_sleep, (boundary - now).total_seconds() + 0.05)
+        time.sleep(max(delay, 0.05))
+
+
+def ensure_window_watcher(app):
+    global _watcher_started
+    with _watcher_lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+    threading.Thread(target=_watch_windows, args=(app,), daemon=True).start()
@@ -0,0 +1,214 @@
+"""
+Streaming exports of predictions and standings.
+
+Rows are read with `yield_per`, which fetches EXPORT_BATCH_ROWS at a time
+from a server-side cursor where the driver has one, and are written out
+batch by batch. Nothing holds more than one batch, so memory stays flat
+however many predictions a season has.
+
+Archived seasons are read from the archive bind, with user names looked
+up per batch, so an export covers every season wherever its rows live.
+
+CSV is produced as a generator of text chunks, which the admin routes
+return as a streamed response and the CLI writes to a file. Parquet
+files (one per season) are written a record batch at a time with pyarrow,
+which is only needed for that format.
+"""
+import csv
+import io
+import os
+
+from sqlalchemy import literal, null, select
+
+from .models import (db, User, Season, Week, MatchWeek, Fixture, Prediction, UserStanding,
+                     ArchivedFixture, ArchivedPrediction)
+
+BATCH_ROWS = 5000
+
+PREDICTION_COLUMNS = [
+    ('season_id', Season.id),
+    ('season_start_year', Season.season_start_year),
+    ('season_end_year', Season.season_end_year),
+    ('week_number', Week.week_number),
+    ('match_week_id', MatchWeek.id),
+    ('fixture_id', Fixture.id),
+    ('home_team', Fixture.home_team),
+    ('away_team', Fixture.away_team),
+    ('match_datetime', Fixture.match_datetime),
+    ('home_score', Fixture.home_score),
+    ('away_score', Fixture.away_score),
+    ('is_completed', Fixture.is_completed),
+    ('prediction_id', Prediction.id),
+    ('user_id', User.id),
+    ('user_name', User.name),
+    ('home_score_prediction', Prediction.home_score_prediction),
+    ('away_score_prediction', Prediction.away_score_prediction),
+    ('points_earned', Prediction.points_earned),
+    ('created_at', Prediction.created_at),
+    ('updated_at', Prediction.updated_at),
+]
+
+STANDING_COLUMNS = [
+    ('position', UserStanding.position),
+    ('rank', UserStanding.rank),
+    ('user_id', User.id),
+    ('user_name', User.name),
+    ('total_points', UserStanding.total_points),
+    ('exact_scores', UserStanding.exact_scores),
+    ('correct_results', UserStanding.correct_results),
+]
+
+
+def predictions_statement(season_id=None):
+    stmt = (
+        select(*[column.label(name) for name, column in PREDICTION_COLUMNS])
+        .select_from(Prediction)
+        .join(Fixture, Fixture.id == Prediction.fixture_id)
+        .join(MatchWeek, MatchWeek.id == Fixture.match_week_id)
+        .join(Week, Week.id == MatchWeek.week_id)
+        .join(Season, Season.id == MatchWeek.season_id)
+        .join(User, User.id == Prediction.user_id)
+        # No ORDER BY: a sort would read every row before sending the first.
+        # Per season, rows still come out grouped by match week and fixture.
+    )
+    if season_id is not None:
+        stmt = stmt.where(MatchWeek.season_id == season_id)
+    return stmt
+
+
+def archived_predictions_statement(season):
+    """The archive's version of `predictions_statement`, with user_name left empty."""
+    source = {
+        'season_id': literal(season.id),
+        'season_start_year': literal(season.season_start_year),
+        'season_end_year': literal(season.season_end_year),
+        'week_number': ArchivedFixture.week_number,
+        'match_week_id': ArchivedFixture.match_week_id,
+        'fixture_id': ArchivedFixture.id,
+        'prediction_id': ArchivedPrediction.id,
+        'user_id': ArchivedPrediction.user_id,
+        'user_name': null(),
+    }
+    for name, column in PREDICTION_COLUMNS:
+        if name not in source:
+            model = ArchivedFixture if column.class_ is Fixture else ArchivedPrediction
+            source[name] = getattr(model, column.key)
+    return (
+        select(*[source[name].label(name) for name, _ in PREDICTION_COLUMNS])
+        .select_from(ArchivedPrediction)
+        .join(ArchivedFixture, (ArchivedFixture.season_id == ArchivedPrediction.season_id)
+              & (ArchivedFixture.id == ArchivedPrediction.fixture_id))
+        .where(ArchivedPrediction.season_id == season.id)
+    )
+
+
+def standings_statement():
+    return (
+        select(*[column.label(name) for name, column in STANDING_COLUMNS])
+        .select_from(UserStanding)
+        .join(User, User.id == UserStanding.user_id)
+        .order_by(UserStanding.position)
+    )
+
+
+def iter_batches(statement, batch_rows=BATCH_ROWS):
+    """Yield lists of row tuples, `batch_rows` at a time."""
+    result = db.session.execute(statement.execution_options(yield_per=batch_rows))
+    try:
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+    finally:
+        result.close()
+
+
+def _with_user_names(batches):
+    names = [name for name, _ in PREDICTION_COLUMNS]
+    user_id, user_name = names.index('user_id'), names.index('user_name')
+    for batch in batches:
+        found = dict(db.session.execute(
+            select(User.id, User.name).where(User.id.in_({row[user_id] for row in batch}))).all())
+        yield [row[:user_name] + (found.get(row[user_id]),) + row[user_name + 1:] for row in batch]
+
+
+def prediction_batches(season_id=None, batch_rows=BATCH_ROWS):
+    """Batches of PREDICTION_COLUMNS rows for one season, or for all of them."""
+    query = select(Season).order_by(Season.season_start_year)
+    if season_id is not None:
+        query = query.where(Season.id == season_id)
+    for season in db.session.execute(query).scalars().all():
+        if season.archived_at is None:
+            yield from iter_batches(predictions_statement(season.id), batch_rows)
+        else:
+            yield from _with_user_names(iter_batches(archived_predictions_statement(season), batch_rows))
+
+
+def iter_csv(batches, columns):
+    """Yield CSV text: the header, then one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def predictions_csv(season_id=None, batch_rows=BATCH_ROWS):
+    return iter_csv(prediction_batches(season_id, batch_rows), PREDICTION_COLUMNS)
+
+
+def standings_csv(batch_rows=BATCH_ROWS):
+    return iter_csv(iter_batches(standings_statement(), batch_rows), STANDING_COLUMNS)
+
+
+def _arrow_schema(pa):
+    types = {
+        'home_team': pa.string(), 'away_team': pa.string(), 'user_name': pa.string(),
+        'match_datetime': pa.timestamp('us'), 'created_at': pa.timestamp('us'),
+        'updated_at': pa.timestamp('us'), 'is_completed': pa.bool_(),
+    }
+    return pa.schema([(name, types.get(name, pa.int64())) for name, _ in PREDICTION_COLUMNS])
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Parquet export needs the pyarrow package')
+    return pyarrow, pyarrow.parquet
+
+
+def write_season_parquet(season_id, path, batch_rows=BATCH_ROWS):
+    """Write one season's predictions to a Parquet file; returns the row count."""
+    pa, pq = _pyarrow()
+    schema = _arrow_schema(pa)
+    names = [name for name, _ in PREDICTION_COLUMNS]
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in prediction_batches(season_id, batch_rows):
+            columns = [list(column) for column in zip(*batch)]
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=schema.field(name).type) for name, values in zip(names, columns)],
+                schema=schema,
+            ))
+            rows += len(batch)
+    return rows
+
+
+def export_parquet(directory, season_id=None, batch_rows=BATCH_ROWS):
+    """One predictions_<start>_<end>.parquet per season; returns {path: rows}."""
+    _pyarrow()  # fail before creating anything
+    os.makedirs(directory, exist_ok=True)
+    seasons = db.session.execute(
+        select(Season.id, Season.season_start_year, Season.season_end_year).order_by(Season.season_start_year)
+    ).all()
+    written = {}
+    for sid, start, end in seasons:
+        if season_id is not None and sid != season_id:
+            continue
+        path = os.path.join(directory, f'predictions_{start}_{end}.parquet')
+        written[path] = write_season_parquet(sid, path, batch_rows)
+    return written
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, IntegerField, SelectField, DateTimeField, FieldList, FormField, SubmitField
-from wtforms.validators import DataRequired, NumberRange
+from wtforms.validators import DataRequired, Length, NumberRange
 from datetime import datetime
 
 # Move EPL_TEAMS here to avoid circular import
@@ -43,4 +43,14 @@ class PredictionForm(FlaskForm):
 class CreateSeasonForm(FlaskForm):
     start_year = IntegerField('Start Year', validators=[DataRequired()])
     end_year = IntegerField('End Year', validators=[DataRequired()])
-    submit = SubmitField('Submit')
\ No newline at end of file
+    submit = SubmitField('Submit')
+
+
+class CreateLeagueForm(FlaskForm):
+    name = StringField('League Name', validators=[DataRequired(), Length(max=100)])
+    submit = SubmitField('Create League')
+
+
+class JoinLeagueForm(FlaskForm):
+    code = StringField('Invite Code', validators=[DataRequired(), Length(max=12)])
+    submit = SubmitField('Join League')
@@ -0,0 +1,46 @@
+"""
+Rendered-fragment cache.
+
+Blocks of HTML that are the same for every user (fixture cards, leaderboard
+rows, the active match week list) are rendered once per data version and
+stored in the cache backend. Anything per user is left as a hole,
+`{{ hole('kind', id) }}` in the fragment template, and filled in on each
+request with `fill()`, which is a single regex pass over the cached HTML.
+
+Fragments keyed on schedule data live in the 'schedule' namespace, so
+invalidate_schedule() drops them together with the cached rows. Set
+FRAGMENT_CACHE=0 to render everything on every request.
+"""
+import re
+
+from flask import current_app
+from markupsafe import Markup, escape
+
+from .cache import cache
+
+FRAGMENTS = 'fragments'
+HOLE_RE = re.compile(r'<!--hole:([a-z_]+):(\d+)-->')
+
+
+def hole(kind, id):
+    return Markup(f'<!--hole:{kind}:{int(id)}-->')
+
+
+def fragment(namespace, key, render):
+    """HTML from `render()`, cached under (namespace, key).
+
+    `render` also does any querying the fragment needs, so a cache hit
+    skips the queries as well as the template.
+    """
+    if not current_app.config.get('FRAGMENT_CACHE', True):
+        return render()
+    return cache.get_or_set(namespace, f'fragment:{key}', render)
+
+
+def fill(html, values):
+    """Fill a fragment's holes from {(kind, id): text}; text is escaped unless Markup."""
+    return Markup(HOLE_RE.sub(lambda m: escape(values.get((m.group(1), int(m.group(2))), '')), html))
+
+
+def init_app(app):
+    app.add_template_global(hole)
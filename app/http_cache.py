@@ -0,0 +1,86 @@
+"""
+HTTP validators and Cache-Control for the page routes.
+
+`@conditional(validators)` answers If-None-Match / If-Modified-Since with a
+304 before the view runs. `validators(**view_args)` returns the version
+counters the page depends on plus anything else that changes its HTML
+(the user, the query string, the prediction window state), or None to
+always render. Counters are read from the content_version table in one
+primary-key query, so a revalidation costs no rendering. The ETag covers
+each counter's modified time as well as its value, so a counter that is
+ever reset cannot make an old ETag match again.
+
+`@public_when_anonymous` lets a reverse proxy cache pages for visitors
+who are not logged in; ANONYMOUS_CACHE_SECONDS sets the lifetime.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from .cache import get_versions
+
+
+def _etag(names, extra):
+    versions = get_versions(names)
+    token = '|'.join([f'{name}={version}@{stamp}' for name, (version, stamp) in zip(names, versions)]
+                     + [str(part) for part in extra])
+    modified = [stamp for _, stamp in versions if stamp is not None]
+    last_modified = datetime.fromtimestamp(max(modified), timezone.utc) if modified else None
+    return hashlib.sha1(token.encode()).hexdigest()[:20], last_modified
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return bool(since and last_modified and last_modified.replace(microsecond=0) <= since)
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Per-user pages: browsers may keep them but must revalidate every time.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional(validators):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Flashed messages are part of the page but not of any version.
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            found = validators(**kwargs)
+            if found is None:
+                return view(*args, **kwargs)
+            etag, last_modified = _etag(*found)
+            if _not_modified(etag, last_modified):
+                return _set_validators(make_response('', 304), etag, last_modified)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified)
+            return response
+        return wrapped
+    return decorator
+
+
+def public_when_anonymous(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        # Anything that touched the session (a flash, a login) stays private.
+        if (response.status_code == 200 and not current_user.is_authenticated
+                and not session.modified and 'Set-Cookie' not in response.headers):
+            response.headers['Cache-Control'] = (
+                f"public, max-age={current_app.config.get('ANONYMOUS_CACHE_SECONDS', 60)}")
+            response.vary.add('Cookie')
+        else:
+            response.headers.setdefault('Cache-Control', 'private, no-cache')
+        return response
+    return wrapped
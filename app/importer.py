@@ -0,0 +1,227 @@
+"""
+Fixture import pipeline.
+
+A provider returns the fixtures of one match week. `import_fixtures`
+fetches many weeks concurrently from a thread pool (HTTP providers share a
+pooled session), then writes every week with a deduplicating bulk upsert
+keyed on (match_week_id, home_team, away_team), creating missing match
+weeks on the way.
+
+Providers are chosen with FIXTURE_PROVIDER:
+
+    mock                 built-in sample week (default)
+    file:/path/to/dir    <dir>/<start_year>/week_<n>.json
+    http://host:port     <url>/<start_year>/week_<n>.json
+
+Each week file is a JSON list of {"home_team", "away_team",
+"match_datetime"} objects. Serving a file-provider directory with
+`python -m http.server` gives a local stand-in for the HTTP provider.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from .bulk import upsert_statement
+from .cache import invalidate_schedule
+from .models import db, Week, MatchWeek, Fixture
+
+SEASON_WEEKS = range(1, 39)
+
+
+class FixtureProvider:
+    name = 'base'
+
+    def fetch_match_week(self, season_start_year, week_number):
+        """Return a list of fixture dicts for one match week."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MockSkySportsProvider(FixtureProvider):
+    """Stand-in used until a real feed is configured: one sample week."""
+    name = 'mock'
+
+    def fetch_match_week(self, season_start_year, week_number):
+        if week_number != 1:
+            return []
+        return [
+            {
+                'home_team': 'Manchester United',
+                'away_team': 'Arsenal',
+                'match_datetime': datetime.now() + timedelta(days=7),
+            },
+            {
+                'home_team': 'Chelsea',
+                'away_team': 'Liverpool',
+                'match_datetime': datetime.now() + timedelta(days=7, hours=2),
+            }
+        ]
+
+
+class FileProvider(FixtureProvider):
+    name = 'file'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch_match_week(self, season_start_year, week_number):
+        path = os.path.join(self.directory, str(season_start_year), f'week_{week_number}.json')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+
+class HTTPProvider(FixtureProvider):
+    name = 'http'
+
+    def __init__(self, base_url, pool_size=8, timeout=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch_match_week(self, season_start_year, week_number):
+        response = self.session.get(f'{self.base_url}/{season_start_year}/week_{week_number}.json',
+                                    timeout=self.timeout)
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+def provider_from_config(value, pool_size=8):
+    value = value or 'mock'
+    if value == 'mock':
+        return MockSkySportsProvider()
+    if value.startswith('file:'):
+        return FileProvider(value[len('file:'):])
+    if value.startswith(('http://', 'https://')):
+        return HTTPProvider(value, pool_size=pool_size)
+    raise ValueError(f'Unknown fixture provider {value!r}')
+
+
+def _parse_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _fetch(provider, season_start_year, week_number):
+    started = time.perf_counter()
+    fixtures = provider.fetch_match_week(season_start_year, week_number)
+    return week_number, fixtures, time.perf_counter() - started
+
+
+def fetch_season(provider, season_start_year, week_numbers, max_workers=8, progress=None):
+    """Fetch weeks concurrently; returns {week_number: (fixtures, seconds)}.
+
+    `progress(done, total)` is called from this thread as weeks arrive.
+    """
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(lambda n: _fetch(provider, season_start_year, n), week_numbers)
+        for week_number, fixtures, seconds in results:
+            fetched[week_number] = (fixtures, seconds)
+            if progress is not None:
+                progress(len(fetched), len(week_numbers))
+    return fetched
+
+
+def _ensure_match_weeks(season, fetched):
+    """Return {week_number: match_week_id}, creating missing match weeks."""
+    week_ids = dict(db.session.execute(select(Week.week_number, Week.id)).all())
+    missing_weeks = [n for n in fetched if n not in week_ids]
+    if missing_weeks:
+        db.session.execute(insert(Week), [{'week_number': n} for n in missing_weeks])
+        week_ids = dict(db.session.execute(select(Week.week_number, Week.id)).all())
+
+    def existing():
+        return dict(db.session.execute(
+            select(Week.week_number, MatchWeek.id)
+            .join(MatchWeek, MatchWeek.week_id == Week.id)
+            .where(MatchWeek.season_id == season.id)
+        ).all())
+
+    match_weeks = existing()
+    new_rows = []
+    for week_number, fixtures in fetched.items():
+        if week_number in match_weeks or not fixtures:
+            continue
+        kickoffs = [k for k in (_parse_datetime(f.get('match_datetime')) for f in fixtures) if k]
+        close = (min(kickoffs) if kickoffs else datetime.utcnow() + timedelta(days=7)) - timedelta(hours=1)
+        new_rows.append({
+            'season_id': season.id,
+            'week_id': week_ids[week_number],
+            'predictions_open_time': close - timedelta(days=6),
+            'predictions_close_time': close,
+        })
+    if new_rows:
+        db.session.execute(insert(MatchWeek), new_rows)
+        match_weeks = existing()
+    return match_weeks
+
+
+def upsert_fixtures(match_week_id, fixtures):
+    """Bulk upsert one week's fixtures, dropping duplicates within the batch."""
+    rows = {}
+    for fixture in fixtures:
+        key = (fixture['home_team'], fixture['away_team'])
+        rows[key] = {
+            'match_week_id': match_week_id,
+            'home_team': fixture['home_team'],
+            'away_team': fixture['away_team'],
+            'match_datetime': _parse_datetime(fixture.get('match_datetime')),
+            'created_at': datetime.utcnow(),
+        }
+    if not rows:
+        return 0
+    db.session.execute(upsert_statement(
+        Fixture, list(rows.values()),
+        conflict_columns=('match_week_id', 'home_team', 'away_team'),
+        update_columns=('match_datetime',),
+        constraint='unique_match_week_fixture',
+    ))
+    return len(rows)
+
+
+def import_fixtures(season, provider, week_numbers=SEASON_WEEKS, max_workers=8, progress=None):
+    """Fetch and persist fixtures for a season; returns a timing report."""
+    started = time.perf_counter()
+    week_numbers = list(week_numbers)
+    fetched = fetch_season(provider, season.season_start_year, week_numbers, max_workers, progress)
+    match_weeks = _ensure_match_weeks(season, {n: fixtures for n, (fixtures, _) in fetched.items()})
+
+    weeks = []
+    for week_number in week_numbers:
+        fixtures, fetch_seconds = fetched[week_number]
+        persist_started = time.perf_counter()
+        count = upsert_fixtures(match_weeks[week_number], fixtures) if fixtures else 0
+        weeks.append({
+            'week_number': week_number,
+            'fixtures': count,
+            'fetch_seconds': round(fetch_seconds, 4),
+            'persist_seconds': round(time.perf_counter() - persist_started, 4),
+        })
+    db.session.commit()
+    invalidate_schedule([match_weeks[n] for n in week_numbers if fetched[n][0]])
+    return {
+        'season_id': season.id,
+        'provider': provider.name,
+        'fixtures': sum(week['fixtures'] for week in weeks),
+        'total_seconds': round(time.perf_counter() - started, 4),
+        'weeks': weeks,
+    }
@@ -0,0 +1,298 @@
+"""
+Request and query instrumentation.
+
+Every statement executed by any SQLAlchemy engine is counted and timed
+against the current request (stored on `flask.g`) and against any
+`count_queries()` blocks active on the current thread, so tests and
+benchmarks can assert that a route's query count stays flat as the data
+grows. Each request is logged with its duration, query count and SQL time,
+and statements slower than SLOW_QUERY_MS are logged on their own.
+
+Latency histograms and query totals per endpoint are kept in memory and
+served in Prometheus text format from /admin/metrics. They are per
+process; scrape every worker or run a single one.
+
+Profiling is off by default. PROFILE_SAMPLE_RATE profiles that fraction of
+requests; with PROFILE_HEADER set, a request carrying `X-Profile: 1` is
+always profiled. Profiles are written to PROFILE_DIR, as HTML when
+pyinstrument is installed and PROFILER=pyinstrument, otherwise as cProfile
+.prof files for `python -m pstats` or snakeviz.
+
+Set QUERY_COUNT_HEADER to also return X-Query-Count and Server-Timing
+headers.
+"""
+import cProfile
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + '.slow')
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f'<QueryCounter {self.count}>'
+
+
+@contextmanager
+def count_queries():
+    """Count the statements executed on this thread inside the block."""
+    counter = QueryCounter()
+    stack = _active_counters()
+    stack.append(counter)
+    try:
+        yield counter
+    finally:
+        stack.remove(counter)
+
+
+def _active_counters():
+    if not hasattr(_local, 'counters'):
+        _local.counters = []
+    return _local.counters
+
+
+class Metrics:
+    """Per-endpoint request counts, latency histograms and SQL totals."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.histograms = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+            self.latency_sum = defaultdict(float)
+            self.queries = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+            self.slow_queries = 0
+
+    def observe(self, endpoint, method, status, seconds, queries, sql_seconds):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            counts = self.histograms[(endpoint, method)]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.latency_sum[(endpoint, method)] += seconds
+            self.queries[endpoint] += queries
+            self.sql_seconds[endpoint] += sql_seconds
+
+    def slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                '# HELP http_requests_total Requests handled, by endpoint, method and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            lines += [
+                '# HELP http_request_duration_seconds Request latency.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for (endpoint, method), counts in sorted(self.histograms.items()):
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} '
+                             f'{self.latency_sum[(endpoint, method)]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+            lines += [
+                '# HELP db_queries_total SQL statements executed while handling requests.',
+                '# TYPE db_queries_total counter',
+            ]
+            for endpoint, count in sorted(self.queries.items()):
+                lines.append(f'db_queries_total{{endpoint="{endpoint}"}} {count}')
+            lines += [
+                '# HELP db_query_duration_seconds_total Time spent in SQL while handling requests.',
+                '# TYPE db_query_duration_seconds_total counter',
+            ]
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'db_query_duration_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+            lines += [
+                '# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS.',
+                '# TYPE db_slow_queries_total counter',
+                f'db_slow_queries_total {self.slow_queries}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters():
+        counter.count += 1
+    if has_app_context() and 'query_count' in g:
+        g.query_count += 1
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for counter in _active_counters():
+        counter.seconds += seconds
+    if not has_app_context():
+        return
+    if 'sql_seconds' in g:
+        g.sql_seconds += seconds
+    threshold = current_app.config.get('SLOW_QUERY_MS')
+    if threshold and seconds * 1000 >= threshold:
+        metrics.slow_query()
+        slow_query_logger.warning('slow query %.1fms endpoint=%s: %s', seconds * 1000,
+                                  request.endpoint if has_request_context() else None,
+                                  ' '.join(statement.split()))
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not fire for a failed statement.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+_profile_lock = threading.Lock()
+
+
+def _should_profile():
+    config = current_app.config
+    if config.get('PROFILE_HEADER') and request.headers.get('X-Profile') == '1':
+        return True
+    rate = config.get('PROFILE_SAMPLE_RATE') or 0
+    return rate > 0 and random.random() < rate
+
+
+def _start_profiler():
+    # One profile at a time: cProfile cannot nest and concurrent profiles
+    # would mostly measure each other.
+    if not _profile_lock.acquire(blocking=False):
+        return
+    try:
+        if current_app.config.get('PROFILER') == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning('PROFILER=pyinstrument but pyinstrument is not installed; using cProfile')
+            else:
+                profiler = Profiler()
+                profiler.start()
+                g.profiler = profiler
+                return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        g.profiler = profiler
+    except BaseException:
+        _profile_lock.release()
+        raise
+
+
+def _stop_profiler():
+    """Stop this request's profiler, release the lock and write the profile.
+
+    Called from after_request and again from teardown_request, which also
+    runs when the view raised and after_request was skipped; the second call
+    finds nothing to do.
+    """
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return None
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profile_lock.release()
+    try:
+        directory = current_app.config.get('PROFILE_DIR') or os.path.join(
+            tempfile.gettempdir(), 'epl-predictions-profiles')
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unmatched'}-{os.getpid()}"
+        if isinstance(profiler, cProfile.Profile):
+            path = os.path.join(directory, name + '.prof')
+            profiler.dump_stats(path)
+        else:
+            path = os.path.join(directory, name + '.html')
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+    except OSError:
+        logger.exception('could not write the profile for %s %s', request.method, request.path)
+        return None
+    logger.info('profile for %s %s written to %s', request.method, request.path, path)
+    return path
+
+
+def _start_request():
+    g.query_count = 0
+    g.sql_seconds = 0.0
+    g.request_started = time.perf_counter()
+    if _should_profile():
+        _start_profiler()
+
+
+def _finish_request(response):
+    profile_path = _stop_profiler()
+    seconds = time.perf_counter() - g.get('request_started', time.perf_counter())
+    count = g.get('query_count', 0)
+    sql_seconds = g.get('sql_seconds', 0.0)
+    endpoint = request.endpoint or 'unmatched'
+    metrics.observe(endpoint, request.method, response.status_code, seconds, count, sql_seconds)
+    logger.info('%s %s status=%d duration_ms=%.1f queries=%d sql_ms=%.1f', request.method,
+                request.path, response.status_code, seconds * 1000, count, sql_seconds * 1000)
+    if current_app.config.get('QUERY_COUNT_HEADER'):
+        response.headers['X-Query-Count'] = str(count)
+        response.headers['Server-Timing'] = f'app;dur={seconds * 1000:.1f}, db;dur={sql_seconds * 1000:.1f}'
+        if profile_path:
+            response.headers['X-Profile-Path'] = profile_path
+    return response
+
+
+def _teardown_request(exception):
+    _stop_profiler()
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
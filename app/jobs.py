@@ -0,0 +1,367 @@
+"""
+Background jobs.
+
+Scoring, fixture imports and standings rebuilds are queued as rows in the
+`job` table instead of running inside the request. Workers claim a job
+with a conditional UPDATE (status 'queued' -> 'running'), so any number of
+threads and processes can poll the same table without taking a job twice.
+
+    submit('score_fixtures', {'match_week_id': 3}, idempotency_key='...')
+
+An idempotency key makes a submission safe to repeat: the existing job is
+returned instead of a new one being queued. A job that has failed for good
+gives its key up, so submitting again starts a fresh one. A failing job is retried with
+exponential backoff until it has used `max_attempts`; a job whose worker
+stopped sending heartbeats for JOBS_STALE_SECONDS is queued again.
+Handlers report progress through `JobContext.progress`.
+
+`score_fixtures` splits the completed fixtures into shards of
+JOBS_SHARD_SIZE and queues one `score_shard` child per shard. Shards touch
+disjoint predictions and only add to the standings, so they can run in
+parallel; the parent's status aggregates its children. A shard scores its
+fixtures one by one and sends a heartbeat between them, so a long shard
+is not mistaken for one whose worker died.
+
+JOBS_WORKER picks who runs jobs:
+
+    thread      a daemon thread in each web process, started on submit (default)
+    external    only `flask jobs-worker --processes N` workers
+
+External workers run in other processes, so they need shared CACHE_BACKEND
+and EVENTS_BACKEND settings (file or redis) for their cache invalidations
+and leaderboard events to reach the web processes.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Fixture, Job, Prediction
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+HANDLERS = {}
+
+
+def handler(kind, max_attempts=3):
+    """Register `func(ctx, **params)` as the handler for jobs of `kind`."""
+    def decorator(func):
+        HANDLERS[kind] = (func, max_attempts)
+        return func
+    return decorator
+
+
+class JobContext:
+    def __init__(self, job_id, worker):
+        self.job_id = job_id
+        self.worker = worker
+
+    def progress(self, fraction, message=None):
+        """Record progress (0-1) and a heartbeat.
+
+        Written on its own connection so it is visible straight away; call it
+        between the handler's transactions, since SQLite lets one writer in
+        at a time.
+        """
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Job).where(Job.id == self.job_id)
+                .values(progress=min(max(fraction, 0.0), 1.0), message=message,
+                        heartbeat_at=datetime.utcnow())
+            )
+
+    def submit(self, kind, params=None, idempotency_key=None):
+        """Queue a child job; its progress counts towards this job's."""
+        return submit(kind, params, idempotency_key=idempotency_key, parent_id=self.job_id)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def submit(kind, params=None, idempotency_key=None, parent_id=None, run_after=None):
+    """Queue a job and return it, or the existing job with the same key."""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing is not None and existing.status != FAILED:
+            return existing
+        if existing is not None:
+            db.session.execute(update(Job).where(Job.id == existing.id, Job.status == FAILED)
+                               .values(idempotency_key=None))
+    job = Job(kind=kind, params=json.dumps(params or {}), idempotency_key=idempotency_key,
+              parent_id=parent_id, max_attempts=HANDLERS[kind][1],
+              run_after=run_after or datetime.utcnow())
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued the same key between our read and insert.
+        db.session.rollback()
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    _wake_local_worker()
+    return job
+
+
+def requeue_stale(stale_seconds):
+    """Give jobs whose worker went quiet back to the queue (or fail them)."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale = (Job.status == RUNNING) & (Job.heartbeat_at < cutoff)
+    db.session.execute(
+        update(Job).where(stale, Job.attempts < Job.max_attempts)
+        .values(status=QUEUED, worker=None, error='worker stopped responding')
+    )
+    db.session.execute(
+        update(Job).where(stale, Job.attempts >= Job.max_attempts)
+        .values(status=FAILED, error='worker stopped responding', finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def due_jobs_statement(now, limit):
+    return (select(Job.id).where(Job.status == QUEUED, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id).limit(limit))
+
+
+def claim(worker, candidates=5):
+    """Atomically take the next due job, or return None."""
+    now = datetime.utcnow()
+    job_ids = db.session.execute(due_jobs_statement(now, candidates)).scalars().all()
+    for job_id in job_ids:
+        result = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == QUEUED)
+            .values(status=RUNNING, worker=worker, attempts=Job.attempts + 1,
+                    started_at=now, heartbeat_at=now, error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(Job, job_id)
+    db.session.commit()
+    return None
+
+
+def _finish(job_id, **values):
+    db.session.execute(update(Job).where(Job.id == job_id).values(**values)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def run_job(job, worker, retry_delay=5):
+    func, _ = HANDLERS[job.kind]
+    job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+    params = json.loads(job.params or '{}')
+    started = time.perf_counter()
+    try:
+        result = func(JobContext(job_id, worker), **params)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('job %s (%s) failed on attempt %d', job_id, job.kind, attempts)
+        if attempts < max_attempts:
+            delay = retry_delay * 2 ** (attempts - 1)
+            _finish(job_id, status=QUEUED, error=repr(e), worker=None,
+                    run_after=datetime.utcnow() + timedelta(seconds=delay))
+        else:
+            _finish(job_id, status=FAILED, error=repr(e), finished_at=datetime.utcnow())
+        return False
+    _finish(job_id, status=SUCCEEDED, progress=1.0, result=json.dumps(result or {}),
+            finished_at=datetime.utcnow())
+    logger.info('job %s (%s) finished in %.2fs', job_id, job.kind, time.perf_counter() - started)
+    return True
+
+
+def work(app, once=False, stop=None, wake=None):
+    """Run jobs until `stop` is set; with `once`, until the queue is empty."""
+    config = app.config
+    worker = worker_name()
+    with app.app_context():
+        try:
+            while not (stop and stop.is_set()):
+                requeue_stale(config['JOBS_STALE_SECONDS'])
+                job = claim(worker)
+                if job is not None:
+                    run_job(job, worker, retry_delay=config['JOBS_RETRY_DELAY'])
+                    continue
+                if once:
+                    break
+                if wake is not None:
+                    wake.wait(config['JOBS_POLL_SECONDS'])
+                    wake.clear()
+                else:
+                    time.sleep(config['JOBS_POLL_SECONDS'])
+        finally:
+            db.session.remove()
+
+
+def _process_main(once):
+    from . import create_app
+    work(create_app(), once=once)
+
+
+def run_workers(processes, once=False):
+    """Run `processes` worker processes and wait for them to exit."""
+    import multiprocessing
+    # Spawned, not forked: each process opens its own engine and connections.
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=_process_main, args=(once,), daemon=False)
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+    return [child.exitcode for child in children]
+
+
+# In-process worker used when JOBS_WORKER=thread.
+
+_thread_lock = threading.Lock()
+_thread_wake = threading.Event()
+_thread_started = False
+
+
+def _wake_local_worker():
+    from flask import current_app
+    if current_app.config.get('JOBS_WORKER') != 'thread':
+        return
+    global _thread_started
+    with _thread_lock:
+        if not _thread_started:
+            _thread_started = True
+            threading.Thread(target=work, args=(current_app._get_current_object(),),
+                             kwargs={'wake': _thread_wake}, daemon=True).start()
+    _thread_wake.set()
+
+
+def job_status(job):
+    """A JSON-ready view of a job, with its children's progress rolled up."""
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'error': job.error,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    children = db.session.execute(
+        select(Job.status, Job.progress, Job.result).where(Job.parent_id == job.id)
+    ).all()
+    if not children:
+        return data
+    statuses = [status for status, _, _ in children]
+    data['children'] = {status: statuses.count(status) for status in set(statuses)}
+    data['progress'] = round(sum(1.0 if status in FINISHED else progress
+                                 for status, progress, _ in children) / len(children), 4)
+    if job.status == SUCCEEDED:
+        if any(status not in FINISHED for status in statuses):
+            data['status'] = RUNNING
+        elif FAILED in statuses:
+            data['status'] = FAILED
+    data['rows_updated'] = sum(json.loads(result).get('rows_updated', 0)
+                               for _, _, result in children if result)
+    return data
+
+
+# Handlers
+
+
+@handler('score_shard')
+def score_shard_job(ctx, fixture_ids):
+    """Score a shard one fixture at a time, sending a heartbeat between fixtures."""
+    from .scoring import score_fixtures
+    report = {'rows_updated': 0, 'users_changed': 0, 'elapsed_seconds': 0}
+    for done, fixture_id in enumerate(fixture_ids):
+        ctx.progress(done / len(fixture_ids), f'Scoring fixture {done + 1}/{len(fixture_ids)}')
+        scored = score_fixtures(fixture_ids=[fixture_id])
+        for name in report:
+            report[name] += scored[name]
+    elapsed = report['elapsed_seconds'] = round(report['elapsed_seconds'], 4)
+    report['rows_per_second'] = round(report['rows_updated'] / elapsed) if elapsed > 0 else report['rows_updated']
+    return report
+
+
+@handler('score_fixtures')
+def score_fixtures_job(ctx, match_week_id=None, shard_size=None):
+    """Score completed fixtures, fanning out to shard jobs when there are many."""
+    from flask import current_app
+    from .cache import invalidate_scores
+    from .scoring import score_fixtures
+    shard_size = shard_size or current_app.config['JOBS_SHARD_SIZE']
+    query = (
+        select(Fixture.id).where(Fixture.is_completed.is_(True), Fixture.home_score.isnot(None),
+                                 Fixture.away_score.isnot(None))
+        .where(select(Prediction.id).where(Prediction.fixture_id == Fixture.id).exists())
+        .order_by(Fixture.id)
+    )
+    if match_week_id is not None:
+        query = query.where(Fixture.match_week_id == match_week_id)
+    fixture_ids = db.session.execute(query).scalars().all()
+    db.session.commit()
+    if len(fixture_ids) <= shard_size:
+        return score_fixtures(fixture_ids=fixture_ids, match_week_id=match_week_id)
+    shards = [fixture_ids[i:i + shard_size] for i in range(0, len(fixture_ids), shard_size)]
+    for number, shard in enumerate(shards):
+        # Keyed on the parent, so a retried parent does not queue shards twice.
+        ctx.submit('score_shard', {'fixture_ids': shard},
+                   idempotency_key=f'job-{ctx.job_id}-shard-{number}')
+    # Moves the admin's default key on (score_fixtures bumps it on the path above).
+    invalidate_scores([] if match_week_id is None else [match_week_id])
+    return {'shards': len(shards), 'fixtures': len(fixture_ids)}
+
+
+@handler('import_fixtures', max_attempts=2)
+def import_fixtures_job(ctx, season_id=None, weeks=None, provider=None):
+    from flask import current_app
+    from .importer import SEASON_WEEKS, import_fixtures, provider_from_config
+    from .models import Season
+    if season_id:
+        season = db.session.get(Season, season_id)
+    else:
+        season = Season.query.order_by(Season.season_start_year.desc()).first()
+    if season is None:
+        raise ValueError('No such season')
+    workers = current_app.config['IMPORT_WORKERS']
+    source = provider_from_config(provider or current_app.config['FIXTURE_PROVIDER'], pool_size=workers)
+
+    def fetched(done, total):
+        # Fetching is most of the wait; the bulk write follows in one go.
+        ctx.progress(0.9 * done / total, f'Fetched {done}/{total} weeks')
+
+    try:
+        report = import_fixtures(season, source, weeks or SEASON_WEEKS, max_workers=workers,
+                                 progress=fetched)
+    finally:
+        source.close()
+    return {key: report[key] for key in ('season_id', 'provider', 'fixtures', 'total_seconds')}
+
+
+@handler('archive_season', max_attempts=2)
+def archive_season_job(ctx, season_id):
+    from .archive import archive_season
+    return archive_season(season_id, progress=ctx.progress)
+
+
+@handler('rebuild_standings')
+def rebuild_standings_job(ctx):
+    from .standings import rebuild_standings
+    rebuild_standings()
+    return {}
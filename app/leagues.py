@@ -0,0 +1,165 @@
+"""
+Private mini-leagues.
+
+A league is a set of LeagueMember rows. League tables are not stored:
+they rank the members' UserStanding totals with window functions, reading
+members through the (league_id, user_id) primary key and a user's leagues
+through the (user_id, league_id) index, so the cost depends on the size of
+the leagues involved rather than on the number of leagues or users. A
+head-to-head is simply a league with two members.
+"""
+import secrets
+
+from sqlalchemy import func, insert, select
+
+from .bulk import insert_missing
+from .models import db, User, League, LeagueMember, UserStanding
+from .standings import PAGE_SIZE
+
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+CODE_LENGTH = 8
+
+
+def _new_code():
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+
+def create_league(owner_id, name, commit=True):
+    """Create a league with its owner as the first member."""
+    code = _new_code()
+    while db.session.execute(select(League.id).where(League.code == code)).first():
+        code = _new_code()
+    league = League(name=name, code=code, owner_id=owner_id)
+    db.session.add(league)
+    db.session.flush()
+    db.session.execute(insert(LeagueMember).values(league_id=league.id, user_id=owner_id))
+    if commit:
+        db.session.commit()
+    return league
+
+
+def join_league(user_id, code, commit=True):
+    """Add a user to the league with the given invite code; returns the league or None."""
+    league = League.query.filter_by(code=code.strip().upper()).first()
+    if league is None:
+        return None
+    # A no-op for a member, including one added by a concurrent join.
+    if insert_missing(LeagueMember, [{'league_id': league.id, 'user_id': user_id}],
+                      conflict_columns=('league_id', 'user_id')) and commit:
+        db.session.commit()
+    return league
+
+
+def leave_league(league_id, user_id, commit=True):
+    db.session.execute(
+        LeagueMember.__table__.delete()
+        .where(LeagueMember.league_id == league_id, LeagueMember.user_id == user_id)
+    )
+    if commit:
+        db.session.commit()
+
+
+def is_member(league_id, user_id):
+    return db.session.execute(
+        select(LeagueMember.user_id)
+        .where(LeagueMember.league_id == league_id, LeagueMember.user_id == user_id)
+    ).first() is not None
+
+
+def _ranked_members(points):
+    return (
+        func.rank().over(partition_by=LeagueMember.league_id, order_by=points.desc()),
+        func.row_number().over(partition_by=LeagueMember.league_id,
+                               order_by=(points.desc(), LeagueMember.user_id)),
+        func.count().over(partition_by=LeagueMember.league_id),
+    )
+
+
+def _member_totals():
+    return (
+        func.coalesce(UserStanding.total_points, 0),
+        func.coalesce(UserStanding.exact_scores, 0),
+        func.coalesce(UserStanding.correct_results, 0),
+    )
+
+
+def league_standings_statement(league_id, page=1, page_size=PAGE_SIZE):
+    points, exact, correct = _member_totals()
+    rank, position, members = _ranked_members(points)
+    ranked = (
+        select(
+            LeagueMember.user_id.label('user_id'),
+            points.label('total_points'),
+            exact.label('exact_scores'),
+            correct.label('correct_results'),
+            rank.label('rank'),
+            position.label('position'),
+            members.label('members'),
+        )
+        .outerjoin(UserStanding, UserStanding.user_id == LeagueMember.user_id)
+        .where(LeagueMember.league_id == league_id)
+        .subquery()
+    )
+    first = (page - 1) * page_size + 1
+    return (
+        select(ranked.c.rank, ranked.c.user_id, User.name, ranked.c.total_points,
+               ranked.c.exact_scores, ranked.c.correct_results, ranked.c.members)
+        .join(User, User.id == ranked.c.user_id)
+        .where(ranked.c.position.between(first, first + page_size - 1))
+        .order_by(ranked.c.position)
+    )
+
+
+def league_standings_page(league_id, page=1, page_size=PAGE_SIZE):
+    """One page of a league table and the member count, in a single query."""
+    rows = db.session.execute(league_standings_statement(league_id, page, page_size)).all()
+    member_count = rows[0].members if rows else 0
+    return rows, member_count
+
+
+def page_for_member(league_id, user_id, page_size=PAGE_SIZE):
+    """League table page a member appears on, or None if they are not a member."""
+    points, _, _ = _member_totals()
+    _, position, _ = _ranked_members(points)
+    ranked = (
+        select(LeagueMember.user_id.label('user_id'), position.label('position'))
+        .outerjoin(UserStanding, UserStanding.user_id == LeagueMember.user_id)
+        .where(LeagueMember.league_id == league_id)
+        .subquery()
+    )
+    found = db.session.execute(
+        select(ranked.c.position).where(ranked.c.user_id == user_id)
+    ).scalar()
+    if found is None:
+        return None
+    return (found - 1) // page_size + 1
+
+
+def leagues_for_user_statement(user_id):
+    points, _, _ = _member_totals()
+    rank, _, members = _ranked_members(points)
+    my_leagues = select(LeagueMember.league_id).where(LeagueMember.user_id == user_id)
+    ranked = (
+        select(
+            LeagueMember.league_id.label('league_id'),
+            LeagueMember.user_id.label('user_id'),
+            points.label('total_points'),
+            rank.label('rank'),
+            members.label('members'),
+        )
+        .outerjoin(UserStanding, UserStanding.user_id == LeagueMember.user_id)
+        .where(LeagueMember.league_id.in_(my_leagues))
+        .subquery()
+    )
+    return (
+        select(League.id, League.name, League.code, League.owner_id,
+               ranked.c.rank, ranked.c.members, ranked.c.total_points)
+        .join(ranked, ranked.c.league_id == League.id)
+        .where(ranked.c.user_id == user_id)
+        .order_by(League.name)
+    )
+
+
+def leagues_for_user(user_id):
+    """Every league the user belongs to with their rank in it, in one query."""
+    return db.session.execute(leagues_for_user_statement(user_id)).all()
@@ -0,0 +1,121 @@
+"""
+Live score ingestion.
+
+Score events are JSON objects, one per line:
+
+    {"fixture_id": 12, "home_score": 1, "away_score": 0, "status": "live"}
+
+A fixture can also be identified by match_week_id, home_team and
+away_team. "status": "final" marks the fixture completed. Each event
+updates its Fixture row, rescores only that fixture's predictions and
+applies the point changes to the standings, all in one transaction.
+
+Events are read from a JSONL file (optionally followed like `tail -f`) or
+from a TCP socket that accepts newline-delimited events.
+"""
+import json
+import logging
+import socketserver
+import time
+
+from sqlalchemy import select, update
+
+from .events import publish_after_commit
+from .models import db, Fixture
+from .scoring import score_fixtures
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve_fixture_id(event):
+    if event.get('fixture_id') is not None:
+        return int(event['fixture_id'])
+    return db.session.execute(
+        select(Fixture.id).where(
+            Fixture.match_week_id == event['match_week_id'],
+            Fixture.home_team == event['home_team'],
+            Fixture.away_team == event['away_team'],
+        )
+    ).scalar()
+
+
+def apply_score_event(event):
+    """Apply one score event; returns a report dict or None if it was ignored."""
+    started = time.perf_counter()
+    try:
+        fixture_id = _resolve_fixture_id(event)
+        home_score = int(event['home_score'])
+        away_score = int(event['away_score'])
+    except (KeyError, TypeError, ValueError):
+        logger.warning('Ignoring malformed score event: %r', event)
+        return None
+    if fixture_id is None:
+        logger.warning('Ignoring score event for unknown fixture: %r', event)
+        return None
+
+    values = {'home_score': home_score, 'away_score': away_score}
+    if 'status' in event:
+        values['is_completed'] = event['status'] == 'final'
+    result = db.session.execute(update(Fixture).where(Fixture.id == fixture_id).values(**values))
+    if not result.rowcount:
+        db.session.rollback()
+        logger.warning('Ignoring score event for unknown fixture: %r', event)
+        return None
+    fixture = db.session.execute(
+        select(Fixture.match_week_id, Fixture.home_team, Fixture.away_team, Fixture.is_completed)
+        .where(Fixture.id == fixture_id)
+    ).first()
+    publish_after_commit('fixture', {'fixture_id': fixture_id, 'home_score': home_score,
+                                     'away_score': away_score, **fixture._asdict()})
+
+    report = score_fixtures(fixture_ids=[fixture_id], include_live=True)
+    report['fixture_id'] = fixture_id
+    report['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def consume(lines):
+    """Apply every event in an iterable of JSON lines; yields the reports."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            logger.warning('Ignoring invalid JSON in score feed: %r', line)
+            continue
+        report = apply_score_event(event)
+        if report is not None:
+            yield report
+
+
+def follow_file(path, poll_interval=0.2, follow=True):
+    """Yield lines from a JSONL file, waiting for new ones when following."""
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if line:
+                if line.endswith('\n') or not follow:
+                    yield line
+                    continue
+                # Partial line: rewind and wait for the writer to finish it.
+                f.seek(f.tell() - len(line))
+            elif not follow:
+                return
+            time.sleep(poll_interval)
+
+
+def serve_socket(app, host, port, on_report=None):
+    """Accept newline-delimited events over TCP until interrupted."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lines = (raw.decode('utf-8') for raw in self.rfile)
+            with app.app_context():
+                for report in consume(lines):
+                    if on_report:
+                        on_report(report)
+
+    with socketserver.TCPServer((host, port), Handler) as server:
+        server.serve_forever()
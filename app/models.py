@@ -28,6 +28,8 @@ class Season(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     season_start_year = db.Column(db.Integer, nullable=False)
     season_end_year = db.Column(db.Integer, nullable=False)
+    # Set once the season's fixtures and predictions have moved to the archive.
+    archived_at = db.Column(db.DateTime, nullable=True)
     match_weeks = db.relationship('MatchWeek', backref='season', lazy=True)
 
 
@@ -47,7 +49,11 @@ class MatchWeek(db.Model):
     is_active = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     fixtures = db.relationship('Fixture', backref='match_week', lazy=True)
-    
+    __table_args__ = (
+        db.Index('ix_match_week_is_active', 'is_active'),
+        db.Index('ix_match_week_season_week', 'season_id', 'week_id'),
+        db.Index('ix_match_week_window', 'predictions_open_time', 'predictions_close_time'),
+    )
     
     def __repr__(self):
         return f'<MatchWeek {self.week_id}: Season {self.season_id}>'
@@ -68,6 +74,10 @@ class Fixture(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     predictions = db.relationship('Prediction', backref='fixture', lazy=True)
+    __table_args__ = (
+        db.UniqueConstraint('match_week_id', 'home_team', 'away_team', name='unique_match_week_fixture'),
+        db.Index('ix_fixture_match_week_id', 'match_week_id'),
+    )
     def __repr__(self):
         return f'<Fixture {self.home_team} vs {self.away_team}>'
     @property
@@ -88,10 +98,13 @@ class Prediction(db.Model):
     fixture_id = db.Column(db.Integer, db.ForeignKey('fixture.id'), nullable=False)
     home_score_prediction = db.Column(db.Integer, nullable=False)
     away_score_prediction = db.Column(db.Integer, nullable=False)
-    points_earned = db.Column(db.Integer, default=0)
+    points_earned = db.Column(db.Integer, nullable=True)  # NULL until the fixture is scored
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    __table_args__ = (db.UniqueConstraint('user_id', 'fixture_id', name='unique_user_fixture'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'fixture_id', name='unique_user_fixture'),
+        db.Index('ix_prediction_fixture_id', 'fixture_id'),
+    )
     def __repr__(self):
         return f'<Prediction {self.home_score_prediction}-{self.away_score_prediction}>'
     @property
@@ -104,3 +117,148 @@ class Prediction(db.Model):
             return 'D'
 
 
+class UserStanding(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_points = db.Column(db.Integer, nullable=False, default=0)
+    exact_scores = db.Column(db.Integer, nullable=False, default=0)
+    correct_results = db.Column(db.Integer, nullable=False, default=0)
+    rank = db.Column(db.Integer, nullable=True)
+    position = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user = db.relationship('User', backref=db.backref('standing', uselist=False))
+    __table_args__ = (
+        db.Index('ix_user_standing_position', 'position'),
+        db.Index('ix_user_standing_total_points', 'total_points'),
+    )
+    def __repr__(self):
+        return f'<UserStanding {self.user_id}: {self.total_points}>'
+
+
+class UserWeekStats(db.Model):
+    """Per-user, per-match-week rollup kept up to date by the scoring path."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    match_week_id = db.Column(db.Integer, db.ForeignKey('match_week.id'), primary_key=True)
+    season_id = db.Column(db.Integer, db.ForeignKey('season.id'), nullable=False)
+    week_number = db.Column(db.Integer, nullable=False)
+    predictions_scored = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    exact_scores = db.Column(db.Integer, nullable=False, default=0)
+    correct_results = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_user_week_stats_user_season', 'user_id', 'season_id', 'week_number'),)
+    def __repr__(self):
+        return f'<UserWeekStats {self.user_id}: week {self.week_number} {self.points}>'
+
+
+class League(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    code = db.Column(db.String(12), unique=True, nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    owner = db.relationship('User')
+    def __repr__(self):
+        return f'<League {self.name}>'
+
+
+class LeagueMember(db.Model):
+    league_id = db.Column(db.Integer, db.ForeignKey('league.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_league_member_user_league', 'user_id', 'league_id'),)
+    def __repr__(self):
+        return f'<LeagueMember {self.user_id} in {self.league_id}>'
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    message = db.Column(db.String(200), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        db.Index('ix_job_parent_id', 'parent_id'),
+    )
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+class ContentVersion(db.Model):
+    """Version counter behind HTTP validators; see cache.get_versions."""
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modified_at = db.Column(db.Float, nullable=True)  # Unix time of the last bump
+    def __repr__(self):
+        return f'<ContentVersion {self.name}={self.version}>'
+
+
+class SeasonStanding(db.Model):
+    """Final standings of an archived season, frozen when it was archived."""
+    season_id = db.Column(db.Integer, db.ForeignKey('season.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    predictions_scored = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    exact_scores = db.Column(db.Integer, nullable=False, default=0)
+    correct_results = db.Column(db.Integer, nullable=False, default=0)
+    rank = db.Column(db.Integer, nullable=True)
+    position = db.Column(db.Integer, nullable=True)
+    __table_args__ = (db.Index('ix_season_standing_season_position', 'season_id', 'position'),)
+    def __repr__(self):
+        return f'<SeasonStanding {self.season_id}/{self.user_id}: {self.points}>'
+
+
+# Archived seasons live in the 'archive' bind (ARCHIVE_DB_URI), so the live
+# fixture and prediction tables and their indexes only hold current seasons.
+# Rows keep their live ids under their season; the archive has no foreign
+# keys into the live database, so fixtures carry their week number along.
+
+class ArchivedFixture(db.Model):
+    __bind_key__ = 'archive'
+    season_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    match_week_id = db.Column(db.Integer, nullable=False)
+    week_number = db.Column(db.Integer, nullable=False)
+    home_team = db.Column(db.String(50), nullable=False)
+    away_team = db.Column(db.String(50), nullable=False)
+    match_datetime = db.Column(db.DateTime, nullable=True)
+    home_score = db.Column(db.Integer, nullable=True)
+    away_score = db.Column(db.Integer, nullable=True)
+    is_completed = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_archived_fixture_match_week_id', 'match_week_id'),
+    )
+    def __repr__(self):
+        return f'<ArchivedFixture {self.home_team} vs {self.away_team}>'
+
+
+class ArchivedPrediction(db.Model):
+    __bind_key__ = 'archive'
+    season_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    fixture_id = db.Column(db.Integer, nullable=False)
+    home_score_prediction = db.Column(db.Integer, nullable=False)
+    away_score_prediction = db.Column(db.Integer, nullable=False)
+    points_earned = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_archived_prediction_user_season', 'user_id', 'season_id'),
+    )
+    def __repr__(self):
+        return f'<ArchivedPrediction {self.user_id}/{self.fixture_id}>'
@@ -0,0 +1,78 @@
+"""
+Saving predictions for a match week.
+
+All of a user's predictions for a week are written with one
+INSERT ... ON CONFLICT (user_id, fixture_id) DO UPDATE statement that
+relies on the unique_user_fixture constraint, so a whole week is a single
+statement and a single transaction. With PREDICTION_BUFFER on, the routes
+hand validated predictions to `write_buffer` instead, which batches many
+users' submissions into the same upsert.
+"""
+from datetime import datetime
+
+from .bulk import upsert_statement
+from .models import db, Prediction
+
+MIN_SCORE = 0
+MAX_SCORE = 20
+
+
+def parse_predictions(entries, allowed_fixture_ids):
+    """Validate submitted entries and return {fixture_id: (home, away)}.
+
+    Raises ValueError with a user-facing message on bad input.
+    """
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('No predictions submitted')
+    parsed = {}
+    for entry in entries:
+        try:
+            fixture_id = int(entry['fixture_id'])
+            home_score = int(entry['home_score'])
+            away_score = int(entry['away_score'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each prediction needs fixture_id, home_score and away_score')
+        if fixture_id not in allowed_fixture_ids:
+            raise ValueError(f'Fixture {fixture_id} is not part of this match week')
+        for score in (home_score, away_score):
+            if not MIN_SCORE <= score <= MAX_SCORE:
+                raise ValueError(f'Scores must be between {MIN_SCORE} and {MAX_SCORE}')
+        parsed[fixture_id] = (home_score, away_score)
+    return parsed
+
+
+def upsert_predictions(user_id, predictions, commit=True):
+    """Insert or update a user's predictions given {fixture_id: (home, away)}."""
+    if not predictions:
+        return 0
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'fixture_id': fixture_id,
+            'home_score_prediction': home_score,
+            'away_score_prediction': away_score,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for fixture_id, (home_score, away_score) in predictions.items()
+    ]
+    upsert_prediction_rows(rows)
+    if commit:
+        db.session.commit()
+    return len(rows)
+
+
+def upsert_prediction_rows(rows):
+    """One upsert for prediction row dicts, which may span users.
+
+    A row older than the stored prediction (by updated_at) is ignored, so
+    the latest submission wins whatever order the rows are written in.
+    """
+    db.session.execute(upsert_statement(
+        Prediction, rows,
+        conflict_columns=('user_id', 'fixture_id'),
+        update_columns=('home_score_prediction', 'away_score_prediction', 'updated_at'),
+        constraint='unique_user_fixture',
+        newer_column='updated_at',
+    ))
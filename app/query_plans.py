@@ -0,0 +1,159 @@
+"""
+Query-plan regression checks for the hot-path queries.
+
+Each entry in HOT_QUERIES builds the statement a route or the scoring path
+runs. `check_query_plans()` runs EXPLAIN QUERY PLAN for each of them on
+SQLite and reports any step that scans a table without an index. Run it
+with `flask check-query-plans`; it exits non-zero on a regression.
+"""
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import joinedload
+
+from .models import db, User, Season, MatchWeek, Fixture, Prediction, UserStanding, UserWeekStats
+from .scoring import points_expression, _fixture_filter
+from .standings import PAGE_SIZE
+from .leagues import league_standings_statement, leagues_for_user_statement
+from .jobs import due_jobs_statement
+from .archive import season_standings_statement
+
+SAMPLE_ID = 1
+
+
+def _active_match_weeks():
+    return MatchWeek.query.options(joinedload(MatchWeek.week)).filter_by(is_active=True).statement
+
+
+def _open_match_weeks():
+    now = func.current_timestamp()
+    return select(MatchWeek.id).where(MatchWeek.predictions_open_time <= now,
+                                      MatchWeek.predictions_close_time >= now)
+
+
+def _match_week_by_id():
+    return MatchWeek.query.options(joinedload(MatchWeek.week)).filter(MatchWeek.id == SAMPLE_ID).statement
+
+
+def _fixtures_by_match_week():
+    return Fixture.query.filter_by(match_week_id=SAMPLE_ID).order_by(Fixture.id).statement
+
+
+def _user_predictions_for_week():
+    return Prediction.query.filter(
+        Prediction.user_id == SAMPLE_ID,
+        Prediction.fixture_id.in_([1, 2, 3]),
+    ).statement
+
+
+def _user_prediction_history():
+    return Prediction.query.filter(Prediction.user_id == SAMPLE_ID).statement
+
+
+def _predictions_by_fixture():
+    return select(Prediction.user_id, Prediction.points_earned).where(Prediction.fixture_id == SAMPLE_ID)
+
+
+def _scoring_deltas_for_week():
+    points = points_expression()
+    return (
+        select(Prediction.user_id, Fixture.match_week_id, func.sum(points))
+        .where(*_fixture_filter(match_week_id=SAMPLE_ID))
+        .group_by(Prediction.user_id, Fixture.match_week_id)
+    )
+
+
+def _scoring_deltas_for_fixture():
+    points = points_expression()
+    return (
+        select(Prediction.user_id, Fixture.match_week_id, func.sum(points))
+        .where(*_fixture_filter(fixture_ids=[SAMPLE_ID]))
+        .group_by(Prediction.user_id, Fixture.match_week_id)
+    )
+
+
+def _leaderboard_page():
+    return (
+        select(UserStanding.rank, UserStanding.user_id, User.name, UserStanding.total_points)
+        .join(User, User.id == UserStanding.user_id)
+        .where(UserStanding.position.between(1, PAGE_SIZE))
+        .order_by(UserStanding.position)
+    )
+
+
+def _leaderboard_page_count():
+    return select(func.max(UserStanding.position))
+
+
+def _leaderboard_user_position():
+    return select(UserStanding.position).where(UserStanding.user_id == SAMPLE_ID)
+
+
+def _user_week_stats():
+    return (
+        select(UserWeekStats.week_number, UserWeekStats.points, Season.season_start_year)
+        .join(Season, Season.id == UserWeekStats.season_id)
+        .where(UserWeekStats.user_id == SAMPLE_ID)
+        .order_by(UserWeekStats.season_id.desc(), UserWeekStats.week_number)
+    )
+
+
+def _next_window_opening():
+    return select(func.min(MatchWeek.predictions_open_time)).where(
+        MatchWeek.predictions_open_time > func.current_timestamp())
+
+
+HOT_QUERIES = [
+    ('active match weeks', _active_match_weeks),
+    ('open prediction windows', _open_match_weeks),
+    ('match week by id', _match_week_by_id),
+    ('fixtures by match week', _fixtures_by_match_week),
+    ('user predictions for a week', _user_predictions_for_week),
+    ('user prediction history', _user_prediction_history),
+    ('predictions by fixture', _predictions_by_fixture),
+    ('scoring deltas for a match week', _scoring_deltas_for_week),
+    ('scoring deltas for a fixture', _scoring_deltas_for_fixture),
+    ('leaderboard page', _leaderboard_page),
+    ('leaderboard page count', _leaderboard_page_count),
+    ('leaderboard position for user', _leaderboard_user_position),
+    ('user weekly stats', _user_week_stats),
+    ('league standings page', lambda: league_standings_statement(SAMPLE_ID)),
+    ('leagues for user', lambda: leagues_for_user_statement(SAMPLE_ID)),
+    ('next due jobs', lambda: due_jobs_statement(func.current_timestamp(), 5)),
+    ('next match week to open', _next_window_opening),
+    ('archived season standings page', lambda: season_standings_statement(SAMPLE_ID, 1, PAGE_SIZE)),
+]
+
+
+def is_full_scan(detail, derived=()):
+    """True for plan steps like 'SCAN prediction' that read a whole table.
+
+    Scans of subqueries the plan materialized itself (window-function
+    rankings, for example) are listed in `derived` and are not tables.
+    """
+    if not detail.startswith('SCAN ') or ' USING ' in detail:
+        return False
+    return detail[len('SCAN '):] not in derived
+
+
+def _derived_tables(plan):
+    return {detail.split(' ', 1)[1] for detail in plan
+            if detail.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+
+
+def explain(statement):
+    dialect = db.session.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def check_query_plans():
+    """Return {query name: [full-scan plan steps]} for every regressed query."""
+    if db.session.get_bind().dialect.name != 'sqlite':
+        raise RuntimeError('Query plan checks run against SQLite only')
+    failures = {}
+    for name, build in HOT_QUERIES:
+        plan = explain(build())
+        derived = _derived_tables(plan)
+        scans = [detail for detail in plan if is_full_scan(detail, derived)]
+        if scans:
+            failures[name] = scans
+    return failures
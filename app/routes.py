@@ -1,69 +1,72 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, abort, current_app, Response
 from flask_login import login_user, login_required, logout_user, current_user
-from datetime import datetime, timedelta
-from .models import db, User, Season, MatchWeek, Fixture, Prediction, Week
-from .forms import FixtureForm, CreateMatchWeekForm, PredictionForm, CreateSeasonForm
-from wtforms import FieldList, FormField
-from . import oauth
-import os
+from .models import db, User, Prediction, League
+from .forms import FixtureForm, PredictionForm, CreateLeagueForm, JoinLeagueForm
+from .auth import google_client
+from . import standings
+from . import archive
+from . import leagues as league_service
+from .user_stats import user_stats
+from .predictions import parse_predictions, upsert_predictions
+from .events import broker, ensure_window_watcher
+from .database import read_replica, stick_to_primary
+from .cache import (cache, get_active_match_weeks, get_fixtures, get_match_week, invalidate_user,
+                    bump_on_commit, get_versions, LEADERBOARD_VERSION, SCHEDULE, match_week_version,
+                    predictions_version)
+from .fragments import FRAGMENTS, fill, fragment
+from markupsafe import Markup
+from .http_cache import conditional, public_when_anonymous
+from .write_buffer import prediction_buffer
+from .schedule import schedule_index
+from datetime import datetime
+import json
 
 bp = Blueprint('main', __name__)
 
-ADMIN_EMAILS = os.getenv('ADMIN_EMAILS')
-
 weeks = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 
         21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38]
 
-# Sky Sports API Integration (Mock implementation - replace with actual API)
-def fetch_fixtures_from_sky_sports():
-    mock_fixtures = [
-        {
-            'home_team': 'Manchester United',
-            'away_team': 'Arsenal',
-            'match_datetime': datetime.now() + timedelta(days=7),
-        },
-        {
-            'home_team': 'Chelsea',
-            'away_team': 'Liverpool',
-            'match_datetime': datetime.now() + timedelta(days=7, hours=2),
-        }
-    ]
-    return mock_fixtures
-
 @bp.route('/')
+@read_replica
+@public_when_anonymous
 def index():
-    active_match_weeks = MatchWeek.query.filter_by(is_active=True).all()
-    return render_template('index.html', active_match_weeks=active_match_weeks)
+    active_match_weeks = get_active_match_weeks()
+    # Window state is time-driven, so it is part of the key rather than a version.
+    states = ','.join(f"{mw.id}{'o' if mw.is_predictions_open else 'c'}" for mw in active_match_weeks)
+    active_match_weeks_html = fragment(SCHEDULE, f'active_match_weeks:{states}', lambda: render_template(
+        '_active_match_weeks.html', active_match_weeks=active_match_weeks))
+    return render_template('index.html', active_match_weeks=active_match_weeks,
+                           active_match_weeks_html=active_match_weeks_html)
 
 
 @bp.route('/login')
+@public_when_anonymous
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     return render_template('login.html')
 
 
-# The following routes require OAuth and app context, which will be handled in __init__.py
-# Placeholders for now:
 @bp.route('/authorize/google')
 def google_auth():
     redirect_uri = url_for('main.google_callback', _external=True)
-    return oauth.google.authorize_redirect(redirect_uri)
+    return google_client().authorize_redirect(redirect_uri)
 
 
 @bp.route('/authorize/google/callback')
 def google_callback():
-    token = oauth.google.authorize_access_token()
+    token = google_client().authorize_access_token()
     user_info = token.get('userinfo')
     if user_info:
+        admin_emails = current_app.config['ADMIN_EMAILS']
+        is_admin_email = user_info['email'].strip().lower() in admin_emails
         user = User.query.filter_by(google_id=user_info['sub']).first()
         if not user:
             user = User.query.filter_by(email=user_info['email']).first()
             if user:
                 user.google_id = user_info['sub']
-                user.name = user_info['name']
             else:
-                if user_info['email'] in ADMIN_EMAILS:
+                if is_admin_email:
                     user = User(
                     google_id=user_info['sub'],
                     email=user_info['email'],
@@ -78,8 +81,17 @@ def google_callback():
                         name=user_info['name']
                     )
                     db.session.add(user)
+        if user.id is not None:
+            if user.name != user_info['name']:
+                user.name = user_info['name']
+                bump_on_commit(LEADERBOARD_VERSION)
+            if admin_emails and bool(user.is_admin) != is_admin_email:
+                user.is_admin = is_admin_email
+        if db.session.dirty or db.session.new:
             db.session.commit()
+            invalidate_user(user.id)
         login_user(user)
+        stick_to_primary()
         flash('Successfully logged in!', 'success')
         return redirect(url_for('main.index'))
     flash('Authentication failed', 'error')
@@ -95,244 +107,284 @@ def logout():
     return redirect(url_for('main.index'))
 
 
-@bp.route('/admin')
+def _predict_validators(week_id):
+    match_week = get_match_week(week_id)
+    if match_week is None or not match_week.is_predictions_open:
+        return None
+    # Buffered predictions bump the version when they are flushed, not before.
+    if prediction_buffer.pending_for(current_user.id, [fixture.id for fixture in get_fixtures(week_id)]):
+        return None
+    names = [match_week_version(week_id), predictions_version(current_user.id, week_id)]
+    return names, [current_user.id, current_user.name, week_id]
+
+
+@bp.route('/predict/<int:week_id>')
+@read_replica
 @login_required
-def admin_dashboard():
-    if not current_user.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
+@conditional(_predict_validators)
+def predict_match_week(week_id):
+    match_week = get_match_week(week_id)
+    if match_week is None:
+        abort(404)
+    if not match_week.is_predictions_open:
+        flash('Predictions are not open for this match week.', 'warning')
         return redirect(url_for('main.index'))
-    return render_template('admin/dashboard.html')
+    fixtures = get_fixtures(week_id)
+    # Only rendered while the window is open, so the cards are always forms.
+    fixture_cards = fragment(SCHEDULE, f'fixture_cards:{week_id}', lambda: render_template(
+        '_fixture_cards.html', fixtures=fixtures))
+    values = {}
+    if fixtures:
+        predictions = Prediction.query.filter(
+            Prediction.user_id == current_user.id,
+            Prediction.fixture_id.in_([fixture.id for fixture in fixtures])
+        ).all()
+        for prediction in predictions:
+            values[('home', prediction.fixture_id)] = prediction.home_score_prediction
+            values[('away', prediction.fixture_id)] = prediction.away_score_prediction
+            values[('status', prediction.fixture_id)] = 'Saved'
+        # Accepted but not flushed yet; shown as saved because they are durable.
+        pending = prediction_buffer.pending_for(current_user.id, [fixture.id for fixture in fixtures])
+        for fixture_id, (home, away) in pending.items():
+            values[('home', fixture_id)] = home
+            values[('away', fixture_id)] = away
+            values[('status', fixture_id)] = 'Saved'
+    return render_template('predict.html', match_week=match_week, fixture_cards=fill(fixture_cards, values))
+
+
+
+def save_week_predictions(match_week, entries, fixture_ids=None):
+    if not match_week.is_predictions_open:
+        return jsonify({'error': 'Predictions are closed for this match week'}), 400
+    if fixture_ids is None:
+        fixture_ids = {fixture.id for fixture in get_fixtures(match_week.id)}
+    try:
+        predictions = parse_predictions(entries, fixture_ids)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if prediction_buffer.enabled:
+        # Acknowledged once it is in the durable log; the flusher writes it.
+        saved = prediction_buffer.add(current_user.id, match_week, predictions)
+        stick_to_primary()
+        return jsonify({'success': True, 'saved': saved, 'buffered': True})
+    bump_on_commit(predictions_version(current_user.id, match_week.id))
+    saved = upsert_predictions(current_user.id, predictions)
+    stick_to_primary()
+    return jsonify({'success': True, 'saved': saved})
+
+
+@bp.route('/submit_predictions/<int:week_id>', methods=['POST'])
+@login_required
+def submit_predictions(week_id):
+    match_week = get_match_week(week_id)
+    if match_week is None:
+        abort(404)
+    payload = request.get_json(silent=True) or {}
+    return save_week_predictions(match_week, payload.get('predictions'))
 
 
-@bp.route('/admin/test_route')
+@bp.route('/submit_prediction/<int:fixture_id>', methods=['POST'])
 @login_required
-def test_route():
-    print("=== TEST ROUTE CALLED ===")
-    return "Test route works!"
+def submit_prediction(fixture_id):
+    window = schedule_index.window(fixture_id)
+    if window is None:
+        abort(404)
+    match_week_id, opens, closes = window
+    if not opens <= datetime.utcnow() <= closes:
+        return jsonify({'error': 'Predictions are closed for this match week'}), 400
+    match_week = get_match_week(match_week_id)
+    if match_week is None:
+        abort(404)  # deleted since the index was built
+    entry = {
+        'fixture_id': fixture_id,
+        'home_score': request.form.get('home_score'),
+        'away_score': request.form.get('away_score'),
+    }
+    # The index has already placed the fixture in this match week.
+    return save_week_predictions(match_week, [entry], {fixture_id})
+
+
+def _leaderboard_validators():
+    return [LEADERBOARD_VERSION], [current_user.id, current_user.name, request.full_path]
 
 
-@bp.route('/admin/create_match_week', methods=['GET', 'POST'])
+@bp.route('/leaderboard')
+@read_replica
 @login_required
-def create_match_week():
-    print("=== CREATE MATCH WEEK ROUTE CALLED ===")
-    if not current_user.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('main.index'))
-    
-    # Test database connection
-    try:
-        weeks = Week.query.order_by(Week.id).all()
-        print(f"Found {len(weeks)} weeks in database")
-        seasons = Season.query.order_by(Season.season_start_year.asc()).all()
-        print(f"Found {len(seasons)} seasons in database")
-    except Exception as e:
-        print(f"Database connection error: {str(e)}")
-        flash(f'Database error: {str(e)}', 'error')
-        return redirect(url_for('main.admin_dashboard'))
-    
-    week_choices = [(week.id, f"Week {week.week_number}") for week in weeks]
-    season_choices = [(season.id, f"{season.season_start_year}-{season.season_end_year}") for season in seasons]
-
-    # Initialize form with POST data if this is a POST request
-    if request.method == 'POST':
-        # Count the number of fixtures in the POST data
-        num_fixtures = len([key for key in request.form if key.startswith('fixtures-') and key.endswith('-home_team')])
-        print(f"Number of fixtures detected in POST data: {num_fixtures}")
-        
-        # Create a new form class with the correct number of entries
-        if num_fixtures > 0:
-            # Create a dynamic form class with the right number of entries
-            class DynamicCreateMatchWeekForm(CreateMatchWeekForm):
-                fixtures = FieldList(FormField(FixtureForm), min_entries=num_fixtures, max_entries=20)
-            
-            form = DynamicCreateMatchWeekForm(request.form)
-        else:
-            form = CreateMatchWeekForm(request.form)
-    else:
-        form = CreateMatchWeekForm()
-    
-    form.season.choices = season_choices
-    form.week_number.choices = week_choices
-
-    print(f"Request method: {request.method}")
-    print(f"Form is submitted: {form.is_submitted()}")
-    print(f"Form validation: {form.validate()}")
-    print(f"Form data: {request.form}")
-    print(f"Number of fixtures in form: {len(form.fixtures)}")
-    if not form.validate():
-        print(f"Form errors: {form.errors}")
-        for field_name, errors in form.errors.items():
-            print(f"Field {field_name} errors: {errors}")
-
-    if form.validate_on_submit():
-        print("=== FORM VALIDATION PASSED ===")
-        # Print form data for debugging
-        print(f'Week number data: {form.week_number.data}')
-        print(f'Season data: {form.season.data}')
-        print(f'Predictions open time: {form.predictions_open_time.data}')
-        print(f'Predictions close time: {form.predictions_close_time.data}')
-        print(f'Number of fixtures: {len(form.fixtures)}')
-        
-        for i, fixture_form in enumerate(form.fixtures):
-            print(f'Processing fixture {i}: home_team={fixture_form.home_team.data}, away_team={fixture_form.away_team.data}')
-            if fixture_form.home_team.data and fixture_form.away_team.data:
-                print(f'Fixture {i+1}: {fixture_form.home_team.data} vs {fixture_form.away_team.data}')
-        
-        try:
-            match_week = MatchWeek(
-                week_id=form.week_number.data,
-                season_id=form.season.data,
-                predictions_open_time=form.predictions_open_time.data,
-                predictions_close_time=form.predictions_close_time.data
-            )
-            
-            print(f'Creating MatchWeek: week_id={form.week_number.data}, season_id={form.season.data}')
-            db.session.add(match_week)
-            db.session.flush()  # This gets us the match_week.id
-            print(f'MatchWeek created with ID: {match_week.id}')
-            
-            fixture_count = 0
-            for fixture_form in form.fixtures:
-                if fixture_form.home_team.data and fixture_form.away_team.data:
-                    fixture = Fixture(
-                        match_week_id=match_week.id,
-                        home_team=fixture_form.home_team.data,
-                        away_team=fixture_form.away_team.data,
-                    )
-                    db.session.add(fixture)
-                    fixture_count += 1
-                    print(f'Added fixture: {fixture_form.home_team.data} vs {fixture_form.away_team.data}')
-            
-            db.session.commit()
-            print(f'Successfully committed {fixture_count} fixtures to database')
-            flash(f'Match Week created successfully with {fixture_count} fixtures!', 'success')
-            return redirect(url_for('main.admin_dashboard'))
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f'Error creating match week: {str(e)}')
-            flash(f'Error creating match week: {str(e)}', 'error')
-            return redirect(url_for('main.admin_dashboard'))
-    else:
-        print("=== FORM VALIDATION FAILED ===")
-    return render_template('admin/create_match_week.html', form=form)
-
-
-@bp.route('/admin/import_fixtures', methods=['POST'])
+@conditional(_leaderboard_validators)
+def leaderboard():
+    page = max(request.args.get('page', 1, type=int), 1)
+    if request.args.get('around') == 'me':
+        page = standings.page_for_user(current_user.id) or page
+    version = get_versions([LEADERBOARD_VERSION])[0][0]
+
+    def render_rows():
+        rows = standings.standings_page(page)
+        return render_template('_standings_rows.html', standings=rows) if rows else ''
+
+    standings_rows = fragment(FRAGMENTS, f'standings:{version}:{page}', render_rows)
+    page_count = cache.get_or_set(FRAGMENTS, f'standings_pages:{version}', standings.page_count)
+    standings_rows = fill(standings_rows, {
+        ('highlight', current_user.id): Markup(' class="table-warning"'),
+        ('you', current_user.id): Markup('<span class="badge bg-primary ms-2">You</span>'),
+    })
+    return render_template('leaderboard.html', standings_rows=standings_rows, page=page,
+                           page_count=page_count)
+
+
+@bp.route('/leagues')
 @login_required
-def import_fixtures():
-    if not current_user.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    try:
-        fixtures = fetch_fixtures_from_sky_sports()
-        flash(f'Imported {len(fixtures)} fixtures successfully!', 'success')
-        return jsonify({'success': True, 'count': len(fixtures)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+def leagues():
+    return render_template('leagues.html', leagues=league_service.leagues_for_user(current_user.id),
+                           create_form=CreateLeagueForm(), join_form=JoinLeagueForm())
 
 
-@bp.route('/admin/create_season', methods=['GET','POST'])
+@bp.route('/leagues/create', methods=['POST'])
 @login_required
-def create_season():
-
-    if not current_user.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
-    # seasons = Season.query.order_by(Season.season_start_year.asc()).all()
-    # season_choices = [(season.id, f"{season.season_start_year}/{season.season_end_year}") for season in seasons]
-    form = CreateSeasonForm()
-    # form.season.choices = season_choices
-
-    if form.validate_on_submit():
-        start = form.start_year.data
-        end = form.end_year.data
-
-        if Season.query.filter_by(season_start_year=start, season_end_year=end).first():
-            flash('Season exists', 'warning')
-            return redirect(request.referrer)
-        
-        else:
-            try:
-                db.session.add(
-                    Season(
-                        season_start_year=start,
-                        season_end_year=end
-                    )
-                )
-                db.session.commit()
-                return redirect(url_for('main.index'))
-            except Exception as e:
-                #error = jsonify({'error': str(e)}), 500
-                flash(f'Error: {e}', 'danger')
-    return render_template('admin/create_season.html', form=form)
+def create_league():
+    form = CreateLeagueForm()
+    if not form.validate_on_submit():
+        flash('Please enter a league name.', 'error')
+        return redirect(url_for('main.leagues'))
+    league = league_service.create_league(current_user.id, form.name.data.strip())
+    stick_to_primary()
+    flash(f'League created! Share the invite code {league.code} with your friends.', 'success')
+    return redirect(url_for('main.league_detail', league_id=league.id))
+
+
+@bp.route('/leagues/join', methods=['POST'])
+@login_required
+def join_league():
+    form = JoinLeagueForm()
+    league = league_service.join_league(current_user.id, form.code.data) if form.validate_on_submit() else None
+    if league is None:
+        flash('No league found with that invite code.', 'error')
+        return redirect(url_for('main.leagues'))
+    stick_to_primary()
+    flash(f'You have joined {league.name}!', 'success')
+    return redirect(url_for('main.league_detail', league_id=league.id))
+
+
+@bp.route('/leagues/<int:league_id>/leave', methods=['POST'])
+@login_required
+def leave_league(league_id):
+    league_service.leave_league(league_id, current_user.id)
+    stick_to_primary()
+    flash('You have left the league.', 'info')
+    return redirect(url_for('main.leagues'))
 
 
-@bp.route('/admin/activate_match_week/<int:week_id>', methods=['POST'])
+@bp.route('/leagues/<int:league_id>')
 @login_required
-def activate_match_week(week_id):
-    if not current_user.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('main.index'))
-    MatchWeek.query.update({MatchWeek.is_active: False})
-    match_week = MatchWeek.query.get_or_404(week_id)
-    match_week.is_active = True
-    db.session.commit()
-    flash(f'Match Week {match_week.week_number} activated!', 'success')
-    return redirect(url_for('main.admin_dashboard'))
+def league_detail(league_id):
+    league = League.query.get_or_404(league_id)
+    page = max(request.args.get('page', 1, type=int), 1)
+    if request.args.get('around') == 'me':
+        page = league_service.page_for_member(league_id, current_user.id) or page
+    rows, members = league_service.league_standings_page(league_id, page)
+    if not any(row.user_id == current_user.id for row in rows) \
+            and not league_service.is_member(league_id, current_user.id):
+        flash('You are not a member of that league.', 'error')
+        return redirect(url_for('main.leagues'))
+    return render_template('league.html', league=league, standings=rows, page=page,
+                           page_count=max(1, -(-members // standings.PAGE_SIZE)))
+
+
+@bp.route('/me/stats')
+@read_replica
+@login_required
+def my_stats():
+    seasons = user_stats(current_user.id, request.args.get('season_id', type=int))
+    return render_template('stats.html', seasons=seasons)
 
 
+@bp.route('/api/me/stats')
+@read_replica
+@login_required
+def my_stats_json():
+    return jsonify({'user_id': current_user.id,
+                    'seasons': user_stats(current_user.id, request.args.get('season_id', type=int))})
 
 
-@bp.route('/predict/<int:week_id>')
+@bp.route('/api/me/predictions')
+@read_replica
 @login_required
-def predict_match_week(week_id):
-    match_week = MatchWeek.query.get_or_404(week_id)
-    if not match_week.is_predictions_open:
-        flash('Predictions are not open for this match week.', 'warning')
-        return redirect(url_for('main.index'))
-    fixtures = match_week.fixtures
-    user_predictions = {}
-    for fixture in fixtures:
-        prediction = Prediction.query.filter_by(user_id=current_user.id, fixture_id=fixture.id).first()
-        if prediction:
-            user_predictions[fixture.id] = prediction
-    return render_template('predict.html', match_week=match_week, fixtures=fixtures, user_predictions=user_predictions)
+def my_predictions_json():
+    season_id = request.args.get('season_id', type=int)
+    if season_id is None:
+        return jsonify({'error': 'season_id is required'}), 400
+    return jsonify({'user_id': current_user.id, 'season_id': season_id,
+                    'predictions': archive.user_predictions(current_user.id, season_id)})
 
 
-
-@bp.route('/submit_prediction/<int:fixture_id>', methods=['POST'])
+@bp.route('/api/seasons/<int:season_id>/standings')
+@read_replica
 @login_required
-def submit_prediction(fixture_id):
-    fixture = Fixture.query.get_or_404(fixture_id)
-    if not fixture.match_week.is_predictions_open:
-        return jsonify({'error': 'Predictions are closed for this fixture'}), 400
-    home_score = int(request.form['home_score'])
-    away_score = int(request.form['away_score'])
-    prediction = Prediction.query.filter_by(user_id=current_user.id, fixture_id=fixture_id).first()
-    if prediction:
-        prediction.home_score_prediction = home_score
-        prediction.away_score_prediction = away_score
-        prediction.updated_at = datetime.utcnow()
-    else:
-        prediction = Prediction(
-            user_id=current_user.id,
-            fixture_id=fixture_id,
-            home_score_prediction=home_score,
-            away_score_prediction=away_score
-        )
-        db.session.add(prediction)
-    db.session.commit()
-    return jsonify({'success': True})
+def season_standings_json(season_id):
+    page = max(request.args.get('page', 1, type=int), 1)
+    first = (page - 1) * standings.PAGE_SIZE + 1
+    rows = db.session.execute(
+        archive.season_standings_statement(season_id, first, first + standings.PAGE_SIZE - 1)).all()
+    return jsonify({'season_id': season_id, 'page': page, 'standings': [
+        {'position': row.position, 'rank': row.rank, 'user_id': row.user_id, 'user_name': row.name,
+         'points': row.points, 'exact_scores': row.exact_scores, 'correct_results': row.correct_results}
+        for row in rows
+    ]})
 
 
-@bp.route('/leaderboard')
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+def _last_event_id(value):
+    try:
+        last_id = int(value)
+    except (TypeError, ValueError):
+        return broker.last_id
+    if broker.shared:
+        # Ids ahead of ours are events this process has not tailed yet.
+        return last_id
+    # A restarted process numbers events from zero again.
+    return min(last_id, broker.last_id)
+
+
+@bp.route('/events')
 @login_required
-def leaderboard():
-    user_points = db.session.query(
-        User.name,
-        db.func.sum(Prediction.points_earned).label('total_points')
-    ).join(Prediction).group_by(User.id).order_by(db.desc('total_points')).all()
-    return render_template('leaderboard.html', user_points=user_points)
+def event_stream():
+    ensure_window_watcher(current_app._get_current_object())
+    last_id = _last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_id'))
+    if not broker.open_stream():
+        # Every stream holds a worker thread; the page falls back to /events/poll.
+        return Response('Too many open event streams; use /events/poll\n', status=503,
+                        mimetype='text/plain', headers={'Retry-After': '30'})
+
+    def stream(last_id):
+        yield 'retry: 3000\n\n'
+        while True:
+            events = broker.wait(last_id, EVENT_KEEPALIVE_SECONDS)
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            for seq, kind, data in events:
+                yield f'id: {seq}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n'
+                last_id = seq
+
+    response = Response(stream(last_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(broker.close_stream)
+    return response
+
+
+@bp.route('/events/poll')
+@login_required
+def event_poll():
+    ensure_window_watcher(current_app._get_current_object())
+    last_id = _last_event_id(request.args.get('last_id'))
+    # Answer at once: a poll never holds a worker thread.
+    events = broker.since(last_id)
+    return jsonify({
+        'last_id': events[-1][0] if events else last_id,
+        'events': [{'id': seq, 'event': kind, 'data': data} for seq, kind, data in events],
+    })
 
 
 @bp.route('/api/add_fixture_form')
@@ -0,0 +1,183 @@
+"""
+Prediction windows held in memory.
+
+`schedule_index` maps every live fixture id to its match week and
+prediction window: (match_week_id, open time, close time). It is built at
+startup. Every change to match weeks or fixtures goes through
+invalidate_schedule, which bumps the schedule version in the database,
+whichever process makes it: the web app, `flask load-season`, an import
+job. Score updates change no window and go through invalidate_scores
+instead, so they never rebuild the index. The index reads the schedule
+version at most once every CHECK_SECONDS, and straight away when this
+process invalidates the 'schedule' namespace or a lookup misses, and
+rebuilds when it has changed. Single-fixture
+submissions are checked against it, so most late submissions are
+rejected without a query. An unknown fixture costs one primary-key query.
+
+A scheduler thread keeps MatchWeek.is_active in step with the calendar.
+When a window opens, its match week becomes active and the previous one
+is retired. Closing a window only ends predictions, so the week stays on
+the home page while its matches are played. The thread sleeps until the
+next window opens, then updates only the rows whose flag changes. A
+second run changes nothing, so every process may run its own.
+An admin can still activate a later match week early; the scheduler
+leaves that alone.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from .cache import SCHEDULE, SCHEDULE_VERSION, cache, get_versions, invalidate_schedule
+from .events import publish_after_commit
+from .models import db, Fixture, MatchWeek
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleIndex:
+    CHECK_SECONDS = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._state = (None, None, {})  # (schedule version, cache generation, windows)
+        self._checked = 0.0
+
+    def _versions(self):
+        return get_versions([SCHEDULE_VERSION])[0], cache.generation(SCHEDULE)
+
+    def build(self):
+        # Read the versions first: a change that lands mid-build only causes
+        # one more rebuild, never a stale index under a new version.
+        version, generation = self._versions()
+        rows = db.session.execute(
+            select(Fixture.id, Fixture.match_week_id, MatchWeek.predictions_open_time,
+                   MatchWeek.predictions_close_time)
+            .join(MatchWeek, MatchWeek.id == Fixture.match_week_id)
+        )
+        self._state = (version, generation, {fixture_id: (match_week_id, opens, closes)
+                                             for fixture_id, match_week_id, opens, closes in rows})
+        self._checked = time.monotonic()
+        return len(self._state[2])
+
+    def _windows(self, force=False):
+        _, generation, windows = self._state
+        if (force or generation != cache.generation(SCHEDULE)
+                or time.monotonic() - self._checked >= self.CHECK_SECONDS):
+            with self._lock:
+                if self._state[:2] != self._versions():
+                    self.build()
+                else:
+                    self._checked = time.monotonic()
+            windows = self._state[2]
+        return windows
+
+    def window(self, fixture_id):
+        """(match_week_id, open, close) for a live fixture, or None."""
+        window = self._windows().get(fixture_id)
+        if window is None:
+            # Perhaps added by another process since the last check.
+            window = self._windows(force=True).get(fixture_id)
+        return window
+
+    def is_open(self, fixture_id, now=None):
+        window = self.window(fixture_id)
+        if window is None:
+            return False
+        now = now or datetime.utcnow()
+        return window[1] <= now <= window[2]
+
+
+schedule_index = ScheduleIndex()
+
+
+def activate_current(now=None):
+    """Activate the most recently opened match week unless it was already reached.
+
+    Nothing changes while an active match week opened at or after the
+    latest opening, so a week activated early by an admin is left alone.
+    Returns the ids whose flag changed.
+    """
+    now = now or datetime.utcnow()
+    latest = db.session.execute(
+        select(func.max(MatchWeek.predictions_open_time)).where(MatchWeek.predictions_open_time <= now)
+    ).scalar()
+    if latest is None:
+        return []
+    reached = db.session.execute(
+        select(MatchWeek.id).where(MatchWeek.is_active.is_(True), MatchWeek.predictions_open_time >= latest)
+        .limit(1)
+    ).first()
+    if reached:
+        return []
+    activated = db.session.execute(
+        select(MatchWeek.id).where(MatchWeek.predictions_open_time == latest)).scalars().all()
+    retired = db.session.execute(
+        select(MatchWeek.id).where(MatchWeek.is_active.is_(True))).scalars().all()
+    db.session.execute(update(MatchWeek).where(MatchWeek.id.in_(retired)).values(is_active=False))
+    db.session.execute(update(MatchWeek).where(MatchWeek.id.in_(activated)).values(is_active=True))
+    for match_week_id in activated:
+        publish_after_commit('schedule', {'match_week_id': match_week_id})
+    db.session.commit()
+    invalidate_schedule(activated + retired)
+    logger.info('activated match weeks %s, retired %s', activated, retired)
+    return activated + retired
+
+
+def _next_open_time(now):
+    return db.session.execute(
+        select(func.min(MatchWeek.predictions_open_time)).where(MatchWeek.predictions_open_time > now)
+    ).scalar()
+
+
+def _run_scheduler(app, max_sleep=30):
+    while True:
+        delay = max_sleep
+        try:
+            with app.app_context():
+                activate_current()
+                now = datetime.utcnow()
+                opens = _next_open_time(now)
+                db.session.remove()
+            if opens is not None:
+                delay = min(max_sleep, (opens - now).total_seconds() + 0.05)
+        except Exception:
+            logger.exception('match week scheduler failed; retrying')
+        time.sleep(max(delay, 0.05))
+
+
+_scheduler_lock = threading.Lock()
+_scheduler_started = False
+
+
+def ensure_scheduler(app):
+    global _scheduler_started
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+    threading.Thread(target=_run_scheduler, args=(app,), daemon=True).start()
+
+
+def init_app(app, serving=True):
+    """Build the index and start the scheduler; CLI commands need neither up front."""
+    # A new app may use another database; never serve the previous one's windows.
+    schedule_index.clear()
+    if not serving:
+        return
+    with app.app_context():
+        try:
+            schedule_index.build()
+        except Exception as e:
+            # Tables may not exist yet (first run, migrations pending); the
+            # first lookup builds it instead.
+            logger.warning('could not build the schedule index: %s', getattr(e, 'orig', e))
+        finally:
+            db.session.remove()
+    if app.config['MATCH_WEEK_SCHEDULER']:
+        ensure_scheduler(app)
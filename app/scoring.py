@@ -0,0 +1,172 @@
+"""
+Set-based scoring of predictions for completed fixtures.
+
+Points are computed in SQL with a single UPDATE over the prediction table
+joined to its fixture, so scoring a matchweek never loads Prediction objects
+into Python. Re-running is safe: rows are recomputed from the current
+fixture score, so a corrected result simply overwrites the old points.
+The per-user, per-match-week change is aggregated from the rows about to
+change and applied to the materialized standings and the weekly history
+rollup instead of re-summing the whole table.
+
+Those rows are locked before their old points are read. A concurrent run
+over the same fixtures waits for this one to commit, then finds nothing
+left to change, so its deltas are empty instead of applied twice.
+"""
+import time
+
+from sqlalchemy import and_, case, false, func, or_, select, update
+
+from .models import db, Fixture, Prediction
+from .standings import apply_point_deltas
+from .user_stats import apply_week_deltas
+from .cache import invalidate_scores
+
+EXACT_SCORE_POINTS = 3
+CORRECT_RESULT_POINTS = 1
+
+
+def _outcome(home, away):
+    return case((home > away, 'H'), (home < away, 'A'), else_='D')
+
+
+def points_expression():
+    """SQL expression for the points a prediction earns against its fixture."""
+    return case(
+        (and_(Prediction.home_score_prediction == Fixture.home_score,
+              Prediction.away_score_prediction == Fixture.away_score), EXACT_SCORE_POINTS),
+        (_outcome(Prediction.home_score_prediction, Prediction.away_score_prediction)
+         == _outcome(Fixture.home_score, Fixture.away_score), CORRECT_RESULT_POINTS),
+        else_=0,
+    )
+
+
+def _fixture_filter(fixture_ids=None, match_week_id=None, include_live=False):
+    criteria = [
+        Prediction.fixture_id == Fixture.id,
+        Fixture.home_score.isnot(None),
+        Fixture.away_score.isnot(None),
+    ]
+    if not include_live:
+        criteria.append(Fixture.is_completed.is_(True))
+    if fixture_ids is not None:
+        criteria.append(Fixture.id.in_(list(fixture_ids)))
+    if match_week_id is not None:
+        criteria.append(Fixture.match_week_id == match_week_id)
+    return criteria
+
+
+def _flag(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+
+def lock_changed_rows(criteria, points):
+    """Lock the predictions whose points are about to change, until the commit.
+
+    SQLite has no row locks, so there the database write lock is taken with
+    an UPDATE that matches nothing.
+    """
+    if db.session.get_bind(mapper=Prediction).dialect.name == 'sqlite':
+        db.session.execute(
+            update(Prediction).where(false()).values(points_earned=Prediction.points_earned)
+            .execution_options(synchronize_session=False))
+        return
+    db.session.execute(
+        select(Prediction.id).where(*criteria)
+        .where(Prediction.points_earned.is_distinct_from(points))
+        .with_for_update(of=Prediction)
+    ).all()
+
+
+def week_deltas(criteria, points):
+    """Per-user, per-match-week change in points, exact scores and correct results.
+
+    `scored` counts predictions getting points for the first time.
+    """
+    old = func.coalesce(Prediction.points_earned, 0)
+    rows = db.session.execute(
+        select(
+            Prediction.user_id,
+            Fixture.match_week_id,
+            _flag(Prediction.points_earned.is_(None)),
+            func.sum(points - old),
+            _flag(points == EXACT_SCORE_POINTS) - _flag(old == EXACT_SCORE_POINTS),
+            _flag(points >= CORRECT_RESULT_POINTS) - _flag(old >= CORRECT_RESULT_POINTS),
+        )
+        .where(*criteria)
+        .where(Prediction.points_earned.is_distinct_from(points))
+        .group_by(Prediction.user_id, Fixture.match_week_id)
+    )
+    return [
+        {'user_id': user_id, 'match_week_id': match_week_id, 'scored': scored,
+         'points': pts, 'exact_scores': exact, 'correct_results': correct}
+        for user_id, match_week_id, scored, pts, exact, correct in rows
+    ]
+
+
+def point_deltas(week_deltas):
+    """Collapse per-week deltas into per-user deltas for the standings."""
+    totals = {}
+    for d in week_deltas:
+        total = totals.setdefault(d['user_id'], {'user_id': d['user_id'], 'points': 0,
+                                                 'exact_scores': 0, 'correct_results': 0})
+        total['points'] += d['points']
+        total['exact_scores'] += d['exact_scores']
+        total['correct_results'] += d['correct_results']
+    return list(totals.values())
+
+
+def clear_unscored_points():
+    """Set points back to NULL (unscored) on fixtures without a score; returns the rows changed.
+
+    Predictions made before points_earned became nullable defaulted to 0,
+    which reads as scored without points. Safe to run again.
+    """
+    unscored = select(Fixture.id).where(or_(Fixture.home_score.is_(None), Fixture.away_score.is_(None)))
+    result = db.session.execute(
+        update(Prediction)
+        .where(Prediction.points_earned.isnot(None), Prediction.fixture_id.in_(unscored))
+        # Keep updated_at: only the scoring state changes, not the prediction.
+        .values(points_earned=None, updated_at=Prediction.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def score_fixtures(fixture_ids=None, match_week_id=None, include_live=False, commit=True):
+    """Score every prediction on completed fixtures, optionally narrowed down.
+
+    With include_live, fixtures that have a score but are still in play are
+    scored too, giving provisional points that later events correct.
+    Returns a report dict with the number of rows updated and the throughput.
+    """
+    started = time.perf_counter()
+    points = points_expression()
+    criteria = _fixture_filter(fixture_ids, match_week_id, include_live)
+    lock_changed_rows(criteria, points)
+    weekly = week_deltas(criteria, points)
+
+    stmt = (
+        update(Prediction)
+        .where(*criteria)
+        .where(Prediction.points_earned.is_distinct_from(points))
+        .values(points_earned=points)
+        .execution_options(synchronize_session=False)
+    )
+    result = db.session.execute(stmt)
+    apply_week_deltas(weekly)
+    users_changed = apply_point_deltas(point_deltas(weekly))
+    if commit:
+        db.session.commit()
+        # Scores change no fixture or window, so the schedule is left alone.
+        weeks = {d['match_week_id'] for d in weekly}
+        invalidate_scores(weeks | {match_week_id} if match_week_id is not None else weeks)
+
+    elapsed = time.perf_counter() - started
+    rows = result.rowcount or 0
+    return {
+        'rows_updated': rows,
+        'users_changed': users_changed,
+        'elapsed_seconds': round(elapsed, 4),
+        'rows_per_second': round(rows / elapsed) if elapsed > 0 else rows,
+    }
@@ -0,0 +1,212 @@
+"""
+Bulk creation of a whole season's schedule.
+
+A schedule is validated once up front and then written in a single
+transaction with bulk INSERTs: one for the season, one for its match
+weeks and one for all of their fixtures.
+
+JSON schedules look like:
+
+    {"season_start_year": 2025, "season_end_year": 2026,
+     "match_weeks": [{"week_number": 1,
+                      "predictions_open_time": "2025-08-09T12:00",
+                      "predictions_close_time": "2025-08-15T18:00",
+                      "fixtures": [{"home_team": "Arsenal", "away_team": "Chelsea",
+                                    "match_datetime": "2025-08-16T15:00"}]}]}
+
+CSV schedules have one row per fixture with the columns season_start_year,
+season_end_year, week_number, predictions_open_time,
+predictions_close_time, home_team, away_team and match_datetime.
+"""
+import csv
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from .cache import invalidate_schedule
+from .models import db, Season, Week, MatchWeek, Fixture
+
+SEASON_WEEK_NUMBERS = range(1, 39)
+
+
+def ensure_weeks():
+    """Create any of weeks 1-38 that are missing; returns how many were added."""
+    existing = set(db.session.execute(select(Week.week_number)).scalars())
+    missing = [{'week_number': n} for n in SEASON_WEEK_NUMBERS if n not in existing]
+    if missing:
+        db.session.execute(insert(Week), missing)
+    return len(missing)
+
+
+def _parse_datetime(value):
+    if value in (None, '') or isinstance(value, datetime):
+        return value or None
+    if not isinstance(value, str):
+        raise ValueError(f'{value!r} is not an ISO date and time')
+    return datetime.fromisoformat(value)
+
+
+def read_schedule(path):
+    """Load a JSON or CSV schedule file into the JSON structure."""
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            return schedule_from_rows(csv.DictReader(f))
+    with open(path) as f:
+        return json.load(f)
+
+
+def schedule_from_rows(rows):
+    """Build the JSON structure from CSV rows; raises ValueError for a malformed file."""
+    try:
+        return _schedule_from_rows(rows)
+    except KeyError as e:
+        raise ValueError(f'CSV is missing the {e.args[0]} column')
+    except TypeError:
+        raise ValueError('CSV has a row with missing fields')
+
+
+def _schedule_from_rows(rows):
+    schedule = None
+    weeks = {}
+    for row in rows:
+        if schedule is None:
+            schedule = {'season_start_year': row['season_start_year'],
+                        'season_end_year': row['season_end_year'], 'match_weeks': []}
+        week_number = int(row['week_number'])
+        if week_number not in weeks:
+            weeks[week_number] = {
+                'week_number': week_number,
+                'predictions_open_time': row['predictions_open_time'],
+                'predictions_close_time': row['predictions_close_time'],
+                'fixtures': [],
+            }
+            schedule['match_weeks'].append(weeks[week_number])
+        weeks[week_number]['fixtures'].append({
+            'home_team': row['home_team'],
+            'away_team': row['away_team'],
+            'match_datetime': row.get('match_datetime'),
+        })
+    if schedule is None:
+        raise ValueError('Schedule is empty')
+    return schedule
+
+
+def validate_schedule(schedule):
+    """Return a normalized copy of the schedule or raise ValueError listing every problem."""
+    errors = []
+    try:
+        start_year = int(schedule['season_start_year'])
+        end_year = int(schedule['season_end_year'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('season_start_year and season_end_year are required')
+
+    match_weeks = []
+    seen_weeks = set()
+    weeks = schedule.get('match_weeks') or []
+    if not isinstance(weeks, list):
+        raise ValueError('match_weeks must be a list')
+    for position, week in enumerate(weeks, 1):
+        if not isinstance(week, dict):
+            errors.append(f'match week {position}: must be an object')
+            continue
+        label = f"week {week.get('week_number')}"
+        try:
+            week_number = int(week['week_number'])
+            open_time = _parse_datetime(week['predictions_open_time'])
+            close_time = _parse_datetime(week['predictions_close_time'])
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append(f'{label}: {e}')
+            continue
+        if week_number not in SEASON_WEEK_NUMBERS:
+            errors.append(f'{label}: week number must be 1-38')
+        if week_number in seen_weeks:
+            errors.append(f'{label}: listed more than once')
+        seen_weeks.add(week_number)
+        if not open_time or not close_time or open_time >= close_time:
+            errors.append(f'{label}: predictions must open before they close')
+
+        fixtures = []
+        teams = set()
+        week_fixtures = week.get('fixtures') or []
+        if not isinstance(week_fixtures, list):
+            errors.append(f'{label}: fixtures must be a list')
+            week_fixtures = []
+        for fixture in week_fixtures:
+            if not isinstance(fixture, dict):
+                errors.append(f'{label}: fixture {fixture!r} must be an object')
+                continue
+            home, away = fixture.get('home_team'), fixture.get('away_team')
+            valid = isinstance(home, str) and isinstance(away, str) and home and away and home != away
+            if not valid:
+                errors.append(f'{label}: invalid fixture {home} vs {away}')
+                continue
+            if home in teams or away in teams:
+                errors.append(f'{label}: {home} or {away} plays twice')
+            teams.update((home, away))
+            try:
+                kickoff = _parse_datetime(fixture.get('match_datetime'))
+            except ValueError as e:
+                errors.append(f'{label}: {e}')
+                continue
+            fixtures.append({'home_team': home, 'away_team': away, 'match_datetime': kickoff})
+        match_weeks.append({'week_number': week_number, 'predictions_open_time': open_time,
+                            'predictions_close_time': close_time, 'fixtures': fixtures})
+
+    if not match_weeks:
+        errors.append('Schedule has no match weeks')
+    if errors:
+        raise ValueError('; '.join(errors))
+    return {'season_start_year': start_year, 'season_end_year': end_year, 'match_weeks': match_weeks}
+
+
+def load_season(schedule, commit=True):
+    """Validate and bulk-insert a season; returns a timing report."""
+    started = time.perf_counter()
+    schedule = validate_schedule(schedule)
+    validated = time.perf_counter()
+
+    if Season.query.filter_by(season_start_year=schedule['season_start_year'],
+                              season_end_year=schedule['season_end_year']).first():
+        raise ValueError('Season already exists')
+
+    ensure_weeks()
+    week_ids = dict(db.session.execute(select(Week.week_number, Week.id)).all())
+    season_id = db.session.execute(
+        insert(Season).values(season_start_year=schedule['season_start_year'],
+                              season_end_year=schedule['season_end_year'])
+    ).inserted_primary_key[0]
+
+    now = datetime.utcnow()
+    db.session.execute(insert(MatchWeek), [
+        {'season_id': season_id, 'week_id': week_ids[week['week_number']],
+         'predictions_open_time': week['predictions_open_time'],
+         'predictions_close_time': week['predictions_close_time'],
+         'created_at': now}
+        for week in schedule['match_weeks']
+    ])
+    match_week_ids = dict(db.session.execute(
+        select(Week.week_number, MatchWeek.id)
+        .join(Week, Week.id == MatchWeek.week_id)
+        .where(MatchWeek.season_id == season_id)
+    ).all())
+
+    fixtures = [
+        {'match_week_id': match_week_ids[week['week_number']], 'created_at': now, **fixture}
+        for week in schedule['match_weeks'] for fixture in week['fixtures']
+    ]
+    if fixtures:
+        db.session.execute(insert(Fixture), fixtures)
+    if commit:
+        db.session.commit()
+        invalidate_schedule()
+
+    finished = time.perf_counter()
+    return {
+        'season_id': season_id,
+        'match_weeks': len(schedule['match_weeks']),
+        'fixtures': len(fixtures),
+        'validate_seconds': round(validated - started, 4),
+        'total_seconds': round(finished - started, 4),
+    }
@@ -0,0 +1,190 @@
+"""
+Materialized leaderboard.
+
+UserStanding holds one row per user with their running totals. Scoring
+applies only the point changes it makes, and ranks are refreshed with a
+single window-function UPDATE, so reading the leaderboard is an indexed
+range read on `position` regardless of how many predictions exist.
+"""
+from sqlalchemy import bindparam, func, insert, select, union_all, update
+
+from .bulk import insert_missing
+from .cache import LEADERBOARD_VERSION, bump_on_commit
+from .events import publish_after_commit
+from .models import db, User, Prediction, SeasonStanding, UserStanding
+
+PAGE_SIZE = 50
+# Beyond this many changed rows, clients are told to reload instead.
+DIFF_LIMIT = 500
+
+
+def apply_point_deltas(deltas):
+    """Apply per-user changes to the standings table.
+
+    `deltas` is an iterable of dicts with user_id, points, exact_scores and
+    correct_results keys holding the change (not the new total).
+    """
+    deltas = list(deltas)
+    # Every scored user gets a row, even on 0 points, so the leaderboard
+    # lists the same players as rebuild_standings. Scoring shards can run
+    # concurrently, so rows are created without a read-then-insert race.
+    created = insert_missing(UserStanding, [{'user_id': d['user_id']} for d in deltas],
+                             conflict_columns=('user_id',))
+    deltas = [d for d in deltas if d['points'] or d['exact_scores'] or d['correct_results']]
+    if not deltas and not created:
+        return 0
+
+    user_ids = [d['user_id'] for d in deltas]
+    stmt = (
+        update(UserStanding)
+        .where(UserStanding.user_id == bindparam('b_user_id'))
+        .values(
+            total_points=UserStanding.total_points + bindparam('b_points'),
+            exact_scores=UserStanding.exact_scores + bindparam('b_exact'),
+            correct_results=UserStanding.correct_results + bindparam('b_correct'),
+        )
+    )
+    if deltas:
+        db.session.connection().execute(stmt, [
+            {'b_user_id': d['user_id'], 'b_points': d['points'],
+             'b_exact': d['exact_scores'], 'b_correct': d['correct_results']}
+            for d in deltas
+        ])
+    # New rows push everyone below them down, so they need a full re-rank.
+    moved = refresh_ranks(None if created else _changed_range(deltas))
+    bump_on_commit(LEADERBOARD_VERSION)
+    publish_leaderboard_diff(None if moved is None else set(user_ids) | set(moved))
+    return len(deltas)
+
+
+def _changed_range(deltas):
+    """(low, high) covering the old and new totals of the users in `deltas`."""
+    change = {d['user_id']: d['points'] for d in deltas}
+    totals = db.session.execute(
+        select(UserStanding.user_id, UserStanding.total_points).where(UserStanding.user_id.in_(change))
+    ).all()
+    values = [total for _, total in totals] + [total - change[user_id] for user_id, total in totals]
+    return min(values), max(values)
+
+
+def refresh_ranks(points_range=None):
+    """Recompute rank (ties share a rank) and position (unique, for paging).
+
+    With `points_range` (low, high), only users whose total lies in it are
+    re-ranked. That is enough when every changed total moved within the
+    range: users above it keep their place, and so do users below it.
+
+    Returns the ids of users whose rank or position moved, or None when the
+    database cannot report them (no UPDATE ... RETURNING).
+    """
+    order = (UserStanding.total_points.desc(), UserStanding.user_id)
+    rank = func.rank().over(order_by=UserStanding.total_points.desc())
+    position = func.row_number().over(order_by=order)
+    ranked = select(UserStanding.user_id.label('user_id'), rank.label('rank'), position.label('position'))
+    if points_range is not None:
+        low, high = points_range
+        above = (select(func.count()).select_from(UserStanding)
+                 .where(UserStanding.total_points > high).scalar_subquery())
+        ranked = (select(UserStanding.user_id.label('user_id'), (above + rank).label('rank'),
+                         (above + position).label('position'))
+                  .where(UserStanding.total_points.between(low, high)))
+    ranked = ranked.subquery()
+    stmt = (
+        update(UserStanding)
+        .where(UserStanding.user_id == ranked.c.user_id)
+        .where((UserStanding.rank.is_distinct_from(ranked.c.rank))
+               | (UserStanding.position.is_distinct_from(ranked.c.position)))
+        .values(rank=ranked.c.rank, position=ranked.c.position)
+        .execution_options(synchronize_session=False)
+    )
+    if not db.session.get_bind(mapper=UserStanding).dialect.update_returning:
+        db.session.execute(stmt)
+        return None
+    return db.session.execute(stmt.returning(UserStanding.user_id)).scalars().all()
+
+
+def publish_leaderboard_diff(user_ids):
+    """Queue a leaderboard event with the current rows of the given users."""
+    if user_ids is not None and len(user_ids) > DIFF_LIMIT:
+        user_ids = None
+    if user_ids is None:
+        publish_after_commit('leaderboard', {'reload': True})
+        return
+    rows = db.session.execute(
+        select(UserStanding.user_id, UserStanding.rank, UserStanding.total_points,
+               UserStanding.exact_scores, UserStanding.correct_results)
+        .where(UserStanding.user_id.in_(user_ids))
+    ).all()
+    publish_after_commit('leaderboard', {'rows': [row._asdict() for row in rows]})
+
+
+def rebuild_standings(commit=True):
+    """Recompute every standing and the weekly history from the prediction table (repair path).
+
+    Archived seasons are counted from their frozen SeasonStanding rows.
+    """
+    from .archive import archived_season_ids
+    from .scoring import EXACT_SCORE_POINTS, CORRECT_RESULT_POINTS
+    from .user_stats import rebuild_user_stats
+    points = func.coalesce(Prediction.points_earned, 0)
+    live = select(
+        Prediction.user_id.label('user_id'),
+        points.label('points'),
+        (points == EXACT_SCORE_POINTS).cast(db.Integer).label('exact_scores'),
+        (points >= CORRECT_RESULT_POINTS).cast(db.Integer).label('correct_results'),
+    )
+    # Archived seasons no longer have live predictions; their frozen totals count instead.
+    # A season frozen by an archive run that stopped before deleting its live
+    # rows has no archived_at yet, so only the live rows count for it.
+    archived = (
+        select(SeasonStanding.user_id, SeasonStanding.points, SeasonStanding.exact_scores,
+               SeasonStanding.correct_results)
+        .where(SeasonStanding.season_id.in_(archived_season_ids()))
+    )
+    rows = union_all(live, archived).subquery()
+    totals = (
+        select(rows.c.user_id, func.sum(rows.c.points), func.sum(rows.c.exact_scores),
+               func.sum(rows.c.correct_results))
+        .group_by(rows.c.user_id)
+    )
+    db.session.execute(UserStanding.__table__.delete())
+    db.session.execute(
+        insert(UserStanding).from_select(
+            ['user_id', 'total_points', 'exact_scores', 'correct_results'], totals
+        )
+    )
+    refresh_ranks()
+    rebuild_user_stats(commit=False)
+    bump_on_commit(LEADERBOARD_VERSION)
+    publish_after_commit('leaderboard', {'reload': True})
+    if commit:
+        db.session.commit()
+
+
+def standings_page(page=1, page_size=PAGE_SIZE):
+    """Rows for one leaderboard page, read by position range."""
+    first = (page - 1) * page_size + 1
+    return db.session.execute(
+        select(
+            UserStanding.rank, UserStanding.user_id, User.name,
+            UserStanding.total_points, UserStanding.exact_scores, UserStanding.correct_results,
+        )
+        .join(User, User.id == UserStanding.user_id)
+        .where(UserStanding.position.between(first, first + page_size - 1))
+        .order_by(UserStanding.position)
+    ).all()
+
+
+def page_count(page_size=PAGE_SIZE):
+    last = db.session.execute(select(func.max(UserStanding.position))).scalar() or 0
+    return max(1, -(-last // page_size))
+
+
+def page_for_user(user_id, page_size=PAGE_SIZE):
+    """Leaderboard page a user appears on, or None if they have no standing."""
+    position = db.session.execute(
+        select(UserStanding.position).where(UserStanding.user_id == user_id)
+    ).scalar()
+    if position is None:
+        return None
+    return (position - 1) // page_size + 1
@@ -0,0 +1,50 @@
+// Live updates from /events (Server-Sent Events). When the browser has no
+// EventSource, or the server turns the stream away because its stream slots
+// are taken (see events.py), the page polls /events/poll instead. The poll
+// answers at once, so the page asks again every POLL_INTERVAL_MS.
+const POLL_INTERVAL_MS = 5000;
+
+function subscribeToEvents(streamUrl, pollUrl, handlers) {
+    let lastId = null;
+
+    function dispatch(kind, data) {
+        if (handlers[kind]) {
+            handlers[kind](data);
+        }
+    }
+
+    function poll() {
+        const url = lastId === null ? pollUrl : `${pollUrl}?last_id=${lastId}`;
+        fetch(url, {credentials: 'same-origin'})
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(body => {
+                lastId = body.last_id;
+                body.events.forEach(event => dispatch(event.event, event.data));
+                setTimeout(poll, POLL_INTERVAL_MS);
+            })
+            .catch(() => setTimeout(poll, POLL_INTERVAL_MS));
+    }
+
+    if (typeof EventSource === 'undefined') {
+        poll();
+        return;
+    }
+    const source = new EventSource(streamUrl);
+    Object.keys(handlers).forEach(kind => {
+        source.addEventListener(kind, function(e) {
+            lastId = Number(e.lastEventId);
+            dispatch(kind, JSON.parse(e.data));
+        });
+    });
+    source.addEventListener('error', function() {
+        // A 503 closes the stream for good; carry on by polling.
+        if (source.readyState === EventSource.CLOSED) {
+            poll();
+        }
+    });
+}
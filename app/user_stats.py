@@ -0,0 +1,155 @@
+"""
+Per-user prediction history.
+
+UserWeekStats holds one row per user and match week with the points,
+exact scores and correct results earned that week. Scoring applies its
+changes to the rollup in the same pass that updates the standings, so a
+user's history is a single indexed read of at most 38 rows per season;
+cumulative points, rates and streaks are derived from those rows.
+"""
+from sqlalchemy import bindparam, func, insert, select, update
+
+from .bulk import insert_missing
+from .models import db, Season, Week, MatchWeek, Fixture, Prediction, UserWeekStats
+
+
+def apply_week_deltas(deltas):
+    """Apply per-user, per-match-week changes to the rollup.
+
+    `deltas` is an iterable of dicts with user_id, match_week_id, scored,
+    points, exact_scores and correct_results keys holding the change.
+    """
+    deltas = [d for d in deltas
+              if d['scored'] or d['points'] or d['exact_scores'] or d['correct_results']]
+    if not deltas:
+        return 0
+
+    match_weeks = {
+        row.id: row for row in db.session.execute(
+            select(MatchWeek.id, MatchWeek.season_id, Week.week_number)
+            .join(Week, Week.id == MatchWeek.week_id)
+            .where(MatchWeek.id.in_({d['match_week_id'] for d in deltas}))
+        )
+    }
+    keys = {(d['user_id'], d['match_week_id']) for d in deltas}
+    insert_missing(UserWeekStats, [
+        {'user_id': user_id, 'match_week_id': mw_id,
+         'season_id': match_weeks[mw_id].season_id,
+         'week_number': match_weeks[mw_id].week_number}
+        for user_id, mw_id in keys
+    ], conflict_columns=('user_id', 'match_week_id'))
+
+    stmt = (
+        update(UserWeekStats)
+        .where(UserWeekStats.user_id == bindparam('b_user_id'),
+               UserWeekStats.match_week_id == bindparam('b_match_week_id'))
+        .values(
+            predictions_scored=UserWeekStats.predictions_scored + bindparam('b_scored'),
+            points=UserWeekStats.points + bindparam('b_points'),
+            exact_scores=UserWeekStats.exact_scores + bindparam('b_exact'),
+            correct_results=UserWeekStats.correct_results + bindparam('b_correct'),
+        )
+    )
+    db.session.connection().execute(stmt, [
+        {'b_user_id': d['user_id'], 'b_match_week_id': d['match_week_id'],
+         'b_scored': d['scored'], 'b_points': d['points'],
+         'b_exact': d['exact_scores'], 'b_correct': d['correct_results']}
+        for d in deltas
+    ])
+    return len(deltas)
+
+
+def rebuild_user_stats(commit=True):
+    """Recompute the whole rollup from the prediction table (repair path)."""
+    from .scoring import EXACT_SCORE_POINTS, CORRECT_RESULT_POINTS
+    points = Prediction.points_earned
+    totals = (
+        select(
+            Prediction.user_id,
+            Fixture.match_week_id,
+            MatchWeek.season_id,
+            Week.week_number,
+            func.count(),
+            func.sum(points),
+            func.sum((points == EXACT_SCORE_POINTS).cast(db.Integer)),
+            func.sum((points >= CORRECT_RESULT_POINTS).cast(db.Integer)),
+        )
+        .join(Fixture, Fixture.id == Prediction.fixture_id)
+        .join(MatchWeek, MatchWeek.id == Fixture.match_week_id)
+        .join(Week, Week.id == MatchWeek.week_id)
+        # Points on a fixture without a score are left over from before
+        # points_earned was nullable (see clear_unscored_points), not scores.
+        .where(points.isnot(None), Fixture.home_score.isnot(None), Fixture.away_score.isnot(None))
+        .group_by(Prediction.user_id, Fixture.match_week_id, MatchWeek.season_id, Week.week_number)
+    )
+    # Archived seasons' predictions are gone from the live table; keep their rows.
+    from .archive import archived_season_ids
+    db.session.execute(UserWeekStats.__table__.delete().where(
+        UserWeekStats.season_id.notin_(archived_season_ids())))
+    db.session.execute(
+        insert(UserWeekStats).from_select(
+            ['user_id', 'match_week_id', 'season_id', 'week_number', 'predictions_scored',
+             'points', 'exact_scores', 'correct_results'], totals
+        )
+    )
+    if commit:
+        db.session.commit()
+
+
+def _streaks(weeks):
+    """Current and longest run of consecutive scored weeks with points."""
+    current = longest = 0
+    for week in weeks:
+        current = current + 1 if week['points'] > 0 else 0
+        longest = max(longest, current)
+    return current, longest
+
+
+def _rate(count, total):
+    return round(count / total, 4) if total else None
+
+
+def user_stats(user_id, season_id=None):
+    """Per-season history for a user, newest season first."""
+    criteria = [UserWeekStats.user_id == user_id]
+    if season_id is not None:
+        criteria.append(UserWeekStats.season_id == season_id)
+    rows = db.session.execute(
+        select(UserWeekStats.season_id, Season.season_start_year, Season.season_end_year,
+               UserWeekStats.week_number, UserWeekStats.predictions_scored,
+               UserWeekStats.points, UserWeekStats.exact_scores, UserWeekStats.correct_results)
+        .join(Season, Season.id == UserWeekStats.season_id)
+        .where(*criteria)
+        .order_by(UserWeekStats.season_id.desc(), UserWeekStats.week_number)
+    ).all()
+
+    seasons = []
+    for row in rows:
+        if not seasons or seasons[-1]['season_id'] != row.season_id:
+            seasons.append({'season_id': row.season_id,
+                            'season': f'{row.season_start_year}-{row.season_end_year}',
+                            'weeks': []})
+        weeks = seasons[-1]['weeks']
+        cumulative = (weeks[-1]['cumulative_points'] if weeks else 0) + row.points
+        weeks.append({'week_number': row.week_number, 'predictions': row.predictions_scored,
+                      'points': row.points, 'cumulative_points': cumulative,
+                      'exact_scores': row.exact_scores, 'correct_results': row.correct_results})
+
+    for season in seasons:
+        weeks = season['weeks']
+        predictions = sum(w['predictions'] for w in weeks)
+        exact = sum(w['exact_scores'] for w in weeks)
+        correct = sum(w['correct_results'] for w in weeks)
+        current, longest = _streaks(weeks)
+        season.update({
+            'total_points': weeks[-1]['cumulative_points'],
+            'predictions': predictions,
+            'exact_scores': exact,
+            'correct_results': correct,
+            'exact_score_rate': _rate(exact, predictions),
+            'result_accuracy': _rate(correct, predictions),
+            'best_week': max(weeks, key=lambda w: w['points'])['week_number'],
+            'current_streak': current,
+            'longest_streak': longest,
+        })
+    return seasons
@@ -0,0 +1,290 @@
+"""
+Write-behind buffer for prediction submissions.
+
+Near a deadline users resubmit the same fixtures many times, and on SQLite
+every commit waits for the single write lock. With PREDICTION_BUFFER=1 a
+validated submission is appended to a local log, fsynced, merged into an
+in-memory map keyed by (user_id, fixture_id) where the last write wins,
+and acknowledged. A flusher thread writes the map with one batched upsert
+every PREDICTION_BUFFER_FLUSH_MS, and straight away when a match week with
+pending entries reaches its predictions_close_time.
+
+Durability comes from the log, not the map. Each process writes numbered
+segment files under PREDICTION_BUFFER_DIR and holds an flock on its own
+owner file. A flush starts a new segment and deletes the older ones only
+after the upsert commits. At startup any segments whose owner lock can be
+taken belong to a process that died; they are replayed in order and
+removed. Each entry keeps the time it was submitted as its updated_at, and
+the upsert never overwrites a prediction with a later updated_at. So a
+segment replayed after a crash between commit and delete, or flushed after
+a newer submission reached the table, cannot undo that newer prediction.
+
+Until an entry is flushed the table does not have it, so the predict page
+overlays the user's pending entries (`pending_for`) and skips its ETag for
+them. This covers the process that took the submission; the submit route
+keeps the user on the primary so the flushed rows are read from there.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _segment_number(path):
+    return int(path.rsplit('-', 1)[1].split('.')[0])
+
+
+class PredictionBuffer:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.directory = None
+        self.flush_seconds = 0.25
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._flushing = {}
+        self._closes = {}
+        self._owner = None
+        self._token = None
+        self._segment = None
+        self._segment_number = 0
+        self._unflushed_from = 1
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PREDICTION_BUFFER', False)
+        self.directory = app.config.get('PREDICTION_BUFFER_DIR') or os.path.join(
+            tempfile.gettempdir(), 'epl-predictions-buffer')
+        self.flush_seconds = app.config.get('PREDICTION_BUFFER_FLUSH_MS', 250) / 1000
+        app.extensions['prediction_buffer'] = self
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.close)
+
+    # Writing
+
+    def add(self, user_id, match_week, predictions):
+        """Durably accept {fixture_id: (home, away)} for a user; returns the count."""
+        now = datetime.utcnow()
+        lines = ''.join(
+            json.dumps({'user_id': user_id, 'fixture_id': fixture_id, 'match_week_id': match_week.id,
+                        'home': home, 'away': away, 'at': now.isoformat()}) + '\n'
+            for fixture_id, (home, away) in predictions.items()
+        )
+        with self._lock:
+            self._start()
+            self._segment.write(lines)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            for fixture_id, (home, away) in predictions.items():
+                self._pending[(user_id, fixture_id)] = (match_week.id, home, away, now)
+            self._closes[match_week.id] = match_week.predictions_close_time
+        self._wake.set()
+        return len(predictions)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def pending_for(self, user_id, fixture_ids):
+        """{fixture_id: (home, away)} the user submitted that is not in the table yet."""
+        if not self.enabled:
+            return {}
+        found = {}
+        with self._lock:
+            if self._pid != os.getpid():
+                return found
+            for fixture_id in fixture_ids:
+                entry = self._pending.get((user_id, fixture_id)) or self._flushing.get((user_id, fixture_id))
+                if entry is not None:
+                    found[fixture_id] = (entry[1], entry[2])
+        return found
+
+    def _start(self):
+        # Called under self._lock. Threads and file handles do not survive
+        # a fork, so each worker process opens its own on first use.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._token = uuid.uuid4().hex
+        # Locked before it is renamed into place, so replay never sees it unlocked.
+        path = os.path.join(self.directory, f'{self._token}.lock')
+        self._owner = open(path + '.new', 'w')
+        fcntl.flock(self._owner, fcntl.LOCK_EX)
+        os.rename(path + '.new', path)
+        self._segment_number = 0
+        self._unflushed_from = 1
+        self._pending, self._flushing, self._closes = {}, {}, {}
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f'{self._token}-{number:08d}.log')
+
+    def _open_segment(self):
+        self._segment_number += 1
+        self._segment = open(self._segment_path(self._segment_number), 'a')
+
+    # Flushing
+
+    def _next_wait(self):
+        with self._lock:
+            if not self._pending:
+                return None
+            closes = list(self._closes.values())
+        now = datetime.utcnow()
+        until_close = min(((close - now).total_seconds() for close in closes), default=self.flush_seconds)
+        return max(0.0, min(self.flush_seconds, until_close))
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            wait = self._next_wait()
+            if wait is None:
+                continue
+            time.sleep(wait)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('prediction buffer flush failed; retrying')
+                time.sleep(self.flush_seconds)
+            self._wake.set()
+
+    def flush(self):
+        """Write everything pending to the database; returns the rows written."""
+        if self._pid != os.getpid():
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending, self._closes = self._pending, {}, {}
+                # Still visible to pending_for until the upsert commits.
+                self._flushing = pending
+                flushed_through = self._segment_number
+                self._segment.close()
+                self._open_segment()
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        write_predictions(pending)
+                else:
+                    write_predictions(pending)
+            except Exception:
+                with self._lock:
+                    # Anything submitted since takes precedence.
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                    self._flushing = {}
+                raise
+            with self._lock:
+                self._flushing = {}
+            for number in range(self._unflushed_from, flushed_through + 1):
+                os.remove(self._segment_path(number))
+            self._unflushed_from = flushed_through + 1
+            return len(pending)
+
+    def close(self):
+        """Flush on shutdown and remove this process's log if nothing is left."""
+        if self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('could not flush buffered predictions; they will be replayed')
+            return
+        with self._lock:
+            if self._pending:
+                return
+            self._segment.close()
+            os.remove(self._segment_path(self._segment_number))
+            os.remove(os.path.join(self.directory, f'{self._token}.lock'))
+            self._owner.close()
+            self._pid = None
+
+    def replay(self):
+        """Apply the logs of processes that exited without flushing them."""
+        if not self.enabled:
+            return 0
+        replayed = 0
+        for lock_path in glob.glob(os.path.join(self.directory, '*.lock')):
+            token = os.path.basename(lock_path)[:-len('.lock')]
+            if token == self._token:
+                continue
+            with open(lock_path, 'a') as owner:
+                try:
+                    fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # its process is still running
+                segments = sorted(glob.glob(os.path.join(self.directory, f'{token}-*.log')),
+                                  key=_segment_number)
+                pending = {}
+                for path in segments:
+                    with open(path) as f:
+                        for line in f:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                break  # torn final write; it was never acknowledged
+                            pending[(entry['user_id'], entry['fixture_id'])] = (
+                                entry['match_week_id'], entry['home'], entry['away'],
+                                datetime.fromisoformat(entry['at']))
+                if pending:
+                    write_predictions(pending)
+                    logger.warning('replayed %d buffered predictions from %s', len(pending), token)
+                for path in segments:
+                    os.remove(path)
+                os.remove(lock_path)
+                replayed += len(pending)
+        return replayed
+
+
+def write_predictions(pending):
+    """Upsert {(user_id, fixture_id): (match_week_id, home, away, at)} in batches."""
+    from .bulk import BATCH_ROWS
+    from .cache import bump_on_commit, predictions_version
+    from .models import db
+    from .predictions import upsert_prediction_rows
+    rows = [
+        {'user_id': user_id, 'fixture_id': fixture_id, 'home_score_prediction': home,
+         'away_score_prediction': away, 'created_at': at, 'updated_at': at}
+        for (user_id, fixture_id), (_, home, away, at) in pending.items()
+    ]
+    try:
+        for start in range(0, len(rows), BATCH_ROWS):
+            upsert_prediction_rows(rows[start:start + BATCH_ROWS])
+        bump_on_commit(*{predictions_version(user_id, match_week_id)
+                         for (user_id, _), (match_week_id, _, _, _) in pending.items()})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+prediction_buffer = PredictionBuffer()
+
+
+def init_app(app):
+    prediction_buffer.init_app(app)
+    if prediction_buffer.enabled:
+        with app.app_context():
+            try:
+                prediction_buffer.replay()
+            except Exception:
+                # Tables may not exist yet (first run, migrations pending).
+                logger.exception('could not replay buffered predictions')
@@ -0,0 +1,107 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    settings = {
+        'SQLITE_DB_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'ARCHIVE_DB_URI': f"sqlite:///{tmp_path / 'archive.db'}",
+        'LOG_LEVEL': 'WARNING',
+        'CACHE_BACKEND': 'memory',
+        'EVENTS_BACKEND': 'memory',
+        'JOBS_WORKER': 'none',
+        'MATCH_WEEK_SCHEDULER': '0',
+        'PREDICTION_BUFFER': '0',
+        'PREDICTION_BUFFER_DIR': str(tmp_path / 'buffer'),
+        'SECRET_KEY': 'test',
+    }
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+    for name in ('REPLICA_DB_URI', 'ADMIN_EMAILS', 'PROFILE_SAMPLE_RATE', 'PROFILE_HEADER'):
+        monkeypatch.delenv(name, raising=False)
+    from app import create_app, db
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def db(app):
+    from app import db
+    return db
+
+
+@pytest.fixture
+def make_league(db):
+    """Create a season with one match week; returns a namespace of its rows."""
+    from types import SimpleNamespace
+    from app.models import Season, Week, MatchWeek, Fixture, Prediction, User
+
+    def make(fixtures=3, users=3, completed=False, open_window=True, predict=(1, 0), start_year=2025):
+        now = datetime.utcnow()
+        season = Season(season_start_year=start_year, season_end_year=start_year + 1)
+        week = Week.query.filter_by(week_number=1).first() or Week(week_number=1)
+        db.session.add_all([season, week])
+        db.session.flush()
+        opens = now - timedelta(days=1)
+        closes = now + timedelta(days=1) if open_window else now - timedelta(hours=1)
+        match_week = MatchWeek(season_id=season.id, week_id=week.id, is_active=True,
+                               predictions_open_time=opens, predictions_close_time=closes)
+        db.session.add(match_week)
+        db.session.flush()
+        fixture_rows = [
+            Fixture(match_week_id=match_week.id, home_team=f'Home {i}', away_team=f'Away {i}',
+                    match_datetime=now, home_score=1 if completed else None,
+                    away_score=0 if completed else None, is_completed=completed)
+            for i in range(fixtures)
+        ]
+        db.session.add_all(fixture_rows)
+        existing = User.query.count()
+        user_rows = [User(email=f'user{existing + i}@example.com', name=f'User {existing + i}',
+                          google_id=f'g{existing + i}') for i in range(users)]
+        db.session.add_all(user_rows)
+        db.session.flush()
+        if predict is not None:
+            for user in user_rows:
+                for fixture in fixture_rows:
+                    db.session.add(Prediction(user_id=user.id, fixture_id=fixture.id,
+                                              home_score_prediction=predict[0],
+                                              away_score_prediction=predict[1]))
+        db.session.commit()
+        return SimpleNamespace(
+            season_id=season.id, match_week_id=match_week.id,
+            fixture_ids=[f.id for f in fixture_rows], user_ids=[u.id for u in user_rows],
+        )
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """A test client signed in as the given user id."""
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return client_for
+
+
+@pytest.fixture
+def admin(db):
+    from app.models import User
+    user = User(email='admin@example.com', name='Admin', google_id='admin', is_admin=True)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
@@ -0,0 +1,31 @@
+import re
+
+from flask import url_for
+
+from app import admin_views
+from app.admin import URLS
+
+
+def test_every_admin_rule_resolves_to_its_view(app):
+    adapter = app.url_map.bind('localhost')
+    for rule, endpoint, methods in URLS:
+        path = '/admin' + re.sub(r'<int:\w+>', '1', rule)
+        for method in methods:
+            name, _ = adapter.match(path, method=method)
+            assert name == f'admin.{endpoint}'
+            assert app.view_functions[name] is getattr(admin_views, endpoint)
+    with app.test_request_context():
+        assert url_for('admin.job_detail', job_id=3) == '/admin/jobs/3'
+
+
+def test_admin_pages_render(db, admin, login):
+    client = login(admin)
+    for path in ('/admin', '/admin/create_match_week', '/admin/create_season', '/admin/jobs',
+                 '/admin/cache_stats'):
+        assert client.get(path).status_code == 200, path
+
+
+def test_admin_pages_need_an_admin(make_league, login):
+    client = login(make_league().user_ids[0])
+    assert client.get('/admin').status_code == 302
+    assert client.get('/admin/cache_stats').status_code == 403
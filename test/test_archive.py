@@ -0,0 +1,64 @@
+from sqlalchemy import text
+
+from app.models import Fixture, Prediction, UserStanding
+
+
+def _finished_season(make_league, **kwargs):
+    from app.scoring import score_fixtures
+    league = make_league(completed=True, open_window=False, **kwargs)
+    score_fixtures()
+    return league
+
+
+def _totals():
+    return dict(UserStanding.query.with_entities(UserStanding.user_id, UserStanding.total_points))
+
+
+def test_archive_moves_the_season_and_keeps_the_totals(db, make_league, login):
+    from app.archive import archive_season
+    league = _finished_season(make_league, fixtures=2, users=2)
+    before = _totals()
+    report = archive_season(league.season_id)
+    assert (report['fixtures'], report['predictions']) == (2, 4)
+    assert Fixture.query.count() == 0 and Prediction.query.count() == 0
+
+    from app.standings import rebuild_standings
+    rebuild_standings()
+    assert _totals() == before
+
+    client = login(league.user_ids[0])
+    standings = client.get(f'/api/seasons/{league.season_id}/standings').get_json()['standings']
+    assert [row['points'] for row in standings] == [6, 6]
+    predictions = client.get(f'/api/me/predictions?season_id={league.season_id}').get_json()['predictions']
+    assert len(predictions) == 2
+
+
+def test_rebuild_ignores_standings_frozen_by_an_unfinished_archive(db, make_league):
+    from app.archive import freeze_standings
+    from app.standings import rebuild_standings
+    league = _finished_season(make_league, fixtures=2, users=2)
+    before = _totals()
+    # An archive run that stopped after freezing, before removing the live rows.
+    freeze_standings(league.season_id)
+    db.session.commit()
+    rebuild_standings()
+    assert _totals() == before
+
+
+def test_archive_refuses_an_open_season(make_league):
+    import pytest
+    from app.archive import archive_season
+    league = make_league()
+    with pytest.raises(ValueError):
+        archive_season(league.season_id)
+
+
+def test_upgrade_schema_adds_missing_columns_and_indexes(db):
+    from app.database import upgrade_schema
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP INDEX ix_user_standing_total_points'))
+        connection.execute(text('ALTER TABLE season DROP COLUMN archived_at'))
+    changes = upgrade_schema(db)
+    assert 'added season.archived_at' in changes
+    assert 'created index ix_user_standing_total_points' in changes
+    assert upgrade_schema(db) == []
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import User
+
+
+@pytest.fixture
+def sign_in(app, monkeypatch):
+    """Complete a Google sign-in as the given address; returns the client."""
+    def sign_in(email, sub=None, client=None):
+        info = {'sub': sub or email, 'email': email, 'name': email.split('@')[0]}
+        monkeypatch.setattr('app.routes.google_client', lambda: SimpleNamespace(
+            authorize_access_token=lambda: {'userinfo': info}))
+        client = client or app.test_client()
+        client.get('/authorize/google/callback')
+        return client
+    return sign_in
+
+
+def _is_admin(email):
+    return User.query.filter(User.email == email).one().is_admin
+
+
+def test_admin_emails_must_match_exactly(app, db, sign_in):
+    app.config['ADMIN_EMAILS'] = frozenset({'admin@example.com'})
+    sign_in('min@example.com')
+    sign_in('Admin@Example.com')
+    assert not _is_admin('min@example.com')
+    assert _is_admin('Admin@Example.com')
+
+
+def test_admin_emails_parsed_from_the_environment(monkeypatch, app):
+    from app import create_app
+    monkeypatch.setenv('ADMIN_EMAILS', ' One@example.com, two@example.com ,,')
+    assert create_app().config['ADMIN_EMAILS'] == {'one@example.com', 'two@example.com'}
+
+
+def test_removed_admin_is_demoted_on_next_sign_in(app, db, sign_in):
+    app.config['ADMIN_EMAILS'] = frozenset({'boss@example.com'})
+    client = sign_in('boss@example.com')
+    assert client.get('/admin').status_code == 200
+    app.config['ADMIN_EMAILS'] = frozenset({'someone.else@example.com'})
+    sign_in('boss@example.com', client=client)
+    db.session.expire_all()
+    assert not _is_admin('boss@example.com')
+    assert client.get('/admin').status_code == 302
+
+
+def test_without_admin_emails_admin_flags_are_left_alone(app, db, admin, sign_in):
+    sign_in('admin@example.com', sub='admin')
+    db.session.expire_all()
+    assert _is_admin('admin@example.com')
@@ -0,0 +1,11 @@
+import pytest
+
+from app.benchmark import main
+
+
+@pytest.mark.parametrize('fixtures', ['0', '11', 'ten'])
+def test_fixtures_beyond_the_team_count_are_rejected(fixtures, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['workload', '--fixtures', fixtures])
+    assert exit_info.value.code == 2
+    assert '--fixtures' in capsys.readouterr().err
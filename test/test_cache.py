@@ -0,0 +1,65 @@
+import sys
+import threading
+
+from app.cache import Cache, FileSystemBackend, MemoryBackend, MISSING
+
+
+def test_memory_backend_keeps_counters_out_of_the_lru():
+    backend = MemoryBackend(max_entries=2)
+    backend.incr('generation:schedule')
+    backend.incr('generation:schedule')
+    for i in range(10):
+        backend.set(f'entry:{i}', i, None)
+    assert backend.get('generation:schedule') == 2
+    assert backend.get('entry:0') is MISSING
+    assert backend.get('entry:9') == 9
+
+
+def test_filesystem_backend_prunes_entries_but_not_counters(tmp_path):
+    backend = FileSystemBackend(str(tmp_path), max_entries=4)
+    backend.PRUNE_EVERY = 1
+    assert backend.incr('generation:schedule') == 1
+    assert backend.incr('generation:schedule') == 2
+    for i in range(10):
+        backend.set(f'entry:{i}', i, None)
+    assert backend.get('generation:schedule') == 2
+    assert sum(1 for path in tmp_path.iterdir() if path.is_file()) == 4
+
+
+def test_filesystem_backend_prunes_in_batches(tmp_path, monkeypatch):
+    backend = FileSystemBackend(str(tmp_path), max_entries=4)
+    calls = []
+    monkeypatch.setattr(backend, '_prune', lambda: calls.append(1))
+    for i in range(backend.PRUNE_EVERY * 2):
+        backend.set(f'entry:{i}', i, None)
+    assert len(calls) == 2
+
+
+def test_filesystem_backend_clear_removes_counters(tmp_path):
+    backend = FileSystemBackend(str(tmp_path))
+    backend.incr('generation:schedule')
+    backend.set('entry', 1, None)
+    backend.clear()
+    assert backend.get('generation:schedule') is MISSING
+    assert backend.get('entry') is MISSING
+
+
+def test_hit_and_miss_counts_survive_concurrent_requests():
+    cache = Cache()
+
+    def lookups():
+        for n in range(2000):
+            cache.get_or_set('ns', n % 10, lambda: n)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 8 * 2000
+    assert stats['misses'] >= 10
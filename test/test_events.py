@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from app.events import Broker, FileTransport, broker
+
+
+def _wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def streams(app, monkeypatch):
+    monkeypatch.setattr('app.routes.ensure_window_watcher', lambda app: None)
+    app.config['EVENTS_MAX_STREAMS'] = 1
+    broker.init_app(app)
+    yield
+    app.config['EVENTS_MAX_STREAMS'] = 4
+    broker.init_app(app)
+
+
+def test_stream_sends_events_published_after_it_opened(streams, make_league, login):
+    client = login(make_league().user_ids[0])
+    response = client.get('/events')
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n\n'
+    broker.deliver('leaderboard', {'reload': True})
+    assert next(chunks).decode().startswith(f'id: {broker.last_id}\nevent: leaderboard\ndata: {{"reload": true}}')
+    response.close()
+
+
+def test_streams_beyond_the_limit_are_sent_to_polling(streams, make_league, login):
+    client = login(make_league().user_ids[0])
+    first = client.get('/events')
+    second = client.get('/events')
+    assert second.status_code == 503
+    assert '/events/poll' in second.get_data(as_text=True)
+    first.close()
+    third = client.get('/events')
+    assert third.status_code == 200
+    third.close()
+
+
+def test_poll_returns_events_after_last_id(streams, make_league, login):
+    client = login(make_league().user_ids[0])
+    last_id = broker.last_id
+    broker.deliver('fixture', {'fixture_id': 1})
+    body = client.get(f'/events/poll?last_id={last_id}').get_json()
+    assert body['last_id'] == last_id + 1
+    assert body['events'] == [{'id': last_id + 1, 'event': 'fixture', 'data': {'fixture_id': 1}}]
+
+
+def test_poll_answers_at_once_when_nothing_is_new(streams, make_league, login):
+    client = login(make_league().user_ids[0])
+    started = time.monotonic()
+    body = client.get(f'/events/poll?last_id={broker.last_id}').get_json()
+    assert time.monotonic() - started < 1
+    assert body == {'last_id': broker.last_id, 'events': []}
+
+
+def test_file_transport_ids_are_shared_between_processes(tmp_path):
+    first, second = Broker(), Broker()
+    FileTransport(first, str(tmp_path)).send('fixture', {'n': 1})
+    sender = FileTransport(second, str(tmp_path))
+    assert second.last_id == 1  # a new process starts from the shared sequence
+    time.sleep(0.2)
+    sender.send('fixture', {'n': 2})
+    _wait_for(lambda: first.last_id == 2 and second.last_id == 2)
+    assert first.since(1) == second.since(1) == [(2, 'fixture', {'n': 2})]
+
+
+def test_keyed_events_are_sent_once(tmp_path):
+    local = Broker()
+    transports = [FileTransport(local, str(tmp_path)), FileTransport(Broker(), str(tmp_path))]
+    time.sleep(0.2)
+    for transport in transports:
+        transport.send('window', {'match_week_id': 1, 'state': 'open'}, key='window:1:open')
+    transports[0].send('fixture', {'fixture_id': 2})
+    _wait_for(lambda: local.last_id == 2)
+    assert [kind for _, kind, _ in local.since(0)] == ['window', 'fixture']
+
+
+def test_file_transport_skips_malformed_lines(tmp_path):
+    local = Broker()
+    transport = FileTransport(local, str(tmp_path), max_bytes=1 << 20)
+    time.sleep(0.2)  # let the tail thread reach the end of the log
+    with open(transport.path, 'a') as f:
+        f.write('not json\n{"kind": "missing data"}\n{"kind": "fixture", "data": {}}\n')
+    transport.send('fixture', {'fixture_id': 7})
+    _wait_for(lambda: local.last_id == 1)
+    assert local.since(0) == [(1, 'fixture', {'fixture_id': 7})]
+
+
+def test_file_transport_rotates_without_losing_events(tmp_path):
+    local = Broker()
+    transport = FileTransport(local, str(tmp_path), max_bytes=300)
+    time.sleep(0.2)
+    for n in range(40):
+        transport.send('fixture', {'n': n})
+        time.sleep(0.03)  # a tailer may miss a log rotated twice between its polls
+    _wait_for(lambda: local.last_id == 40)
+    assert [data['n'] for _, _, data in local.since(0)] == list(range(40))
+    assert (tmp_path / 'events.jsonl.1').exists()
+    assert (tmp_path / 'events.jsonl').stat().st_size < 300 + 100
@@ -0,0 +1,87 @@
+import csv
+import io
+import sys
+
+import pytest
+
+from app import exports
+from app.scoring import score_fixtures
+
+
+def _rows(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _key(row):
+    return row['prediction_id']
+
+
+def test_predictions_csv_streams_in_batches(db, make_league, admin, login):
+    league = make_league(fixtures=2, users=3, completed=True)
+    score_fixtures()
+    response = login(admin).get(f'/admin/export/predictions.csv?season_id={league.season_id}')
+    assert response.status_code == 200 and response.is_streamed
+    assert response.headers['Content-Disposition'] == \
+        f'attachment; filename=predictions_season_{league.season_id}.csv'
+    rows = _rows(response.get_data(as_text=True))
+    assert len(rows) == 6
+    assert len({row['user_name'] for row in rows}) == 3
+    assert {(row['home_score'], row['points_earned']) for row in rows} == {('1', '3')}
+
+    chunks = list(exports.predictions_csv(league.season_id, batch_rows=2))
+    assert len(chunks) == 3 + 1  # one per batch, the first with the header, then the tail
+    assert _rows(''.join(chunks)) == rows
+
+
+def test_archived_season_exports_the_same_rows(db, make_league):
+    from app.archive import archive_season
+    league = make_league(fixtures=2, users=2, completed=True, open_window=False)
+    other = make_league(fixtures=1, users=1, start_year=2026)
+    score_fixtures()
+    before = sorted(_rows(''.join(exports.predictions_csv(league.season_id))), key=_key)
+    archive_season(league.season_id)
+    after = sorted(_rows(''.join(exports.predictions_csv(league.season_id, batch_rows=3))), key=_key)
+    assert after == before
+    everything = _rows(''.join(exports.predictions_csv()))
+    assert [row['season_id'] for row in everything] == [str(league.season_id)] * 4 + [str(other.season_id)]
+
+
+def test_standings_csv(db, make_league, admin, login):
+    make_league(fixtures=1, users=2, completed=True)
+    score_fixtures()
+    rows = _rows(login(admin).get('/admin/export/standings.csv').get_data(as_text=True))
+    assert [(row['position'], row['rank'], row['total_points']) for row in rows] == [
+        ('1', '1', '3'), ('2', '1', '3')]
+
+
+def test_exports_are_for_admins(make_league, login):
+    client = login(make_league().user_ids[0])
+    assert client.get('/admin/export/predictions.csv').status_code == 403
+    assert client.get('/admin/export/standings.csv').status_code == 403
+
+
+def test_parquet_export(app, db, make_league, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    league = make_league(fixtures=2, users=2, completed=True)
+    score_fixtures()
+    written = exports.export_parquet(str(tmp_path), batch_rows=3)
+    path = str(tmp_path / 'predictions_2025_2026.parquet')
+    assert written == {path: 4}
+    table = pq.read_table(path)
+    assert table.column_names == [name for name, _ in exports.PREDICTION_COLUMNS]
+    assert set(table.column('season_id').to_pylist()) == {league.season_id}
+    assert set(table.column('points_earned').to_pylist()) == {3}
+
+
+def test_parquet_export_without_pyarrow(app, db, make_league, tmp_path, monkeypatch):
+    make_league(fixtures=1, users=1)
+    output = tmp_path / 'export'
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)  # import now raises ImportError
+    monkeypatch.setitem(sys.modules, 'pyarrow.parquet', None)
+    with pytest.raises(RuntimeError, match='pyarrow'):
+        exports.export_parquet(str(output))
+    result = app.test_cli_runner().invoke(
+        args=['export-predictions', '--format', 'parquet', '--output', str(output)])
+    assert result.exit_code == 1
+    assert 'Parquet export needs the pyarrow package' in result.output
+    assert not output.exists()
@@ -0,0 +1,61 @@
+from app.cache import LEADERBOARD_VERSION, cache, get_versions, predictions_version
+
+
+def test_unchanged_leaderboard_revalidates_with_304(make_league, login):
+    league = make_league()
+    client = login(league.user_ids[0])
+    first = client.get('/leaderboard')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/leaderboard', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_scoring_changes_the_leaderboard_etag(make_league, login):
+    from app.scoring import score_fixtures
+    league = make_league(completed=True)
+    client = login(league.user_ids[0])
+    etag = client.get('/leaderboard').headers['ETag']
+    # Scored outside any request, as the CLI and job workers do.
+    score_fixtures()
+    response = client.get('/leaderboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_versions_survive_a_cache_reset(make_league, login):
+    from app.scoring import score_fixtures
+    make_league(completed=True)
+    score_fixtures()
+    before = get_versions([LEADERBOARD_VERSION])[0]
+    assert before[0] >= 1
+    cache.backend.clear()
+    assert get_versions([LEADERBOARD_VERSION])[0] == before
+
+
+def test_submission_bumps_the_predictions_version(make_league, login):
+    league = make_league(predict=None)
+    user_id = league.user_ids[0]
+    client = login(user_id)
+    etag = client.get(f'/predict/{league.match_week_id}').headers['ETag']
+    entries = [{'fixture_id': fixture_id, 'home_score': 2, 'away_score': 1}
+               for fixture_id in league.fixture_ids]
+    client.post(f'/submit_predictions/{league.match_week_id}', json={'predictions': entries})
+    assert get_versions([predictions_version(user_id, league.match_week_id)])[0][0] == 1
+    response = client.get(f'/predict/{league.match_week_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_rolled_back_bumps_are_dropped(db, make_league):
+    from app.cache import bump_on_commit
+    make_league()
+    bump_on_commit(LEADERBOARD_VERSION)
+    db.session.rollback()
+    db.session.commit()
+    assert get_versions([LEADERBOARD_VERSION])[0] == (0, None)
+
+
+def test_schedule_invalidation_bumps_match_week_versions(make_league):
+    from app.cache import invalidate_schedule, match_week_version
+    league = make_league()
+    invalidate_schedule([league.match_week_id])
+    assert get_versions([match_week_version(league.match_week_id)])[0][0] == 1
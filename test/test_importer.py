@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+import requests
+from sqlalchemy import select, text
+
+from app import jobs
+from app.importer import FileProvider, FixtureProvider, HTTPProvider, fetch_season, import_fixtures
+from app.models import Fixture, Job, MatchWeek, Season
+
+
+def _write_week(directory, start_year, week_number, fixtures):
+    path = directory / str(start_year)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / f'week_{week_number}.json').write_text(json.dumps(fixtures))
+
+
+def _season(db, start_year=2025):
+    season = Season(season_start_year=start_year, season_end_year=start_year + 1)
+    db.session.add(season)
+    db.session.commit()
+    return season
+
+
+def _fixture(home, away, kickoff='2025-08-16T15:00:00'):
+    return {'home_team': home, 'away_team': away, 'match_datetime': kickoff}
+
+
+class FailingProvider(FixtureProvider):
+    name = 'failing'
+
+    def fetch_match_week(self, season_start_year, week_number):
+        if week_number == 2:
+            raise ConnectionError('feed unavailable')
+        return [_fixture(f'Home {week_number}', f'Away {week_number}')]
+
+
+def test_reimport_updates_instead_of_duplicating(db, tmp_path):
+    season = _season(db)
+    _write_week(tmp_path, 2025, 1, [_fixture('Arsenal', 'Chelsea'), _fixture('Arsenal', 'Chelsea'),
+                                    _fixture('Everton', 'Fulham')])
+    assert import_fixtures(season, FileProvider(str(tmp_path)), [1, 2])['fixtures'] == 2
+    _write_week(tmp_path, 2025, 1, [_fixture('Arsenal', 'Chelsea', '2025-08-17T12:30:00'),
+                                    _fixture('Everton', 'Fulham')])
+    import_fixtures(season, FileProvider(str(tmp_path)), [1, 2])
+    rows = db.session.execute(select(Fixture.home_team, Fixture.match_datetime)
+                              .order_by(Fixture.home_team)).all()
+    assert rows == [('Arsenal', datetime(2025, 8, 17, 12, 30)), ('Everton', datetime(2025, 8, 16, 15))]
+    assert MatchWeek.query.count() == 1  # week 2 had no fixtures
+
+
+def test_a_failed_fetch_writes_nothing(db):
+    season = _season(db)
+    with pytest.raises(ConnectionError):
+        import_fixtures(season, FailingProvider(), [1, 2, 3])
+    db.session.rollback()
+    assert Fixture.query.count() == 0
+    assert MatchWeek.query.count() == 0
+
+
+def test_failed_import_job_is_retried(app, db, monkeypatch):
+    season = _season(db)
+    job = jobs.submit('import_fixtures', {'season_id': season.id, 'weeks': [1, 2]})
+    monkeypatch.setattr('app.importer.provider_from_config', lambda value, pool_size=8: FailingProvider())
+    jobs.work(app, once=True)
+    job = db.session.get(Job, job.id)
+    assert job.status == jobs.QUEUED
+    assert 'feed unavailable' in job.error
+
+
+def test_weeks_are_fetched_concurrently(db):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    class SlowProvider(FixtureProvider):
+        def fetch_match_week(self, season_start_year, week_number):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return [_fixture(f'Home {week_number}', f'Away {week_number}')]
+
+    calls = []
+    fetched = fetch_season(SlowProvider(), 2025, range(1, 9), max_workers=4,
+                           progress=lambda done, total: calls.append((done, total)))
+    assert peak[0] > 1
+    assert sorted(fetched) == list(range(1, 9))
+    assert fetched[3][0] == [_fixture('Home 3', 'Away 3')]
+    assert calls == [(done, 8) for done in range(1, 9)]
+
+
+@pytest.fixture
+def feed(tmp_path):
+    handler = partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    handler.func.log_message = lambda *args: None
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield tmp_path, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_provider(feed):
+    directory, url = feed
+    _write_week(directory, 2025, 1, [_fixture('Arsenal', 'Chelsea')])
+    (directory / '2025' / 'week_2.json').mkdir()  # a directory listing is not JSON
+    provider = HTTPProvider(url, pool_size=2)
+    try:
+        assert provider.fetch_match_week(2025, 1) == [_fixture('Arsenal', 'Chelsea')]
+        assert provider.fetch_match_week(2025, 3) == []  # 404: nothing published yet
+        with pytest.raises(requests.RequestException):
+            HTTPProvider('http://127.0.0.1:1', timeout=1).fetch_match_week(2025, 1)
+        with pytest.raises(ValueError):
+            provider.fetch_match_week(2025, 2)
+    finally:
+        provider.close()
+
+
+def test_upgraded_baseline_database_accepts_imports(db, tmp_path):
+    from app.database import upgrade_schema
+    with db.engine.begin() as connection:
+        ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'fixture'")).scalar()
+        connection.execute(text('DROP TABLE fixture'))
+        connection.execute(text(ddl.replace(
+            'CONSTRAINT unique_match_week_fixture UNIQUE (match_week_id, home_team, away_team), ', '')))
+    assert 'created unique constraint unique_match_week_fixture' in upgrade_schema(db)
+    assert upgrade_schema(db) == []
+    _write_week(tmp_path, 2025, 1, [_fixture('Arsenal', 'Chelsea')])
+    season = _season(db)
+    import_fixtures(season, FileProvider(str(tmp_path)), [1])
+    import_fixtures(season, FileProvider(str(tmp_path)), [1])
+    assert Fixture.query.count() == 1
@@ -0,0 +1,47 @@
+import sys
+
+import pytest
+
+from app.instrumentation import _profile_lock, count_queries
+
+
+@pytest.fixture
+def profiled_app(app, tmp_path):
+    app.config.update(PROFILE_HEADER=True, PROFILE_DIR=str(tmp_path / 'profiles'),
+                      QUERY_COUNT_HEADER=True)
+
+    def boom():
+        raise RuntimeError('boom')
+    app.add_url_rule('/boom', 'boom', boom)
+    return app
+
+
+def _lock_is_free():
+    if not _profile_lock.acquire(blocking=False):
+        return False
+    _profile_lock.release()
+    return True
+
+
+def test_profiled_request_writes_a_profile(profiled_app, tmp_path):
+    response = profiled_app.test_client().get('/login', headers={'X-Profile': '1'})
+    assert response.headers['X-Profile-Path'].endswith('.prof')
+    assert len(list((tmp_path / 'profiles').iterdir())) == 1
+    assert _lock_is_free()
+
+
+def test_failed_profiled_request_releases_the_profiler(profiled_app):
+    with pytest.raises(RuntimeError):
+        profiled_app.test_client().get('/boom', headers={'X-Profile': '1'})
+    assert _lock_is_free()
+    assert sys.getprofile() is None
+    response = profiled_app.test_client().get('/login', headers={'X-Profile': '1'})
+    assert 'X-Profile-Path' in response.headers
+
+
+def test_count_queries_counts_statements(db):
+    from sqlalchemy import text
+    with count_queries() as counter:
+        db.session.execute(text('SELECT 1'))
+        db.session.execute(text('SELECT 2'))
+    assert counter.count == 2
@@ -0,0 +1,76 @@
+from sqlalchemy import update
+
+from app import jobs
+from app.models import Job, UserStanding
+
+
+def _run_all(app):
+    jobs.work(app, once=True)
+
+
+def test_shard_sends_a_heartbeat_per_fixture(app, db, make_league, monkeypatch):
+    league = make_league(fixtures=3, users=2, completed=True)
+    heartbeats = []
+    progress = jobs.JobContext.progress
+
+    def record(ctx, fraction, message=None):
+        heartbeats.append(fraction)
+        return progress(ctx, fraction, message)
+    monkeypatch.setattr(jobs.JobContext, 'progress', record)
+    job = jobs.submit('score_shard', {'fixture_ids': league.fixture_ids})
+    _run_all(app)
+    job = db.session.get(Job, job.id)
+    assert job.status == jobs.SUCCEEDED
+    assert heartbeats == [0, 1 / 3, 2 / 3]
+    assert job.heartbeat_at is not None and job.heartbeat_at > job.started_at
+    assert jobs.job_status(job)['result']['rows_updated'] == 6
+
+
+def test_repeated_score_click_returns_the_queued_job(app, db, make_league, admin, login):
+    league = make_league(completed=True)
+    client = login(admin)
+    form = {'match_week_id': league.match_week_id}
+    first = client.post('/admin/score_fixtures', data=form).get_json()['job_id']
+    assert client.post('/admin/score_fixtures', data=form).get_json()['job_id'] == first
+    assert Job.query.filter_by(kind='score_fixtures').count() == 1
+    _run_all(app)
+    totals = {row.user_id: row.total_points for row in UserStanding.query}
+    assert set(totals.values()) == {3 * 3}
+
+
+def test_corrected_result_can_be_scored_again(app, db, make_league, admin, login):
+    from app.cache import invalidate_schedule
+    league = make_league(completed=True)
+    client = login(admin)
+    form = {'match_week_id': league.match_week_id}
+    first = client.post('/admin/score_fixtures', data=form).get_json()['job_id']
+    invalidate_schedule([league.match_week_id])
+    assert client.post('/admin/score_fixtures', data=form).get_json()['job_id'] != first
+
+
+def test_score_can_be_requested_again_after_a_run(app, db, make_league, admin, login):
+    league = make_league(completed=True)
+    client = login(admin)
+    form = {'match_week_id': league.match_week_id}
+    first = client.post('/admin/score_fixtures', data=form).get_json()['job_id']
+    _run_all(app)
+    assert client.post('/admin/score_fixtures', data=form).get_json()['job_id'] != first
+
+
+def test_failed_score_job_can_be_retried(app, db, make_league, admin, login, monkeypatch):
+    league = make_league(completed=True)
+    client = login(admin)
+    form = {'match_week_id': league.match_week_id}
+    first = client.post('/admin/score_fixtures', data=form).get_json()['job_id']
+    db.session.execute(update(Job).where(Job.id == first).values(max_attempts=1))
+    db.session.commit()
+    with monkeypatch.context() as patch:
+        patch.setattr('app.scoring.score_fixtures', lambda **kwargs: 1 / 0)
+        _run_all(app)
+    assert db.session.get(Job, first).status == jobs.FAILED
+    retry = client.post('/admin/score_fixtures', data=form).get_json()['job_id']
+    assert retry != first
+    assert client.post('/admin/score_fixtures', data=form).get_json()['job_id'] == retry
+    _run_all(app)
+    assert db.session.get(Job, retry).status == jobs.SUCCEEDED
+    assert {row.total_points for row in UserStanding.query} == {3 * 3}
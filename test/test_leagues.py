@@ -0,0 +1,93 @@
+from app import leagues
+from app.models import LeagueMember, User, UserStanding
+
+
+def _users(db, points):
+    """Users with the given leaderboard totals (None: no standing row yet)."""
+    existing = User.query.count()
+    users = [User(email=f'member{i}@example.com', name=f'Member {i}', google_id=f'm{i}')
+             for i in range(existing, existing + len(points))]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all(UserStanding(user_id=user.id, total_points=total)
+                       for user, total in zip(users, points) if total is not None)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def _league(db, points):
+    user_ids = _users(db, points)
+    league = leagues.create_league(user_ids[0], 'Friends')
+    for user_id in user_ids[1:]:
+        leagues.join_league(user_id, league.code)
+    return league, user_ids
+
+
+def test_join_by_code(db):
+    owner, member = _users(db, [0, 0])
+    league = leagues.create_league(owner, 'Friends')
+    assert len(league.code) == leagues.CODE_LENGTH
+    assert leagues.is_member(league.id, owner)
+    assert leagues.join_league(member, f' {league.code.lower()} ').id == league.id
+    assert leagues.is_member(league.id, member)
+    assert leagues.join_league(member, 'NOSUCHCODE') is None
+
+
+def test_joining_twice_is_a_no_op(db, monkeypatch):
+    owner, member = _users(db, [0, 0])
+    league = leagues.create_league(owner, 'Friends')
+    leagues.join_league(member, league.code)
+    # As if a concurrent join had inserted the row after our membership check.
+    monkeypatch.setattr(leagues, 'is_member', lambda league_id, user_id: False)
+    assert leagues.join_league(member, league.code).id == league.id
+    assert LeagueMember.query.filter_by(league_id=league.id).count() == 2
+
+
+def test_leave(db):
+    league, (owner, member) = _league(db, [0, 0])
+    leagues.leave_league(league.id, member)
+    assert not leagues.is_member(league.id, member)
+    assert leagues.league_standings_page(league.id)[1] == 1
+
+
+def test_ranks_share_ties_and_count_members_without_standings(db):
+    league, user_ids = _league(db, [5, 9, 5, None])
+    rows, members = leagues.league_standings_page(league.id)
+    assert members == 4
+    assert [(row.user_id, row.total_points, row.rank) for row in rows] == [
+        (user_ids[1], 9, 1), (user_ids[0], 5, 2), (user_ids[2], 5, 2), (user_ids[3], 0, 4)]
+
+
+def test_paging(db):
+    league, user_ids = _league(db, [10, 9, 8, 7, 6])
+    first, members = leagues.league_standings_page(league.id, page=1, page_size=2)
+    last, _ = leagues.league_standings_page(league.id, page=3, page_size=2)
+    assert members == 5
+    assert [row.user_id for row in first] == user_ids[:2]
+    assert [row.user_id for row in last] == user_ids[4:]
+    assert leagues.league_standings_page(league.id, page=4, page_size=2) == ([], 0)
+    assert leagues.page_for_member(league.id, user_ids[3], page_size=2) == 2
+    outsider, = _users(db, [100])
+    assert leagues.page_for_member(league.id, outsider, page_size=2) is None
+
+
+def test_leagues_for_user(db):
+    friends, user_ids = _league(db, [3, 1])
+    work = leagues.create_league(user_ids[1], 'Work')
+    rows = leagues.leagues_for_user(user_ids[1])
+    assert [(row.name, row.rank, row.members, row.total_points) for row in rows] == [
+        ('Friends', 2, 2, 1), ('Work', 1, 1, 1)]
+    assert rows[1].id == work.id and rows[0].id == friends.id
+
+
+def test_league_page_lists_the_members(db, login):
+    league, (owner, member) = _league(db, [2, 1])
+    page = login(member).get(f'/leagues/{league.id}?around=me')
+    assert page.status_code == 200
+    assert 'Member 0' in page.get_data(as_text=True)
+
+
+def test_league_page_turns_outsiders_away(db, login):
+    league, _ = _league(db, [2, 1])
+    outsider, = _users(db, [0])
+    assert login(outsider).get(f'/leagues/{league.id}').status_code == 302
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import select
+
+from app.instrumentation import count_queries
+from app.models import Prediction
+from app.predictions import parse_predictions, upsert_predictions
+
+
+def _saved(db, user_id):
+    return {fixture_id: (home, away) for fixture_id, home, away in db.session.execute(
+        select(Prediction.fixture_id, Prediction.home_score_prediction, Prediction.away_score_prediction)
+        .where(Prediction.user_id == user_id))}
+
+
+def test_upsert_inserts_then_updates_in_one_statement(db, make_league):
+    league = make_league(fixtures=3, users=1, predict=None)
+    user_id = league.user_ids[0]
+    first = dict.fromkeys(league.fixture_ids, (1, 1))
+    assert upsert_predictions(user_id, first) == 3
+    second = {league.fixture_ids[0]: (4, 0), league.fixture_ids[2]: (0, 2)}
+    with count_queries() as counter:
+        upsert_predictions(user_id, second, commit=False)
+    db.session.commit()
+    assert counter.count == 1
+    assert _saved(db, user_id) == {**first, **second}
+    assert Prediction.query.count() == 3
+
+
+@pytest.mark.parametrize('entries, message', [
+    ([], 'No predictions submitted'),
+    ([{'fixture_id': 1, 'home_score': 'x', 'away_score': 0}], 'needs fixture_id'),
+    ([{'fixture_id': 99, 'home_score': 1, 'away_score': 0}], 'not part of this match week'),
+    ([{'fixture_id': 1, 'home_score': 21, 'away_score': 0}], 'between'),
+])
+def test_parse_predictions_rejects_bad_input(entries, message):
+    with pytest.raises(ValueError, match=message):
+        parse_predictions(entries, {1, 2})
+
+
+def test_week_endpoint_saves_every_fixture(db, make_league, login):
+    league = make_league(fixtures=3, users=1, predict=None)
+    client = login(league.user_ids[0])
+    entries = [{'fixture_id': fixture_id, 'home_score': 2, 'away_score': 1}
+               for fixture_id in league.fixture_ids]
+    response = client.post(f'/submit_predictions/{league.match_week_id}', json={'predictions': entries})
+    assert response.status_code == 200
+    assert response.json == {'success': True, 'saved': 3}
+    assert _saved(db, league.user_ids[0]) == dict.fromkeys(league.fixture_ids, (2, 1))
+
+
+def test_week_endpoint_rejects_a_closed_week(db, make_league, login):
+    league = make_league(fixtures=1, users=1, predict=None, open_window=False)
+    client = login(league.user_ids[0])
+    response = client.post(f'/submit_predictions/{league.match_week_id}', json={'predictions': [
+        {'fixture_id': league.fixture_ids[0], 'home_score': 2, 'away_score': 1}]})
+    assert response.status_code == 400
+    assert Prediction.query.count() == 0
+
+
+def test_predict_page_fills_every_hole(make_league, login):
+    league = make_league(fixtures=2, users=1, predict=(3, 1))
+    client = login(league.user_ids[0])
+    for _ in range(2):  # rendered, then served from the fragment cache
+        body = client.get(f'/predict/{league.match_week_id}').get_data(as_text=True)
+        assert '<!--hole:' not in body
+        assert 'value="3"' in body and 'Saved' in body
@@ -0,0 +1,63 @@
+"""Hot routes must run a fixed number of queries however much data there is."""
+from app.instrumentation import count_queries
+
+
+def _queries(client, method, url, **kwargs):
+    with count_queries() as counter:
+        response = client.open(url, method=method, **kwargs)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    return counter.count
+
+
+def test_predict_match_week_has_no_n_plus_one(make_league, login):
+    small = make_league(fixtures=2, users=1)
+    large = make_league(fixtures=10, users=1, start_year=2026)
+    counts = []
+    for league in (small, large):
+        client = login(league.user_ids[0])
+        client.get(f'/predict/{league.match_week_id}')  # warm the schedule cache
+        counts.append(_queries(client, 'GET', f'/predict/{league.match_week_id}'))
+    assert counts[0] == counts[1]
+    assert counts[1] <= 2
+
+
+def test_leaderboard_query_count_is_flat(make_league, login):
+    from app.standings import rebuild_standings
+    make_league(fixtures=3, users=3, completed=True)
+    rebuild_standings()
+    client = login(1)
+    client.get('/leaderboard')
+    few = _queries(client, 'GET', '/leaderboard?page=1')
+    make_league(fixtures=3, users=40, completed=True, start_year=2026)
+    rebuild_standings()
+    client.get('/leaderboard')
+    many = _queries(client, 'GET', '/leaderboard?page=1')
+    assert many == few
+
+
+def test_index_is_served_from_cache(make_league, login):
+    league = make_league()
+    client = login(league.user_ids[0])
+    client.get('/')
+    assert _queries(client, 'GET', '/') == 0
+
+
+def test_week_submission_is_one_write(make_league, login):
+    league = make_league(predict=None)
+    client = login(league.user_ids[0])
+    client.get(f'/predict/{league.match_week_id}')
+    entries = [{'fixture_id': fixture_id, 'home_score': 2, 'away_score': 1}
+               for fixture_id in league.fixture_ids]
+    assert _queries(client, 'POST', f'/submit_predictions/{league.match_week_id}',
+                    json={'predictions': entries}) <= 2
+
+
+def test_scoring_statement_count_does_not_grow_with_predictions(make_league):
+    from app.scoring import score_fixtures
+    make_league(fixtures=2, users=2, completed=True)
+    with count_queries() as small:
+        score_fixtures()
+    make_league(fixtures=10, users=30, completed=True, start_year=2026)
+    with count_queries() as large:
+        score_fixtures()
+    assert large.count == small.count
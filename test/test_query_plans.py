@@ -0,0 +1,17 @@
+import pytest
+
+from app.query_plans import HOT_QUERIES, _derived_tables, explain, is_full_scan
+
+
+@pytest.mark.parametrize('name, build', HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES])
+def test_hot_query_uses_indexes(app, name, build):
+    plan = explain(build())
+    derived = _derived_tables(plan)
+    assert [step for step in plan if is_full_scan(step, derived)] == []
+
+
+def test_full_scan_detection():
+    assert is_full_scan('SCAN prediction')
+    assert not is_full_scan('SCAN prediction USING INDEX ix_prediction_fixture_id')
+    assert not is_full_scan('SEARCH prediction USING INDEX ix_prediction_user_fixture (user_id=?)')
+    assert not is_full_scan('SCAN totals', derived={'totals'})
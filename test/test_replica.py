@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.fixture
+def replica_app(app, tmp_path, monkeypatch):
+    """A second app on the same primary, with an empty replica that lags behind it."""
+    from app import create_app, db
+    monkeypatch.setenv('REPLICA_DB_URI', f"sqlite:///{tmp_path / 'replica.db'}")
+    replica_app = create_app()
+    replica_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, REPLICA_STICKY_SECONDS=5)
+    with replica_app.app_context():
+        db.metadatas[None].create_all(db.engines['replica'])
+        yield replica_app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registered an (empty) metadata for the bind on the shared
+    # extension; later apps have no such bind.
+    db.metadatas.pop('replica', None)
+
+
+def test_user_missing_from_the_replica_stays_logged_in(replica_app, make_league):
+    league = make_league()
+    client = replica_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(league.user_ids[0])
+    assert client.get('/leaderboard').status_code == 200
+    assert client.get('/me/stats').status_code == 200
+
+
+def test_league_writes_stick_to_the_primary(replica_app, make_league):
+    league = make_league()
+    client = replica_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(league.user_ids[0])
+    client.post('/leagues/create', data={'name': 'Friends'})
+    with client.session_transaction() as session:
+        assert '_primary_until' in session
+
+
+def test_admin_writes_stick_to_the_primary(replica_app, admin):
+    client = replica_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin)
+    client.post('/admin/create_season', data={'season_start_year': 2030, 'season_end_year': 2031})
+    with client.session_transaction() as session:
+        assert '_primary_until' in session
+
+
+def test_shared_cache_is_filled_from_the_primary(replica_app, make_league):
+    from app.cache import get_match_week
+    league = make_league()
+    client = replica_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(league.user_ids[0])
+    # The replica has no match weeks yet; a fill from it would cache a 404.
+    assert client.get(f'/predict/{league.match_week_id}').status_code == 200
+    assert get_match_week(league.match_week_id) is not None
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import click
+import pytest
+
+from app.cache import SCHEDULE_VERSION
+from app.instrumentation import count_queries
+from app.models import Fixture
+from app.schedule import ScheduleIndex
+
+
+@pytest.mark.parametrize('command, cli', [('run', False), ('load-season', True), ('shell', True)])
+def test_only_flask_run_counts_as_serving(command, cli):
+    from app import _running_cli
+    assert _running_cli() is False
+    with click.Context(click.Command(command), info_name=command):
+        assert _running_cli() is cli
+
+
+def _add_fixture_elsewhere(db, match_week_id):
+    """A fixture added by another process: committed and versioned, but this
+    process's cache generation is untouched."""
+    from app.cache import bump_versions
+    fixture = Fixture(match_week_id=match_week_id, home_team='Late', away_team='Addition',
+                      match_datetime=datetime.utcnow() + timedelta(days=1))
+    db.session.add(fixture)
+    bump_versions(db.session, [SCHEDULE_VERSION])
+    db.session.commit()
+    return fixture.id
+
+
+def test_index_picks_up_fixtures_added_by_another_process(db, make_league):
+    league = make_league(fixtures=1)
+    index = ScheduleIndex()
+    index.build()
+    fixture_id = _add_fixture_elsewhere(db, league.match_week_id)
+    assert index.window(fixture_id)[0] == league.match_week_id
+
+
+def test_index_hits_and_unknown_fixtures_are_cheap(db, make_league):
+    league = make_league(fixtures=2)
+    index = ScheduleIndex()
+    index.build()
+    with count_queries() as hits:
+        assert index.is_open(league.fixture_ids[0])
+    with count_queries() as miss:
+        assert index.window(999999) is None
+    assert hits.count == 0
+    assert miss.count == 1
+
+
+def test_single_fixture_submission_for_a_new_fixture(db, make_league, login):
+    league = make_league(fixtures=1, predict=None)
+    client = login(league.user_ids[0])
+    assert client.post(f'/submit_prediction/{league.fixture_ids[0]}',
+                       data={'home_score': 1, 'away_score': 1}).status_code == 200
+    fixture_id = _add_fixture_elsewhere(db, league.match_week_id)
+    response = client.post(f'/submit_prediction/{fixture_id}', data={'home_score': 2, 'away_score': 0})
+    assert response.status_code == 200, response.get_json()
+
+
+def test_single_fixture_submission_for_a_deleted_match_week_is_404(db, make_league, login, monkeypatch):
+    league = make_league(fixtures=1, predict=None)
+    client = login(league.user_ids[0])
+    monkeypatch.setattr('app.routes.get_match_week', lambda match_week_id: None)
+    response = client.post(f'/submit_prediction/{league.fixture_ids[0]}', data={'home_score': 1, 'away_score': 1})
+    assert response.status_code == 404
+
+
+def test_score_updates_leave_the_schedule_alone(db, make_league, monkeypatch):
+    from app.cache import SCHEDULE, SCORES_VERSION, cache, get_fixtures, get_versions
+    from app.live import apply_score_event
+    from app.schedule import schedule_index
+    league = make_league()
+    fixture_id = league.fixture_ids[0]
+    assert [f.home_score for f in get_fixtures(league.match_week_id)] == [None, None, None]
+    schedule_index.build()
+    before = get_versions([SCHEDULE_VERSION])[0], cache.generation(SCHEDULE)
+    scores = get_versions([SCORES_VERSION])[0][0]
+    apply_score_event({'fixture_id': fixture_id, 'home_score': 2, 'away_score': 0, 'status': 'live'})
+    assert (get_versions([SCHEDULE_VERSION])[0], cache.generation(SCHEDULE)) == before
+    assert get_versions([SCORES_VERSION])[0][0] == scores + 1
+    monkeypatch.setattr(schedule_index, 'build', lambda: pytest.fail('the index was rebuilt'))
+    assert schedule_index._windows(force=True)[fixture_id][0] == league.match_week_id
+    assert [f.home_score for f in get_fixtures(league.match_week_id)] == [2, None, None]
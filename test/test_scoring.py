@@ -0,0 +1,166 @@
+import random
+
+from sqlalchemy import select, update
+
+from app.models import Fixture, Prediction, UserStanding, UserWeekStats
+from app.scoring import score_fixtures
+from app.standings import rebuild_standings
+
+
+def _standings(db):
+    return db.session.execute(
+        select(UserStanding.user_id, UserStanding.total_points, UserStanding.exact_scores,
+               UserStanding.correct_results, UserStanding.rank, UserStanding.position)
+        .order_by(UserStanding.user_id)
+    ).all()
+
+
+def _week_stats(db):
+    return db.session.execute(
+        select(UserWeekStats.user_id, UserWeekStats.match_week_id, UserWeekStats.points,
+               UserWeekStats.exact_scores, UserWeekStats.correct_results)
+        .order_by(UserWeekStats.user_id, UserWeekStats.match_week_id)
+    ).all()
+
+
+def _assert_matches_rebuild(db):
+    incremental = _standings(db), _week_stats(db)
+    rebuild_standings()
+    assert (_standings(db), _week_stats(db)) == incremental
+
+
+def _randomize_predictions(db, seed=1):
+    rng = random.Random(seed)
+    for prediction in Prediction.query.all():
+        prediction.home_score_prediction = rng.randint(0, 3)
+        prediction.away_score_prediction = rng.randint(0, 3)
+    db.session.commit()
+
+
+def test_points(db, make_league):
+    league = make_league(fixtures=1, users=3, completed=True, predict=None)
+    fixture_id = league.fixture_ids[0]
+    for user_id, (home, away) in zip(league.user_ids, [(1, 0), (2, 0), (0, 1)]):
+        db.session.add(Prediction(user_id=user_id, fixture_id=fixture_id,
+                                  home_score_prediction=home, away_score_prediction=away))
+    db.session.commit()
+    report = score_fixtures()
+    assert report['rows_updated'] == 3
+    points = dict(db.session.execute(select(Prediction.user_id, Prediction.points_earned)).all())
+    assert [points[user_id] for user_id in league.user_ids] == [3, 1, 0]
+
+
+def test_rescoring_is_a_no_op(db, make_league):
+    make_league(completed=True)
+    score_fixtures()
+    assert score_fixtures()['rows_updated'] == 0
+
+
+def test_incremental_standings_match_a_rebuild(db, make_league):
+    make_league(fixtures=4, users=12, completed=True)
+    _randomize_predictions(db)
+    score_fixtures()
+    _assert_matches_rebuild(db)
+
+
+def test_zero_point_players_are_listed(db, make_league):
+    league = make_league(fixtures=2, users=2, completed=True, predict=(0, 3))
+    score_fixtures()
+    rows = {row.user_id: row for row in _standings(db)}
+    assert set(rows) == set(league.user_ids)
+    assert all(row.total_points == 0 and row.rank == 1 for row in rows.values())
+    _assert_matches_rebuild(db)
+
+
+def test_corrected_result_applies_the_difference(db, make_league):
+    league = make_league(fixtures=3, users=10, completed=True)
+    _randomize_predictions(db, seed=2)
+    score_fixtures()
+    db.session.execute(update(Fixture).where(Fixture.id == league.fixture_ids[0])
+                       .values(home_score=2, away_score=2))
+    db.session.commit()
+    report = score_fixtures(fixture_ids=[league.fixture_ids[0]])
+    assert report['rows_updated'] > 0
+    _assert_matches_rebuild(db)
+
+
+def test_partial_rerank_keeps_positions_consistent(db, make_league):
+    league = make_league(fixtures=5, users=30, completed=True)
+    _randomize_predictions(db, seed=3)
+    score_fixtures()
+    for seed, fixture_id in enumerate(league.fixture_ids):
+        rng = random.Random(seed)
+        db.session.execute(update(Fixture).where(Fixture.id == fixture_id)
+                           .values(home_score=rng.randint(0, 3), away_score=rng.randint(0, 3)))
+        db.session.commit()
+        score_fixtures(fixture_ids=[fixture_id])
+        positions = sorted(row.position for row in _standings(db))
+        assert positions == list(range(1, 31))
+    _assert_matches_rebuild(db)
+
+
+def test_live_scores_are_provisional(db, make_league):
+    from app.live import apply_score_event
+    league = make_league(fixtures=1, users=4)
+    _randomize_predictions(db, seed=4)
+    fixture_id = league.fixture_ids[0]
+    apply_score_event({'fixture_id': fixture_id, 'home_score': 1, 'away_score': 0, 'status': 'live'})
+    apply_score_event({'fixture_id': fixture_id, 'home_score': 1, 'away_score': 1, 'status': 'live'})
+    apply_score_event({'fixture_id': fixture_id, 'home_score': 2, 'away_score': 1, 'status': 'final'})
+    assert db.session.get(Fixture, fixture_id).is_completed
+    _assert_matches_rebuild(db)
+
+
+def test_concurrent_runs_apply_points_once(app, db, make_league, monkeypatch):
+    import threading
+    from app import scoring
+    league = make_league(fixtures=2, users=3, completed=True)
+    paused, resume = threading.Event(), threading.Event()
+    apply_week_deltas = scoring.apply_week_deltas
+
+    def pause_first_run(weekly):
+        if threading.current_thread().name == 'first':
+            paused.set()
+            resume.wait(5)
+        return apply_week_deltas(weekly)
+    monkeypatch.setattr(scoring, 'apply_week_deltas', pause_first_run)
+
+    def run():
+        with app.app_context():
+            score_fixtures(match_week_id=league.match_week_id)
+
+    first = threading.Thread(target=run, name='first')
+    second = threading.Thread(target=run, name='second')
+    first.start()
+    assert paused.wait(5)
+    second.start()
+    # The second run waits for the first one's lock, not just its UPDATE.
+    second.join(0.3)
+    resume.set()
+    first.join(5)
+    second.join(5)
+    db.session.expire_all()
+    totals = {row.user_id: row.total_points for row in _standings(db)}
+    assert totals == {user_id: 2 * scoring.EXACT_SCORE_POINTS for user_id in league.user_ids}
+    _assert_matches_rebuild(db)
+
+
+def test_init_db_marks_legacy_zero_points_as_unscored(app, db, make_league):
+    played = make_league(fixtures=2, users=2, completed=True)
+    unplayed = make_league(fixtures=2, users=2, start_year=2026)
+    score_fixtures()
+    # Rows written under the old default of 0.
+    db.session.execute(update(Prediction).where(Prediction.fixture_id.in_(unplayed.fixture_ids))
+                       .values(points_earned=0))
+    db.session.commit()
+    rebuild_standings()
+    assert {row.predictions_scored for row in UserWeekStats.query} == {2}  # counted as scored
+
+    output = app.test_cli_runner().invoke(args=['init-db']).output
+    assert 'marked 4 predictions on unplayed fixtures as unscored' in output
+    assert db.session.execute(select(Prediction.points_earned)
+                              .where(Prediction.fixture_id.in_(unplayed.fixture_ids))).scalars().all() \
+        == [None] * 4
+    db.session.expire_all()
+    assert {row.match_week_id for row in UserWeekStats.query} == {played.match_week_id}
+    assert 'marked' not in app.test_cli_runner().invoke(args=['init-db']).output
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+CSV_HEADER = ('season_start_year,season_end_year,week_number,predictions_open_time,'
+              'predictions_close_time,home_team,away_team,match_datetime\n')
+
+
+def _upload(client, name, body):
+    return client.post('/admin/load_season', data={'schedule': (io.BytesIO(body), name)},
+                       content_type='multipart/form-data')
+
+
+@pytest.fixture
+def client(login, admin):
+    return login(admin)
+
+
+def test_csv_upload_loads_the_season(client):
+    body = (CSV_HEADER + '2030,2031,1,2030-08-01T00:00:00,2030-08-10T12:00:00,Arsenal,Chelsea,'
+            '2030-08-10T15:00:00\n').encode()
+    response = _upload(client, 'season.csv', body)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['success']
+
+
+@pytest.mark.parametrize('name, body', [
+    ('season.json', b'{"season_start_year": 2030,'),
+    ('season.json', b'\xff\xfe not utf-8'),
+    ('season.csv', b'year,week\n2030,1\n'),
+    ('season.csv', (CSV_HEADER + '2030,2031\n').encode()),
+])
+def test_unreadable_uploads_are_rejected(client, name, body):
+    response = _upload(client, name, body)
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+@pytest.mark.parametrize('match_weeks', [
+    'week one',
+    [1, 2],
+    [{'week_number': 1, 'predictions_open_time': '2030-08-01T00:00:00',
+      'predictions_close_time': '2030-08-10T12:00:00', 'fixtures': ['Arsenal v Chelsea']}],
+    [{'week_number': 1, 'predictions_open_time': '2030-08-01T00:00:00',
+      'predictions_close_time': '2030-08-10T12:00:00',
+      'fixtures': [{'home_team': ['Arsenal'], 'away_team': 'Chelsea', 'match_datetime': 5}]}],
+])
+def test_malformed_schedules_are_rejected(client, match_weeks):
+    response = client.post('/admin/load_season', json={
+        'season_start_year': 2030, 'season_end_year': 2031, 'match_weeks': match_weeks})
+    assert response.status_code == 400
+    assert response.get_json()['error']
@@ -0,0 +1,81 @@
+import random
+
+from sqlalchemy import select, update
+
+from app.models import Fixture, Prediction, UserWeekStats
+from app.scoring import score_fixtures
+from app.user_stats import _streaks, rebuild_user_stats
+
+
+def _rollup(db):
+    return db.session.execute(
+        select(UserWeekStats.user_id, UserWeekStats.match_week_id, UserWeekStats.season_id,
+               UserWeekStats.week_number, UserWeekStats.predictions_scored, UserWeekStats.points,
+               UserWeekStats.exact_scores, UserWeekStats.correct_results)
+        .order_by(UserWeekStats.user_id, UserWeekStats.match_week_id)
+    ).all()
+
+
+def test_scoring_rollup_matches_a_rebuild(db, make_league):
+    leagues = [make_league(fixtures=3, users=6, completed=True, start_year=2024),
+               make_league(fixtures=3, users=6, completed=True, start_year=2025)]
+    rng = random.Random(5)
+    for prediction in Prediction.query.all():
+        prediction.home_score_prediction = rng.randint(0, 2)
+        prediction.away_score_prediction = rng.randint(0, 2)
+    db.session.commit()
+    score_fixtures()
+    # A corrected result moves the rollup down as well as up.
+    for fixture_id in (leagues[0].fixture_ids[0], leagues[1].fixture_ids[1]):
+        db.session.execute(update(Fixture).where(Fixture.id == fixture_id).values(home_score=0, away_score=2))
+    db.session.commit()
+    score_fixtures(fixture_ids=[leagues[0].fixture_ids[0], leagues[1].fixture_ids[1]])
+    incremental = _rollup(db)
+    assert incremental
+    rebuild_user_stats()
+    assert _rollup(db) == incremental
+
+
+def test_rebuild_ignores_points_on_unplayed_fixtures(db, make_league):
+    league = make_league(fixtures=2, users=1)
+    db.session.execute(update(Prediction).values(points_earned=0))
+    db.session.commit()
+    rebuild_user_stats()
+    assert UserWeekStats.query.filter_by(user_id=league.user_ids[0]).count() == 0
+
+
+def test_streaks():
+    def weeks(*points):
+        return [{'points': p} for p in points]
+    assert _streaks([]) == (0, 0)
+    assert _streaks(weeks(0, 0)) == (0, 0)
+    assert _streaks(weeks(3, 1, 0, 1)) == (1, 2)
+    assert _streaks(weeks(1, 1, 1)) == (3, 3)
+    assert _streaks(weeks(1, 0, 1, 1, 1, 0)) == (0, 3)
+
+
+def test_stats_payload(db, make_league, login):
+    league = make_league(fixtures=3, users=2, completed=True, predict=None)
+    user_id = league.user_ids[0]
+    # Fixtures finish 1-0: an exact score, a correct result and a miss.
+    for fixture_id, (home, away) in zip(league.fixture_ids, [(1, 0), (2, 0), (0, 1)]):
+        db.session.add(Prediction(user_id=user_id, fixture_id=fixture_id,
+                                  home_score_prediction=home, away_score_prediction=away))
+    db.session.commit()
+    score_fixtures()
+    body = login(user_id).get('/api/me/stats').get_json()
+    assert body['user_id'] == user_id
+    [season] = body['seasons']
+    assert season['season_id'] == league.season_id
+    assert season['season'] == '2025-2026'
+    assert season['weeks'] == [{'week_number': 1, 'predictions': 3, 'points': 4, 'cumulative_points': 4,
+                                'exact_scores': 1, 'correct_results': 2}]
+    assert {key: season[key] for key in ('total_points', 'predictions', 'exact_scores', 'correct_results',
+                                         'exact_score_rate', 'result_accuracy', 'best_week',
+                                         'current_streak', 'longest_streak')} == {
+        'total_points': 4, 'predictions': 3, 'exact_scores': 1, 'correct_results': 2,
+        'exact_score_rate': 0.3333, 'result_accuracy': 0.6667, 'best_week': 1,
+        'current_streak': 1, 'longest_streak': 1,
+    }
+    other_season = login(user_id).get(f'/api/me/stats?season_id={league.season_id + 1}').get_json()
+    assert other_season['seasons'] == []
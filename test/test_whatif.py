@@ -0,0 +1,83 @@
+import random
+from array import array
+
+import pytest
+from sqlalchemy import update
+
+from app import whatif
+from app.models import Fixture, Prediction, UserStanding
+from app.scoring import score_fixtures
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        assert whatif._numpy() is not None
+    else:
+        monkeypatch.setattr(whatif, '_numpy', lambda: None)
+    return request.param
+
+
+@pytest.fixture
+def season(db, make_league):
+    """Two scored fixtures and two still to play, with varied predictions."""
+    league = make_league(fixtures=4, users=25, completed=True)
+    rng = random.Random(7)
+    for prediction in Prediction.query.all():
+        prediction.home_score_prediction = rng.randint(0, 3)
+        prediction.away_score_prediction = rng.randint(0, 3)
+    db.session.execute(update(Fixture).where(Fixture.id.in_(league.fixture_ids[2:]))
+                       .values(home_score=None, away_score=None, is_completed=False))
+    db.session.commit()
+    score_fixtures()
+    return league
+
+
+def _play(db, results):
+    for fixture_id, (home, away) in results.items():
+        db.session.execute(update(Fixture).where(Fixture.id == fixture_id)
+                           .values(home_score=home, away_score=away, is_completed=True))
+    db.session.commit()
+    score_fixtures()
+    return {row.user_id: (row.total_points, row.rank) for row in UserStanding.query}
+
+
+def test_preview_matches_real_scoring(backend, db, season):
+    engine = whatif.ScoringEngine.load()
+    # A corrected result for a scored fixture, and results for both unplayed ones.
+    results = {season.fixture_ids[1]: (2, 2), season.fixture_ids[2]: (0, 1), season.fixture_ids[3]: (3, 1)}
+    totals = engine.rescore(results)
+    ranks = whatif.rank(totals)
+    report = engine.preview(results, limit=5, user_ids=[season.user_ids[-1]])
+
+    actual = _play(db, results)
+    predicted = {engine.user_ids[i]: (totals[i], ranks[i]) for i in range(len(totals))}
+    assert predicted == actual
+    expected_top = sorted(actual, key=lambda user_id: (actual[user_id][1], user_id))[:5]
+    assert [row['user_id'] for row in report['leaderboard']] == expected_top
+    assert [(row['points'], row['rank']) for row in report['leaderboard']] == \
+        [actual[user_id] for user_id in expected_top]
+    if season.user_ids[-1] not in expected_top:
+        [row] = report['users']
+        assert (row['points'], row['rank']) == actual[season.user_ids[-1]]
+
+
+def test_rank_gives_ties_the_same_rank(backend):
+    assert list(whatif.rank(array('q', [5, 9, 5, 0]))) == [2, 1, 2, 4]
+    assert list(whatif.rank(array('q'))) == []
+
+
+def test_admin_preview(backend, db, season, admin, login):
+    client = login(admin)
+    body = client.post('/admin/whatif', json={
+        'results': [{'fixture_id': season.fixture_ids[2], 'home_score': 1, 'away_score': 0}],
+        'limit': 3, 'user_ids': [season.user_ids[0]],
+    }).get_json()
+    assert body['fixtures'] == {str(season.fixture_ids[2]): 25}
+    assert len(body['leaderboard']) == 3
+    assert all(row['user_name'] for row in body['leaderboard'] + body['users'])
+    expected = _play(db, {season.fixture_ids[2]: (1, 0)})
+    for row in body['leaderboard'] + body['users']:
+        assert (row['points'], row['rank']) == expected[row['user_id']]
+    assert client.post('/admin/whatif', json={'results': []}).status_code == 400
@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timedelta
+
+from app.models import Prediction
+
+
+def _stored(league):
+    prediction = Prediction.query.filter_by(user_id=league.user_ids[0], fixture_id=league.fixture_ids[0]).one()
+    return prediction.home_score_prediction, prediction.away_score_prediction
+
+
+def _dead_segment(directory, league, home, away, at):
+    directory.mkdir(exist_ok=True)
+    (directory / 'dead.lock').write_text('')
+    entry = {'user_id': league.user_ids[0], 'fixture_id': league.fixture_ids[0],
+             'match_week_id': league.match_week_id, 'home': home, 'away': away, 'at': at.isoformat()}
+    (directory / 'dead-00000001.log').write_text(json.dumps(entry) + '\n')
+
+
+def test_older_write_never_overwrites_a_newer_prediction(db, make_league):
+    from app.write_buffer import write_predictions
+    league = make_league(fixtures=1, users=1, predict=None)
+    key = (league.user_ids[0], league.fixture_ids[0])
+    now = datetime.utcnow()
+    write_predictions({key: (league.match_week_id, 3, 2, now)})
+    write_predictions({key: (league.match_week_id, 0, 0, now - timedelta(seconds=5))})
+    db.session.expire_all()
+    assert _stored(league) == (3, 2)
+
+
+def test_replaying_an_old_segment_keeps_the_newer_prediction(app, db, make_league, tmp_path):
+    from app.write_buffer import prediction_buffer
+    league = make_league(fixtures=1, users=1, predict=(2, 2))
+    directory = tmp_path / 'replay'
+    _dead_segment(directory, league, 0, 1, datetime.utcnow() - timedelta(minutes=1))
+    prediction_buffer.enabled, prediction_buffer.directory = True, str(directory)
+    try:
+        assert prediction_buffer.replay() == 1
+    finally:
+        prediction_buffer.enabled = False
+    db.session.expire_all()
+    assert _stored(league) == (2, 2)
+    assert list(directory.iterdir()) == []
+
+
+def test_replay_applies_a_newer_segment(app, db, make_league, tmp_path):
+    from app.write_buffer import prediction_buffer
+    league = make_league(fixtures=1, users=1, predict=(2, 2))
+    directory = tmp_path / 'replay'
+    _dead_segment(directory, league, 0, 1, datetime.utcnow() + timedelta(seconds=1))
+    prediction_buffer.enabled, prediction_buffer.directory = True, str(directory)
+    try:
+        prediction_buffer.replay()
+    finally:
+        prediction_buffer.enabled = False
+    db.session.expire_all()
+    assert _stored(league) == (0, 1)
+
+
+def test_buffered_submission_shows_on_the_predict_page(app, db, make_league, login, tmp_path, monkeypatch):
+    from app.write_buffer import prediction_buffer
+    stuck = []
+    monkeypatch.setattr('app.routes.stick_to_primary', lambda: stuck.append(True))
+    league = make_league(fixtures=2, users=1, predict=(1, 1))
+    client = login(league.user_ids[0])
+    page = f'/predict/{league.match_week_id}'
+    etag = client.get(page).headers['ETag']
+    prediction_buffer.enabled, prediction_buffer.directory = True, str(tmp_path / 'buffer')
+    prediction_buffer.flush_seconds = 60
+    (tmp_path / 'buffer').mkdir()
+    try:
+        response = client.post(f'/submit_predictions/{league.match_week_id}', json={'predictions': [
+            {'fixture_id': league.fixture_ids[0], 'home_score': 4, 'away_score': 2}]})
+        assert response.get_json()['buffered']
+        assert stuck == [True]
+        response = client.get(page, headers={'If-None-Match': etag})
+        assert response.status_code == 200 and 'ETag' not in response.headers
+        body = response.get_data(as_text=True)
+        assert 'value="4"' in body and 'value="2"' in body
+        assert prediction_buffer.flush() == 1
+        assert prediction_buffer.pending_for(league.user_ids[0], league.fixture_ids) == {}
+        response = client.get(page, headers={'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        assert 'value="4"' in response.get_data(as_text=True)
+    finally:
+        prediction_buffer.close()
+        prediction_buffer.enabled, prediction_buffer.flush_seconds = False, 0.25
+    db.session.expire_all()
+    assert _stored(league) == (4, 2)